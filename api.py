@@ -1,40 +1,198 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
+import json
+import multiprocessing
 import sys
 import os
+import uuid
 import ui.main as main
 import numpy as np
-import time
+import config
+import backend.inference as inference
+import backend.jobs as jobs
+import backend.loop_cache as loop_cache
+import backend.profiling as profiling
+import backend.similarity as similarity
+import backend.uploads as uploads
+from backend.playback_manager import PlaybackLimitReached, get_manager
+from backend import telemetry
+from backend.telemetry import log
 
 # Ensure backend and UI paths are accessible
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "ui")))
 
 app = Flask(__name__, template_folder="ui/templates", static_folder="ui/static")
+app.request_class = uploads.UploadRequest  # Multipart file parts stream straight to uploads/
+
+job_queue = jobs.JobQueue(
+    thread_workers=config.JOB_THREAD_WORKERS,
+    process_workers=config.JOB_PROCESS_WORKERS,
+    max_pending=config.JOB_MAX_PENDING,
+    result_ttl=config.JOB_RESULT_TTL,
+)
+if multiprocessing.parent_process() is None:  # Spawned job workers re-import this module
+    uploads.start_sweeper()
+    inference.start_server()  # Job workers send model requests to one shared, batching process
+
+SESSION_COOKIE = "harmony_session"
+SESSION_HEADER = "X-Harmony-Session"
+
+def session_id():
+    """The client's playback session: X-Harmony-Session header, else the session cookie."""
+    sid = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not sid:
+        sid = request.environ.setdefault("harmony.session", uuid.uuid4().hex)
+    return sid
+
+@app.after_request
+def set_session_cookie(response):
+    """Hands new clients the session id generated for their first request."""
+    if "harmony.session" in request.environ:
+        response.set_cookie(SESSION_COOKIE, request.environ["harmony.session"], httponly=True, samesite="Lax")
+    return response
 
 @app.route("/")
 def home():
     """Serves the main UI page."""
     return render_template("index.html")
 
+def _json_tempo(tempo):
+    """Convert NumPy scalars to plain Python numbers for jsonify."""
+    return int(tempo) if isinstance(tempo, (np.integer, np.int64, np.int32)) else tempo
+
+
+def record_and_analyze_task(profile=None):
+    """Background job: records audio and extracts tempo & key, publishing progress events."""
+    def on_level(rms, peak, elapsed):
+        jobs.emit("level", {"rms": round(rms, 4), "peak": round(peak, 4), "elapsed": round(elapsed, 2)})
+
+    def on_update(tempo, key, elapsed):
+        if tempo:
+            jobs.emit("provisional", {"tempo": round(float(tempo), 1),
+                                      "key": None if key is None else str(key), "elapsed": round(elapsed, 2)})
+
+    tempo, key = main.record_audio_and_extract_features(profile=profile, on_update=on_update, on_level=on_level)
+    if tempo is None or key is None:
+        raise ValueError("No valid music detected.")
+    jobs.emit("tempo", {"tempo": _json_tempo(tempo)})
+    jobs.emit("key", {"key": str(key)})
+    return {"tempo": _json_tempo(tempo), "key": str(key)}
+
+
+def generate_music_task(tempo, key, session):
+    """Background job: generates beat and piano progression and plays them."""
+    beat_file, piano_file = main.generate_music_files(
+        tempo, key, on_part=lambda part, path: jobs.emit(part, {"file": path}))
+    if not beat_file or not piano_file:
+        raise ValueError("Music generation failed.")
+
+    result = {"beat": beat_file, "piano": piano_file, "server_playback": config.SERVER_PLAYBACK, "loop_url": None}
+    if config.SERVER_PLAYBACK:
+        # ✅ Play both parts together, sample-aligned on one output stream
+        log(f"🎵 Playing generated MIDI files: {beat_file}, {piano_file}")
+        try:
+            get_manager().start(session, [piano_file, beat_file])
+        except PlaybackLimitReached as e:
+            log(f"⚠️ {e} Leaving playback to the client.")
+            result["server_playback"] = False
+        except Exception as e:
+            # e.g. no sound device on this machine; the files are still usable by the client
+            log(f"❌ Server playback failed: {e}. Leaving playback to the client.")
+            result["server_playback"] = False
+
+    if not result["server_playback"]:
+        # Only the browser plays the pre-rendered loop; skip rendering it when the server plays
+        try:
+            result["loop_url"] = f"/loops/{loop_cache.render_loop(tempo, key)}"
+            jobs.emit("loop", {"url": result["loop_url"]})
+        except Exception as e:
+            log(f"⚠️ Loop rendering failed: {e}")
+
+    return result
+
+
+def render_loop_task(tempo, key, mode, progression, fmt):
+    """Background job: renders (or finds) a cached loop and returns its URL."""
+    return {"url": f"/loops/{loop_cache.render_loop(tempo, key, mode, progression, fmt=fmt)}"}
+
+
+def submit_job(name, func, *args, kind="thread"):
+    """Queues a job and returns the 202 response, or 429 when the queue is full."""
+    if kind == "thread" and profiling.requested(request.headers):
+        func = profiling.wrap_call(name, func)  # Profile the job on its worker thread
+    try:
+        job = job_queue.submit(name, func, *args, kind=kind)
+    except jobs.QueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 429
+    return jsonify({"success": True, "job_id": job.id, "status_url": f"/jobs/{job.id}",
+                    "events_url": f"/jobs/{job.id}/events"}), 202
+
 @app.route("/record-analyze", methods=["POST"])
 def record_and_analyze_api():
-    """Records audio, extracts tempo & key, and returns results using main.py."""
-    try:
-        tempo, key = main.record_audio_and_extract_features()
-        if tempo is None or key is None:
-            return jsonify({"success": False, "error": "No valid music detected."})
+    """
+    Queues recording + tempo & key extraction; poll /jobs/<id> for the result.
+    An optional `profile` (query string or JSON body) selects the analysis quality.
+    """
+    data = request.get_json(silent=True) or {}
+    profile = request.args.get("profile") or data.get("profile")
+    if profile and profile not in main.audio_analysis.ANALYSIS_PROFILES:
+        return jsonify({"success": False, "error": f"Unknown analysis profile: {profile}"}), 400
+    return submit_job("record-analyze", record_and_analyze_task, profile)
 
-        # 🔥 Ensure tempo is a standard Python int
-        tempo = int(tempo) if isinstance(tempo, (np.integer, np.int64, np.int32)) else tempo
-        key = str(key)  # Ensure key is a string
+@app.route("/analyze-upload", methods=["POST"])
+def analyze_upload_api():
+    """
+    Queues tempo & key extraction for uploaded audio; poll /jobs/<id> for the result.
+    Accepts a multipart `file` field or a raw audio body (Content-Length or chunked).
+    An optional `profile` query parameter selects the analysis quality.
+    """
+    profile = request.args.get("profile")
+    if profile and profile not in main.audio_analysis.ANALYSIS_PROFILES:
+        return jsonify({"success": False, "error": f"Unknown analysis profile: {profile}"}), 400
+    # Multipart framing adds a little on top of the file itself
+    request.max_content_length = config.UPLOAD_MAX_BYTES + 64 * 1024
+    too_large = f"Upload exceeds {config.UPLOAD_MAX_BYTES // (1 << 20)} MB."
+    if request.content_length is not None and request.content_length > request.max_content_length:
+        return jsonify({"success": False, "error": too_large}), 413
 
-        return jsonify({"success": True, "tempo": tempo, "key": key})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+    path = None
+    accepted = False
+    try:
+        try:
+            if request.mimetype == "multipart/form-data":
+                upload = request.files.get("file")
+                if upload is None:
+                    return jsonify({"success": False, "error": "Missing file field."}), 400
+                path = upload.stream.name  # Already on disk via uploads.UploadRequest
+                upload.close()
+                if os.path.getsize(path) > config.UPLOAD_MAX_BYTES:
+                    raise uploads.UploadTooLarge(too_large)
+            else:
+                suffix = uploads.suffix_for(request.args.get("filename"), request.mimetype)
+                path = uploads.save_stream(request.stream, suffix)
+            info = uploads.probe(path)
+        except (uploads.UploadTooLarge, RequestEntityTooLarge):
+            return jsonify({"success": False, "error": too_large}), 413
+        except uploads.UploadRejected as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except ValueError:
+            return jsonify({"success": False, "error": "Malformed multipart body."}), 400
+
+        log(f"📥 Upload saved: {path} ({info['duration']}s, {info['format']})")
+        response, status = submit_job("analyze-upload", uploads.analyze_upload, path, profile, kind="process")
+        accepted = status == 202
+        return response, status
+    finally:
+        # Every file this request wrote (other form parts, parts cut off mid-parse, rejected
+        # uploads) except the one handed to the analysis job
+        for leftover in [*request.upload_paths, path]:
+            if leftover and not (accepted and leftover == path):
+                uploads.discard(leftover)
 
 @app.route("/generate-music", methods=["POST"])
 def generate_music_api():
-    """Generates beat and piano progression and plays them."""
+    """Queues beat and piano progression generation + playback; poll /jobs/<id>."""
     try:
         data = request.json
         tempo = data.get("tempo")
@@ -44,27 +202,121 @@ def generate_music_api():
             return jsonify({"success": False, "error": "Missing tempo or key"})
 
         # ✅ Convert NumPy int64 to standard Python int
-        tempo = int(tempo) if isinstance(tempo, (np.integer, np.int64, np.int32)) else tempo
+        tempo = _json_tempo(tempo)
         key = str(key)  # Ensure key is a string
 
-        beat_file, piano_file = main.generate_music_files(tempo, key)
+        return submit_job("generate-music", generate_music_task, tempo, key, session_id())
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
 
-        if not beat_file or not piano_file:
-            return jsonify({"success": False, "error": "Music generation failed."})
+@app.route("/loops", methods=["POST"])
+def render_loop_api():
+    """
+    Returns the URL of the pre-rendered loop for {tempo, key[, mode, progression, format]}.
+    Cached loops are answered directly; otherwise rendering is queued (poll /jobs/<id>).
+    """
+    data = request.get_json(silent=True) or {}
+    tempo = data.get("tempo")
+    key = data.get("key")
+    if tempo is None or key is None:
+        return jsonify({"success": False, "error": "Missing tempo or key"}), 400
 
-        # ✅ Play the generated MIDI files
-        print(f"🎵 Playing generated MIDI files: {beat_file}, {piano_file}")
-        main.piano_generation.play_midi(piano_file) # Play the piano progression
-        time.sleep(1)  # Small delay to ensure playback starts
-        main.piano_generation.play_midi(beat_file)  # Play the beat
+    mode = data.get("mode", "major")
+    progression = data.get("progression", "I-IV-V-I")
+    fmt = data.get("format", config.LOOP_FORMAT)
+    try:
+        name = loop_cache.cached_loop(int(tempo), key, mode, progression, fmt=fmt)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if name:
+        return jsonify({"success": True, "url": f"/loops/{name}"})
+    return submit_job("render-loop", render_loop_task, int(tempo), key, mode, progression, fmt)
 
-        return jsonify({"success": True, "beat": beat_file, "piano": piano_file})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+@app.route("/loops/<name>", methods=["GET"])
+def loop_file_api(name):
+    """Serves a rendered loop; Range requests get 206 partial content."""
+    # Names are content hashes, so a file never changes once written
+    return send_from_directory(loop_cache.cache_dir(), name, conditional=True, max_age=31536000)
+
+@app.route("/similar", methods=["POST"])
+def similar_tracks_api():
+    """
+    Top-k indexed tracks that fit with {tempo, key[, mode] | chroma[, onset_mean, k]}.
+    `key` is a name ("G") or pitch-class index; a 12-bin `chroma` takes precedence.
+    """
+    from backend.piano_generation import KEYS
+
+    data = request.get_json(silent=True) or {}
+    tempo = data.get("tempo")
+    key = data.get("key")
+    chroma = data.get("chroma")
+    if tempo is None or (key is None and chroma is None):
+        return jsonify({"success": False, "error": "Missing tempo and key or chroma"}), 400
+    try:
+        if chroma is None:
+            key = KEYS.index(key) if isinstance(key, str) and not key.isdigit() else int(key)
+            chroma = similarity.key_chroma(key, data.get("mode", "major"))
+        elif len(chroma) != 12:
+            raise ValueError("chroma needs 12 bins")
+        vector = similarity.track_vector(float(tempo), chroma, float(data.get("onset_mean", 0.0)))
+        k = max(1, min(int(data.get("k", 10)), 100))
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": f"Bad query: {e}"}), 400
+    return jsonify({"success": True, "matches": similarity.get_index().query(vector, k)})
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status_api(job_id):
+    """Returns a job's status and result. `?wait=<seconds>` blocks until it finishes."""
+    wait = min(request.args.get("wait", 0, type=float), config.JOB_MAX_WAIT)
+    job = job_queue.wait(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown job."}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events_api(job_id):
+    """
+    Streams a job's progress as Server-Sent Events (level, provisional, tempo, key,
+    beat, piano, loop), ending with a done/failed/cancelled event.
+    Events are pushed as the job publishes them, with a keep-alive comment every
+    JOB_EVENTS_HEARTBEAT seconds. A client that reconnects resumes after
+    Last-Event-ID; 204 once the final event has been delivered.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown job."}), 404
+    last_id = request.headers.get("Last-Event-ID", type=int) or request.args.get("last_id", 0, type=int)
+    if job.closed and last_id >= len(job.events):
+        return Response(status=204)  # Tells EventSource to stop reconnecting
+
+    def stream(last_id):
+        yield f"retry: {config.JOB_EVENTS_RETRY_MS}\n\n"
+        while True:
+            events, closed = job.events_since(last_id, timeout=config.JOB_EVENTS_HEARTBEAT)
+            for event_id, event, data in events:
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+                last_id = event_id
+            if closed and last_id >= len(job.events):
+                return
+            if not events:
+                yield ": keep-alive\n\n"  # Also how a dropped client is noticed
+
+    return Response(stream(last_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job_api(job_id):
+    """Cancels a queued job, or asks a running thread job to stop."""
+    if not job_queue.cancel(job_id):
+        job = job_queue.get(job_id)
+        if job is not None and job.finished is None and job.status != jobs.CANCELLED:
+            return jsonify({"success": False, "error": "Job is already running in a worker process."}), 409
+        return jsonify({"success": False, "error": "Job not found or already finished."}), 404
+    return jsonify({"success": True, "message": "Job cancelled."})
 
 @app.route("/play-music", methods=["POST"])
 def play_music_api():
-    """Starts music playback using main.py."""
+    """Starts looping this session's music and returns immediately."""
     try:
         data = request.json
         beat_file = data.get("beat")
@@ -73,19 +325,33 @@ def play_music_api():
         if not beat_file or not piano_file:
             return jsonify({"success": False, "error": "Missing music files."})
 
-        main.play_music_in_loop(beat_file, piano_file)
+        main.start_music_loop(beat_file, piano_file, session=session_id())
         return jsonify({"success": True, "message": "Music is playing."})
+    except PlaybackLimitReached as e:
+        return jsonify({"success": False, "error": str(e)}), 429
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 @app.route("/stop-music", methods=["POST"])
 def stop_music_api():
-    """Stops music playback using main.py."""
+    """Stops this session's music playback; other sessions keep playing."""
     try:
-        main.stop_music()
+        main.stop_music(session=session_id())
         return jsonify({"success": True, "message": "Music playback stopped."})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
+@app.route("/metrics", methods=["GET"])
+def metrics_api():
+    """Exposes pipeline metrics in the Prometheus text format."""
+    telemetry.JOB_QUEUE_DEPTH.set(job_queue.pending())
+    telemetry.PLAYBACK_SESSIONS.set(get_manager().active())
+    return Response(telemetry.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    # With debug=True the reloader re-runs this module in a child process that serves requests;
+    # warm up only there, not in the watching parent
+    if config.WARMUP_ON_START and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        import backend.warmup as warmup
+        warmup.warmup()
     app.run(debug=True)
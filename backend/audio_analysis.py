@@ -1,86 +1,237 @@
-import librosa
 import os
 import numpy as np
 import soundfile as sf
 
-def extract_audio_features(audio_path):
+import config
+import backend.inference as inference
+import backend.preprocessing as preprocessing
+from backend.lazy_imports import lazy_import
+from backend.profiling import profile_function
+from backend.feature_cache import FeatureCache, cache_key
+from backend.feature_graph import FeatureGraph
+from backend.hpss import hpss_masks
+from backend.blockwise_analysis import analyze_file_blockwise as _analyze_file_blockwise
+from backend.telemetry import log, stage, SILENT_INPUTS
+
+librosa = lazy_import("librosa")
+
+# Named analysis quality profiles. `sample_rate` (None keeps the native rate)
+# is what the signal is resampled to; the rest is handed to FeatureGraph.
+# The selected profile is part of every cache key, so changing a profile
+# (or the analysis version) invalidates cached results.
+ANALYSIS_VERSION = 3
+ANALYSIS_PROFILES = {
+    "fast": {"sample_rate": 11025, "n_fft": 1024, "hop_length": 256, "hpss": False,
+             "hpss_margin": (1.0, 1.0), "chroma_frames": 256},
+    "balanced": {"sample_rate": 22050, "n_fft": 2048, "hop_length": 512, "hpss": True,
+                 "hpss_margin": (1.0, 1.0), "chroma_frames": None},
+    # The pre-profile analysis: native rate, librosa's default 2048/512 STFT for onsets and chroma
+    "standard": {"sample_rate": None, "n_fft": 2048, "hop_length": 512, "hpss": True,
+                 "hpss_margin": (1.0, 1.0), "chroma_frames": None},
+    "accurate": {"sample_rate": None, "n_fft": 4096, "hop_length": 512, "hpss": True,
+                 "hpss_margin": (1.0, 1.0), "chroma_frames": None},
+}
+
+
+def get_profile(profile=None):
+    """Resolve a profile name (default config.ANALYSIS_PROFILE) to its settings."""
+    name = profile or config.ANALYSIS_PROFILE
+    if name not in ANALYSIS_PROFILES:
+        raise ValueError(f"Unknown analysis profile: {name}. Choose from {', '.join(ANALYSIS_PROFILES)}.")
+    return ANALYSIS_PROFILES[name]
+
+_cache_path = config.FEATURE_CACHE_PATH
+if _cache_path and not os.path.isabs(_cache_path):
+    _cache_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), _cache_path)
+feature_cache = FeatureCache(max_entries=config.FEATURE_CACHE_ENTRIES, path=_cache_path)
+
+@profile_function("extract_audio_features")
+def extract_audio_features(audio_path, profile=None):
     audio_path = os.path.abspath(audio_path)
-    print(f"📂 Loading audio file: {audio_path}...")
+    log(f"📂 Loading audio file: {audio_path}...")
     
     try:
-        # Validate the WAV file
+        # Validate and load in a single open, decoding straight to float32
         with sf.SoundFile(audio_path) as f:
-            print(f"✅ Valid WAV file detected! Format: {f.format}, Channels: {f.channels}, Samplerate: {f.samplerate}")
+            log(f"✅ Valid WAV file detected! Format: {f.format}, Channels: {f.channels}, Samplerate: {f.samplerate}")
+            if config.BLOCKWISE_MIN_DURATION and f.frames > config.BLOCKWISE_MIN_DURATION * f.samplerate:
+                tempo, key, _ = analyze_file_blockwise(audio_path, profile)  # Too long to hold in memory
+                return tempo, key
+            y = f.read(dtype="float32")
+            sr = f.samplerate
+        
+        return analyze_array(y, sr, profile=profile)
         
-        # Load audio
-        y, sr = sf.read(audio_path)
+    except Exception as e:
+        log(f"❌ Error in feature extraction: {e}")
+        return 0, None
+
+
+def analyze_file_blockwise(audio_path, profile=None, segment_seconds=None):
+    """
+    Stream a long file through the analysis in fixed-size blocks (bounded memory).
+    :param profile: Name of an ANALYSIS_PROFILES entry (default config.ANALYSIS_PROFILE).
+    :param segment_seconds: Window for per-segment estimates (default config.BLOCKWISE_SEGMENT_SECONDS).
+    :return: (tempo, key, segments); segments are {"start", "end", "tempo", "key"} dicts.
+    """
+    return _analyze_file_blockwise(
+        audio_path, {**get_profile(profile), "hpss_backend": config.HPSS_BACKEND},
+        segment_seconds=segment_seconds or config.BLOCKWISE_SEGMENT_SECONDS,
+        block_seconds=config.BLOCKWISE_BLOCK_SECONDS,
+    )
+
+
+def analyze_array(y, sr, use_cache=True, profile=None):
+    """
+    Extract tempo & key from an in-memory signal, without touching the disk.
+    Results are cached by a hash of the samples and the analysis parameters.
+    :param y: NumPy array of samples (any dtype, mono or shape (samples, channels)).
+    :param sr: Sample rate of `y`.
+    :param profile: Name of an ANALYSIS_PROFILES entry (default config.ANALYSIS_PROFILE).
+    :return: (tempo, key), or (0, None) for silent or invalid input.
+    """
+    try:
+        y = np.asarray(y)
+        key_hash = cache_key(y, sr, analysis_signature(profile)) if use_cache else None
+        if key_hash:
+            cached = feature_cache.get(key_hash)
+            if cached is not None:
+                log("⚡ Using cached analysis result.")
+                return cached[0], cached[1]
+
         y = preprocess_audio(y)
         
-        if np.max(np.abs(y)) == 0:
-            print("⚠️ Audio signal is silent. Skipping feature extraction.")
+        if not y.any():
+            SILENT_INPUTS.inc(reason="silent")
+            log("⚠️ Audio signal is silent. Skipping feature extraction.")
             return 0, None
         
-        tempo, key = analyze_audio(y, sr)
+        tempo, key = analyze_audio(y, sr, profile)
+        tempo = float(np.atleast_1d(tempo)[0])
+        key = int(key) if key is not None else None
+
+        if key_hash and key is not None:
+            feature_cache.put(key_hash, [tempo, key])
         return tempo, key
         
     except Exception as e:
-        print(f"❌ Error in feature extraction: {e}")
+        log(f"❌ Error in feature extraction: {e}")
         return 0, None
 
 
+def analysis_signature(profile=None):
+    """Everything that influences analysis output besides the samples themselves."""
+    return {"version": ANALYSIS_VERSION, "librosa": librosa.__version__, "hpss_backend": config.HPSS_BACKEND,
+            "model": inference.model_signature(), **get_profile(profile)}
+
+
+def cache_stats():
+    """Hit/miss counters of the feature cache for this process."""
+    return dict(feature_cache.stats)
+
+
 def preprocess_audio(y):
-    """Preprocess audio by converting to float32, normalizing, and ensuring mono format."""
-    if y.dtype != np.float32:
-        y = y.astype(np.float32) / np.max(np.abs(y))  # Normalize if it's int16
-    
-    if y.ndim > 1:
-        y = librosa.to_mono(y.T)  # Convert to mono if needed
-    
-    y = np.nan_to_num(y, nan=0.0, posinf=1.0, neginf=-1.0)  # Clean NaN/Inf values
-    
-    max_val = np.max(np.abs(y))
-    if max_val > 0 and max_val < 0.999:
-        y /= max_val  # Scale to [-1, 1]
-    
-    return librosa.util.normalize(y) if max_val < 0.999 else y
+    """
+    Convert to mono float32 and normalize to peak 1 (see backend.preprocessing).
+    The result lives in this thread's reusable buffer; copy it to keep it past the next call.
+    """
+    with stage("preprocess"):
+        return preprocessing.preprocess(y)
+
+
+def build_graph(y, sr, profile=None):
+    """
+    Resample `y` for the profile and return its FeatureGraph, or None if it is near-silent.
+    """
+    settings = dict(get_profile(profile))
+    target_sr = settings.pop("sample_rate")
+
+    energy = np.dot(y, y)
+    if energy < 1e-4:
+        SILENT_INPUTS.inc(reason="low_energy")
+        log("⚠️ Energy too low, likely silent or very quiet audio.")
+        return None
 
+    if target_sr and target_sr != sr:
+        with stage("resample"):
+            y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+        sr = target_sr
 
-def analyze_audio(y, sr):
-    """Analyze tempo and key from the given audio signal."""
+    # One STFT feeds HPSS masks, the percussive onset envelope and chroma
+    graph = FeatureGraph(y, sr, hpss_backend=config.HPSS_BACKEND, **settings)
+    for name in ("stft", "hpss_masks", "onset_envelope"):
+        graph.get(name)  # Resolve dependencies in order so each stage is timed on its own
+    return graph
+
+
+def analyze_audio(y, sr, profile=None):
+    """Analyze tempo and key from the given audio signal using a quality profile."""
     try:
-        energy = np.sum(y ** 2)
-        if energy < 1e-4:
-            print("⚠️ Energy too low, likely silent or very quiet audio.")
+        graph = build_graph(y, sr, profile)
+        if graph is None:
             return 0, None
+        # A configured model predicts key and tempo (micro-batched with concurrent requests);
+        # beat tracking and the chroma heuristic cover anything it doesn't provide
+        key, tempo = None, None
+        predictor = inference.get_predictor()
+        if predictor:
+            try:
+                key, tempo = predictor.predict(inference.feature_windows(graph), timeout=config.INFERENCE_TIMEOUT)
+            except Exception as e:
+                log(f"⚠️ Model inference failed ({e or type(e).__name__}); using the heuristics.")
+        if key is None:
+            key = graph.get("key")
+        if not tempo or tempo <= 0:
+            tempo = graph.get("tempo")
         
-        y_harm, y_perc = harmonic_percussive_separation(y)
-        onset_env = librosa.onset.onset_strength(y=y_perc, sr=sr)
-        tempo = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)[0] if np.any(onset_env) else 0
-        
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-        key = chroma.mean(axis=1).argmax()
-        
-        print(f"🎵 Detected Tempo: {tempo}")
-        print(f"🎹 Estimated Key: {key}")
+        log(f"🎵 Detected Tempo: {tempo}")
+        log(f"🎹 Estimated Key: {key}")
         
         return tempo, key
     
     except Exception as e:
-        print(f"❌ Error during feature extraction: {e}")
+        log(f"❌ Error during feature extraction: {e}")
         return 0, None
 
 
+def describe_file(audio_path, profile=None):
+    """
+    Summary features of a file for the similarity index.
+    :return: dict with tempo, key, chroma (12 mean values), onset_mean and onset_std,
+        or None for silent or unreadable audio.
+    """
+    try:
+        y, sr = sf.read(audio_path, dtype="float32")
+        y = preprocess_audio(y)
+        graph = build_graph(y, sr, profile) if y.any() else None
+        if graph is None:
+            return None
+        onset = graph.get("onset_envelope")
+        chroma = graph.get("chroma").mean(axis=1)
+        return {
+            "tempo": float(np.atleast_1d(graph.get("tempo"))[0]),
+            "key": int(chroma.argmax()),
+            "chroma": chroma.astype(np.float32),
+            "onset_mean": float(onset.mean()),
+            "onset_std": float(onset.std()),
+        }
+    except Exception as e:
+        log(f"❌ Error describing {audio_path}: {e}")
+        return None
+
+
 def harmonic_percussive_separation(y):
     """Perform harmonic-percussive source separation."""
     try:
         if len(y) < 2048:
-            print("⚠️ Audio is too short for HPSS. Skipping separation.")
+            log("⚠️ Audio is too short for HPSS. Skipping separation.")
             return y, y
         
-        S = librosa.stft(y, n_fft=1024)
-        S_harm, S_perc = librosa.decompose.hpss(S, margin=(1.0, 1.0))
-        return librosa.istft(S_harm), librosa.istft(S_perc)
+        with stage("hpss"):
+            S = librosa.stft(y, n_fft=1024)
+            mask_harm, mask_perc = hpss_masks(np.abs(S), margin=(1.0, 1.0), backend=config.HPSS_BACKEND)
+            return librosa.istft(S * mask_harm), librosa.istft(S * mask_perc)
     
     except Exception as e:
-        print(f"⚠️ HPSS failed: {e}. Using original signal instead.")
+        log(f"⚠️ HPSS failed: {e}. Using original signal instead.")
         return y, y
@@ -0,0 +1,127 @@
+"""
+Batch tempo & key analysis for directories of audio.
+
+Usage:
+    python -m backend.batch_analyze <dir> [--output results.jsonl] [--workers N] [--profile fast]
+
+Files longer than config.BLOCKWISE_MIN_DURATION are analyzed block by block
+with bounded memory, and their records carry per-segment tempo/key.
+Results are appended to a JSONL file as each file finishes. Re-running with
+the same output file skips paths that are already recorded there.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".aiff", ".aif", ".mp3")
+
+
+def find_audio_files(directory, extensions=AUDIO_EXTENSIONS):
+    """Recursively list audio files under `directory` as sorted absolute paths."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(extensions):
+                paths.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(paths)
+
+
+def load_done_paths(output_path):
+    """Paths already present in an existing JSONL output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["path"])
+            except (ValueError, KeyError):
+                continue  # Ignore a truncated last line from an interrupted run
+    return done
+
+
+def analyze_file(path, profile=None):
+    """Worker entry point: analyze one file and return a JSON-serializable record."""
+    import backend.audio_analysis as audio_analysis
+    import config
+
+    record = {"path": path, "tempo": None, "key": None, "duration": 0.0, "profile": profile, "error": None}
+    try:
+        record["duration"] = sf.info(path).duration
+        if config.BLOCKWISE_MIN_DURATION and record["duration"] > config.BLOCKWISE_MIN_DURATION:
+            tempo, key, record["segments"] = audio_analysis.analyze_file_blockwise(path, profile=profile)
+        else:
+            tempo, key = audio_analysis.extract_audio_features(path, profile=profile)
+        tempo = float(np.atleast_1d(tempo)[0])
+        record["tempo"] = tempo
+        record["key"] = int(key) if key is not None else None
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def run_batch(directory, output_path, workers=None, profile=None):
+    """
+    Analyze every audio file under `directory` across a process pool.
+    :return: (files processed, audio seconds processed, elapsed seconds)
+    """
+    workers = workers or os.cpu_count() or 1
+    done = load_done_paths(output_path)
+    pending = [p for p in find_audio_files(directory) if p not in done]
+
+    print(f"📂 {len(pending)} files to analyze ({len(done)} already done) with {workers} workers...")
+    if not pending:
+        return 0, 0.0, 0.0
+
+    import backend.inference as inference
+    inference.start_server()  # One shared model for every worker, so their requests batch together
+
+    files_done = 0
+    audio_seconds = 0.0
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(analyze_file, path, profile) for path in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+            files_done += 1
+            audio_seconds += record["duration"]
+            elapsed = time.perf_counter() - started
+            status = "❌" if record["error"] else "✅"
+            print(f"{status} [{files_done}/{len(pending)}] {record['path']} "
+                  f"({files_done / elapsed:.2f} files/s, {audio_seconds / elapsed:.1f} audio-s/s)")
+
+    elapsed = time.perf_counter() - started
+    return files_done, audio_seconds, elapsed
+
+
+def main(argv=None):
+    from backend.audio_analysis import ANALYSIS_PROFILES
+
+    parser = argparse.ArgumentParser(description="Batch tempo & key analysis for a directory of audio.")
+    parser.add_argument("directory", help="Directory to scan recursively for audio files")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--profile", choices=sorted(ANALYSIS_PROFILES), default=None,
+                        help="Analysis quality profile (default: config.ANALYSIS_PROFILE)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    files_done, audio_seconds, elapsed = run_batch(args.directory, args.output, args.workers, args.profile)
+    if files_done:
+        print(f"🏁 {files_done} files, {audio_seconds:.1f}s of audio in {elapsed:.1f}s "
+              f"({files_done / elapsed:.2f} files/s, {audio_seconds / elapsed:.1f} audio-s/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,20 @@
+import functools
+
 import mido
-import pygame
-import time
-import subprocess
-import threading
+
+import config
+from backend import midi_cache
+from backend.playback_manager import DEFAULT_SESSION, get_manager
+from backend.telemetry import log, stage
 
 # Paths to Fluidsynth and SoundFont
-SOUNDFONT_PATH = "C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/FluidR3_GM.sf2"
-FLUIDSYNTH_PATH = "C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/fluidsynth.exe"
+SOUNDFONT_PATH = config.SOUNDFONT_PATH
+FLUIDSYNTH_PATH = config.FLUIDSYNTH_PATH
 
-# Global variable to store the Fluidsynth process
-fluidsynth_process = None
 
-
-def generate_beat(tempo):
-    """Generate a dynamic drum beat as a MIDI file."""
-    print("🥁 Generating a richer Beat...")
+def build_beat(tempo):
+    """Build a dynamic drum beat as an in-memory mido.MidiFile."""
+    log("🥁 Generating a richer Beat...")
 
     mid = mido.MidiFile()
     track = mido.MidiTrack()
@@ -40,49 +40,50 @@ def generate_beat(tempo):
             track.append(mido.Message('note_on', note=49, velocity=120, time=tick_time))
             track.append(mido.Message('note_off', note=49, velocity=120, time=tick_time))
 
-    midi_path = "beat.mid"
-    mid.save(midi_path)
+    return mid
+
+
+@functools.lru_cache(maxsize=config.MIDI_CACHE_SIZE)
+def beat_midi_bytes(tempo):
+    """MIDI bytes of the beat for `tempo`, memoized since output depends only on tempo."""
+    with stage("beat_generation"):
+        return midi_cache.to_bytes(build_beat(tempo))
+
+
+def generate_beat(tempo):
+    """Generate a dynamic drum beat and return the path of its MIDI file."""
+    midi_path = midi_cache.save_midi(beat_midi_bytes(int(tempo)), "beat")
 
-    print(f"✅ Beat saved as '{midi_path}'")
+    log(f"✅ Beat saved as '{midi_path}'")
 
     return midi_path  # Return the MIDI file path
 
 
-def play_midi(midi_file):
-    """Plays a MIDI file using Fluidsynth."""
-    global fluidsynth_process
+def play_midi(midi_file, loop=False, session=DEFAULT_SESSION):
+    """Plays a MIDI file as this session's beat part on the shared playback engine."""
     try:
-        fluidsynth_process = subprocess.Popen([
-            FLUIDSYNTH_PATH,
-            "-m", "winmidi",
-            "-o", "midi.winmidi.device=HarmonyBot_MIDI",
-            SOUNDFONT_PATH,
-            midi_file
-        ])
-        print(f"🎶 Playing {midi_file}...")
+        player = get_manager().start(f"{session}/beat", [midi_file], loop=loop)
+        log(f"🎶 Playing {midi_file}...")
+        return player
 
     except Exception as e:
-        print(f"❌ Error playing beat: {e}")
+        log(f"❌ Error playing {midi_file}: {e}")
 
 
-def play_midi_loop(midi_file):
-    """Plays a MIDI file in a loop using Fluidsynth."""
-    global fluidsynth_process
+def play_midi_loop(midi_file, session=DEFAULT_SESSION):
+    """Plays a MIDI file in a gapless loop until interrupted."""
     try:
-        while True:
-            play_midi(midi_file)
-            time.sleep(10)  # Adjust to match beat duration
+        player = play_midi(midi_file, loop=True, session=session)
+        if player:
+            player.wait()
 
     except KeyboardInterrupt:
-        stop_midi()
+        stop_midi(session)
 
 
-def stop_midi():
-    """Stops any playing MIDI by terminating Fluidsynth process."""
-    global fluidsynth_process
-    if fluidsynth_process:
-        fluidsynth_process.terminate()
-        fluidsynth_process = None
-        print("⏹️ Stopped MIDI playback")
+def stop_midi(session=DEFAULT_SESSION):
+    """Stops this session's beat playback."""
+    if get_manager().stop(f"{session}/beat"):
+        log("⏹️ Stopped MIDI playback")
     else:
-        print("⚠️ No active MIDI playback to stop.")
+        log("⚠️ No active MIDI playback to stop.")
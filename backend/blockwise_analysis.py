@@ -0,0 +1,175 @@
+"""
+Bounded-memory tempo & key analysis for very long recordings.
+
+The file is streamed with soundfile.blocks in fixed-size blocks that overlap
+by exactly n_fft - hop samples, so consecutive blocks yield one continuous
+sequence of STFT frames. Each block contributes onset-envelope frames and
+chroma sums; tempo and key are estimated per segment over half-overlapping
+windows, so tempo changes across a long set show up. Memory use depends on
+the block and segment sizes, not on the length of the file.
+"""
+from collections import deque
+
+import numpy as np
+import soundfile as sf
+
+from backend.hpss import hpss_masks
+from backend.lazy_imports import lazy_import
+from backend.telemetry import log, stage
+
+librosa = lazy_import("librosa")
+
+
+class BlockwiseAnalyzer:
+    """Accumulates onset and chroma statistics block by block."""
+
+    def __init__(self, sr, n_fft=2048, hop_length=512, hpss=True, hpss_margin=(1.0, 1.0),
+                 segment_seconds=30.0, hpss_backend="librosa", **_):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.hpss = hpss
+        self.hpss_margin = hpss_margin
+        self.hpss_backend = hpss_backend
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+
+        # Segments are `segment_frames` long and start every `step_frames` (50% overlap)
+        self.segment_frames = max(1, int(segment_seconds * sr / hop_length))
+        self.step_frames = max(1, self.segment_frames // 2)
+        self.onset_window = deque(maxlen=self.segment_frames)
+        self.chroma_steps = deque(maxlen=2)  # Chroma sums of the last two half-segments
+        self.step_chroma = np.zeros(12)
+        self.frames_in_step = 0
+
+        self.frames = 0
+        self.energy = 0.0
+        self.total_chroma = np.zeros(12)
+        self.onset_sum = 0.0
+        self.onset_sq_sum = 0.0
+        self.segments = []
+        self._prev_mel_db = None
+
+    def process_block(self, y):
+        """Add one mono float32 block (n_fft - hop samples overlap with the previous one)."""
+        self.energy += float(np.dot(y, y))
+        S = np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length, center=False))
+        if S.shape[1] == 0:
+            return
+
+        percussive = S
+        if self.hpss and S.shape[1] > 1:
+            with stage("hpss"):
+                percussive = S * hpss_masks(S, margin=self.hpss_margin, backend=self.hpss_backend)[1]
+
+        power = S ** 2
+        mel_db = librosa.power_to_db(self.mel_basis @ (percussive ** 2))
+        previous = mel_db[:, :1] if self._prev_mel_db is None else self._prev_mel_db
+        flux = np.maximum(0.0, np.diff(np.concatenate([previous, mel_db], axis=1), axis=1)).mean(axis=0)
+        self._prev_mel_db = mel_db[:, -1:]
+
+        chroma = librosa.feature.chroma_stft(S=power, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+        self.total_chroma += chroma.sum(axis=1)
+        self.onset_sum += float(flux.sum())
+        self.onset_sq_sum += float(np.dot(flux, flux))
+
+        # Walk frame ranges so segment boundaries fall where they should, whatever the block size
+        start = 0
+        while start < len(flux):
+            take = min(len(flux) - start, self.step_frames - self.frames_in_step)
+            self.onset_window.extend(flux[start:start + take])
+            self.step_chroma += chroma[:, start:start + take].sum(axis=1)
+            self.frames_in_step += take
+            self.frames += take
+            start += take
+            if self.frames_in_step == self.step_frames:
+                self._close_step()
+
+    def _close_step(self):
+        self.chroma_steps.append(self.step_chroma)
+        self.step_chroma = np.zeros(12)
+        self.frames_in_step = 0
+        if len(self.onset_window) >= self.segment_frames or not self.segments:
+            self._emit_segment()
+
+    def _emit_segment(self):
+        onset_env = np.asarray(self.onset_window, dtype=np.float32)
+        if len(onset_env) < 2:
+            return
+        tempo = 0.0
+        if np.any(onset_env):
+            with stage("beat_tracking"):
+                tempo = float(librosa.feature.tempo(onset_envelope=onset_env, sr=self.sr,
+                                                    hop_length=self.hop_length)[0])
+        chroma = sum(self.chroma_steps) + self.step_chroma
+        end = self.frames * self.hop_length / self.sr
+        start = end - len(onset_env) * self.hop_length / self.sr
+        self.segments.append({
+            "start": round(start, 2),
+            "end": round(end, 2),
+            "tempo": round(tempo, 2),
+            "key": int(np.argmax(chroma)) if np.any(chroma) else None,
+        })
+
+    def finish(self):
+        """Flush the last partial segment and return (tempo, key, segments)."""
+        # A tail shorter than a quarter segment is already covered by the last window
+        if self.frames_in_step and (not self.segments or self.frames_in_step * 2 >= self.step_frames):
+            self._emit_segment()
+
+        if self.energy < 1e-4 or not self.frames:
+            return 0, None, self.segments
+
+        # Overall tempo: duration-weighted median of the segment tempos
+        tempos = np.array([s["tempo"] for s in self.segments if s["tempo"]])
+        weights = np.array([s["end"] - s["start"] for s in self.segments if s["tempo"]])
+        tempo = 0.0
+        if len(tempos):
+            order = np.argsort(tempos)
+            cumulative = np.cumsum(weights[order])
+            tempo = float(tempos[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+        key = int(np.argmax(self.total_chroma)) if np.any(self.total_chroma) else None
+        return tempo, key, self.segments
+
+    def onset_stats(self):
+        """Mean and standard deviation of the onset envelope over the whole file."""
+        if not self.frames:
+            return 0.0, 0.0
+        mean = self.onset_sum / self.frames
+        return mean, float(np.sqrt(max(0.0, self.onset_sq_sum / self.frames - mean ** 2)))
+
+
+def analyze_file_blockwise(audio_path, settings, segment_seconds=30.0, block_seconds=10.0):
+    """
+    Analyze a file of any length with bounded memory.
+    :param settings: Analysis profile settings (n_fft, hop_length, hpss, ...).
+        The file is analyzed at its native rate; FFT and hop sizes are scaled
+        from the profile's sample rate.
+    :return: (tempo, key, segments) where segments is a list of
+        {"start", "end", "tempo", "key"} dicts, times in seconds.
+    """
+    info = sf.info(audio_path)
+    sr = info.samplerate
+    scale = sr / settings["sample_rate"] if settings.get("sample_rate") else 1
+    n_fft = int(settings["n_fft"] * scale)
+    hop_length = int(settings["hop_length"] * scale)
+
+    analyzer = BlockwiseAnalyzer(sr, **{**settings, "n_fft": n_fft, "hop_length": hop_length},
+                                 segment_seconds=segment_seconds)
+
+    # Whole hops per block plus the n_fft - hop overlap keeps frames contiguous across blocks
+    frames_per_block = max(1, int(block_seconds * sr / hop_length))
+    overlap = n_fft - hop_length
+    blocksize = frames_per_block * hop_length + overlap
+
+    log(f"📼 Blockwise analysis of {info.duration:.1f}s ({info.channels} ch) in {block_seconds:.0f}s blocks...")
+    mono = np.empty(blocksize, dtype=np.float32)
+    for block in sf.blocks(audio_path, blocksize=blocksize, overlap=overlap, dtype="float32", always_2d=True):
+        y = mono[:len(block)]
+        np.mean(block, axis=1, out=y)
+        np.nan_to_num(y, copy=False, nan=0.0, posinf=1.0, neginf=-1.0)
+        if len(y) >= n_fft:
+            analyzer.process_block(y)
+
+    tempo, key, segments = analyzer.finish()
+    log(f"✅ Blockwise analysis: tempo {tempo:.1f}, key {key}, {len(segments)} segments")
+    return tempo, key, segments
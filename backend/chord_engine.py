@@ -0,0 +1,91 @@
+"""
+Lightweight chord progression engine.
+
+Scales, triads and progressions are precomputed integer tables, so building
+a progression is a few array lookups and MIDI is written directly with mido.
+"""
+import mido
+import numpy as np
+
+# Semitone offsets of each mode's seven degrees
+MODES = {
+    "major": [0, 2, 4, 5, 7, 9, 11],
+    "dorian": [0, 2, 3, 5, 7, 9, 10],
+    "phrygian": [0, 1, 3, 5, 7, 8, 10],
+    "lydian": [0, 2, 4, 6, 7, 9, 11],
+    "mixolydian": [0, 2, 4, 5, 7, 9, 10],
+    "minor": [0, 2, 3, 5, 7, 8, 10],
+    "locrian": [0, 1, 3, 5, 6, 8, 10],
+    "harmonic_minor": [0, 2, 3, 5, 7, 8, 11],
+}
+
+# Progressions as 0-based scale degrees
+PROGRESSIONS = {
+    "I-IV-V-I": [0, 3, 4, 0],
+    "ii-V-I": [1, 4, 0],
+    "I-V-vi-IV": [0, 4, 5, 3],
+    "vi-IV-I-V": [5, 3, 0, 4],
+    "I-vi-IV-V": [0, 5, 3, 4],
+    "i-iv-v-i": [0, 3, 4, 0],
+    "i-VI-III-VII": [0, 5, 2, 6],
+}
+
+BASE_NOTE = 60  # Middle C (C4), the octave music21 uses for a bare pitch name
+
+
+def _build_triad_tables():
+    """
+    TRIADS[mode] is a (12 keys, 7 degrees, 3 notes) uint8 array of MIDI notes:
+    the root-position triad stacked in thirds on each degree of each key.
+    """
+    tables = {}
+    for mode, intervals in MODES.items():
+        scale = np.array(intervals, dtype=np.int16)
+        stack = np.arange(7)[:, None] + np.array([0, 2, 4])  # Degree indices of each triad
+        triads = scale[stack % 7] + 12 * (stack // 7)
+        keys = np.arange(12, dtype=np.int16)[:, None, None]
+        tables[mode] = (BASE_NOTE + keys + triads[None, :, :]).astype(np.uint8)
+    return tables
+
+
+TRIADS = _build_triad_tables()
+
+
+def progression_chords(key_index, mode="major", progression="I-IV-V-I", voicing="root"):
+    """
+    Chords for a progression as a (n_chords, 3) array of MIDI notes.
+    :param voicing: "root" for root-position triads, or "close" to move each
+        chord's notes by octaves to the nearest position to the previous chord.
+    """
+    if mode not in TRIADS:
+        raise ValueError(f"Unknown mode: {mode}")
+    if progression not in PROGRESSIONS:
+        raise ValueError(f"Unknown progression: {progression}")
+
+    chords = TRIADS[mode][key_index % 12, PROGRESSIONS[progression]].astype(np.int16)
+    if voicing == "close":
+        for i in range(1, len(chords)):
+            centre = chords[i - 1].mean()
+            notes = chords[i] - 12 * np.round((chords[i] - centre) / 12).astype(np.int16)
+            chords[i] = np.sort(notes)
+    elif voicing != "root":
+        raise ValueError(f"Unknown voicing: {voicing}")
+    return chords
+
+
+def progression_midi(chords, beats_per_chord=2, velocity=90, ticks_per_beat=480, program=0):
+    """Write chords as block chords on one track and return a mido.MidiFile."""
+    mid = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+    track = mido.MidiTrack()
+    mid.tracks.append(track)
+    track.append(mido.Message('program_change', program=program, time=0))
+
+    duration = int(beats_per_chord * ticks_per_beat)
+    for chord in chords:
+        notes = [int(n) for n in chord]
+        for note in notes:
+            track.append(mido.Message('note_on', note=note, velocity=velocity, time=0))
+        for i, note in enumerate(notes):
+            # The first note_off carries the chord's duration; the rest release together
+            track.append(mido.Message('note_off', note=note, velocity=0, time=duration if i == 0 else 0))
+    return mid
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.telemetry import log, CACHE_LOOKUPS
+
+
+def cache_key(y, sr, params):
+    """
+    Content address for an analysis result: hash of the decoded PCM samples,
+    their layout, the sample rate and the analysis parameters.
+    """
+    y = np.ascontiguousarray(y)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(json.dumps({"sr": sr, "dtype": str(y.dtype), "shape": y.shape, "params": params},
+                        sort_keys=True, default=str).encode())
+    h.update(memoryview(y).cast("B"))
+    return h.hexdigest()
+
+
+class FeatureCache:
+    """
+    Two-level cache for (tempo, key) results: a bounded in-process LRU in front
+    of an SQLite table that survives restarts. Pass path=None for memory only.
+    """
+
+    def __init__(self, max_entries=256, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _connect(self):
+        if self._db is None and self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS features (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.stats["hits"] += 1
+                CACHE_LOOKUPS.inc(result="hit")
+                return self._lru[key]
+
+            db = self._connect()
+            row = db.execute("SELECT value FROM features WHERE key = ?", (key,)).fetchone() if db else None
+            if row is None:
+                self.stats["misses"] += 1
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+
+            value = json.loads(row[0])
+            self._remember(key, value)
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            CACHE_LOOKUPS.inc(result="disk_hit")
+            return value
+
+    def put(self, key, value):
+        """Store a JSON-serializable value under `key` in memory and on disk."""
+        with self._lock:
+            self._remember(key, value)
+            db = self._connect()
+            if db:
+                try:
+                    db.execute("INSERT OR REPLACE INTO features (key, value) VALUES (?, ?)",
+                               (key, json.dumps(value)))
+                    db.commit()
+                except sqlite3.Error as e:
+                    log(f"⚠️ Feature cache write failed: {e}")
+
+    def clear(self):
+        """Drop every entry from memory and disk and reset the counters."""
+        with self._lock:
+            self._lru.clear()
+            db = self._connect()
+            if db:
+                db.execute("DELETE FROM features")
+                db.commit()
+            for name in self.stats:
+                self.stats[name] = 0
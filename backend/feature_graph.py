@@ -0,0 +1,146 @@
+import numpy as np
+
+from backend.hpss import hpss_masks
+from backend.lazy_imports import lazy_import
+from backend.telemetry import log, stage
+
+librosa = lazy_import("librosa")
+
+# Registry of feature nodes: name -> function(graph) computing that feature
+_NODES = {}
+
+# Nodes reported as pipeline stages in telemetry: node name -> stage name
+TIMED_NODES = {
+    "stft": "stft",
+    "hpss_masks": "hpss",
+    "onset_envelope": "onset",
+    "tempo": "beat_tracking",
+    "chroma": "chroma",
+}
+
+
+def register_node(name):
+    """Decorator registering a feature node so FeatureGraph.get(name) can build it."""
+    def decorator(func):
+        _NODES[name] = func
+        return func
+    return decorator
+
+
+class FeatureGraph:
+    """
+    Lazily computed, memoized audio features derived from a single STFT.
+
+    Each feature is a node that may depend on others via `graph.get(...)`.
+    Every node is computed at most once per graph, so the STFT, HPSS masks and
+    spectrograms are shared by every feature that needs them.
+    """
+
+    def __init__(self, y, sr, n_fft=2048, hop_length=512, hpss_margin=(1.0, 1.0), hpss=True,
+                 chroma_frames=None, hpss_backend="librosa"):
+        self.y = y
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.hpss_margin = hpss_margin
+        self.hpss = hpss  # False feeds the full spectrum to onset detection
+        self.hpss_backend = hpss_backend  # Name of a backend.hpss.HPSS_BACKENDS entry
+        self.chroma_frames = chroma_frames  # Cap on STFT frames used for chroma (None = all)
+        self._cache = {}
+
+    def get(self, name):
+        """Return the named feature, computing (and caching) it on first use."""
+        if name not in self._cache:
+            if name not in _NODES:
+                raise KeyError(f"Unknown feature: {name}")
+            if name in TIMED_NODES:
+                with stage(TIMED_NODES[name]):
+                    self._cache[name] = _NODES[name](self)
+            else:
+                self._cache[name] = _NODES[name](self)
+        return self._cache[name]
+
+    def computed(self):
+        """Names of the features computed so far."""
+        return list(self._cache)
+
+
+@register_node("stft")
+def _stft(graph):
+    return librosa.stft(graph.y, n_fft=graph.n_fft, hop_length=graph.hop_length)
+
+
+@register_node("magnitude")
+def _magnitude(graph):
+    return np.abs(graph.get("stft"))
+
+
+@register_node("power")
+def _power(graph):
+    return graph.get("magnitude") ** 2
+
+
+@register_node("hpss_masks")
+def _hpss_masks(graph):
+    """Soft (harmonic, percussive) masks, or None when disabled or the signal is too short."""
+    if not graph.hpss:
+        return None
+    if len(graph.y) < 2048:
+        log("⚠️ Audio is too short for HPSS. Skipping separation.")
+        return None
+    return hpss_masks(graph.get("magnitude"), margin=graph.hpss_margin, backend=graph.hpss_backend)
+
+
+@register_node("harmonic_magnitude")
+def _harmonic_magnitude(graph):
+    masks = graph.get("hpss_masks")
+    return graph.get("magnitude") if masks is None else graph.get("magnitude") * masks[0]
+
+
+@register_node("percussive_magnitude")
+def _percussive_magnitude(graph):
+    masks = graph.get("hpss_masks")
+    return graph.get("magnitude") if masks is None else graph.get("magnitude") * masks[1]
+
+
+@register_node("percussive_mel_db")
+def _percussive_mel_db(graph):
+    mel = librosa.feature.melspectrogram(S=graph.get("percussive_magnitude") ** 2, sr=graph.sr)
+    return librosa.power_to_db(mel)
+
+
+@register_node("onset_envelope")
+def _onset_envelope(graph):
+    return librosa.onset.onset_strength(S=graph.get("percussive_mel_db"), sr=graph.sr,
+                                        hop_length=graph.hop_length)
+
+
+@register_node("tempo")
+def _tempo(graph):
+    onset_env = graph.get("onset_envelope")
+    if not np.any(onset_env):
+        return 0
+    return librosa.beat.beat_track(onset_envelope=onset_env, sr=graph.sr, hop_length=graph.hop_length)[0]
+
+
+@register_node("chroma")
+def _chroma(graph):
+    power = graph.get("power")
+    if graph.chroma_frames and power.shape[1] > graph.chroma_frames:
+        # Evenly spaced subset of frames; key only needs the average chroma
+        power = power[:, np.linspace(0, power.shape[1] - 1, graph.chroma_frames).astype(int)]
+        return librosa.feature.chroma_stft(S=power, sr=graph.sr, n_fft=graph.n_fft,
+                                           hop_length=graph.hop_length)
+    return graph.get("full_chroma")
+
+
+@register_node("full_chroma")
+def _full_chroma(graph):
+    """Chroma for every frame, aligned with the onset envelope (model input)."""
+    return librosa.feature.chroma_stft(S=graph.get("power"), sr=graph.sr, n_fft=graph.n_fft,
+                                       hop_length=graph.hop_length)
+
+
+@register_node("key")
+def _key(graph):
+    return graph.get("chroma").mean(axis=1).argmax()
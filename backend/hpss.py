@@ -0,0 +1,69 @@
+"""
+Pluggable harmonic/percussive separation backends.
+
+Analysis only uses the percussive part to feed onset detection, so exact
+separation is not required. Every backend maps a magnitude spectrogram to
+soft (harmonic, percussive) masks of the same shape; config.HPSS_BACKEND
+selects the one FeatureGraph and the blockwise analyzer use:
+
+- "librosa": librosa.decompose.hpss (2-D median filters over the full spectrum)
+- "downsampled": the same median filters on a spectrum pooled over groups of
+  frequency bins, with the masks expanded back; several times faster and
+  agrees with "librosa" on tempo (see benchmarks/hpss_backends.py)
+"""
+import numpy as np
+
+from backend.lazy_imports import lazy_import
+
+librosa = lazy_import("librosa")
+ndimage = lazy_import("scipy.ndimage")
+
+KERNEL_SIZE = 31  # librosa's default median filter length
+FREQUENCY_POOL = 4  # Bins averaged together by the "downsampled" backend
+
+# Registry of backends: name -> function(magnitude, margin) returning (harmonic, percussive) masks
+HPSS_BACKENDS = {}
+
+
+def register_hpss_backend(name):
+    """Decorator registering an HPSS backend under `name`."""
+    def decorator(func):
+        HPSS_BACKENDS[name] = func
+        return func
+    return decorator
+
+
+def hpss_masks(magnitude, margin=(1.0, 1.0), backend="librosa"):
+    """Soft (harmonic, percussive) masks for `magnitude` using the named backend."""
+    if backend not in HPSS_BACKENDS:
+        raise ValueError(f"Unknown HPSS backend: {backend}. Choose from {', '.join(HPSS_BACKENDS)}.")
+    return HPSS_BACKENDS[backend](magnitude, margin)
+
+
+def _softmasks(harmonic, percussive, margin):
+    split_zeros = margin[0] == 1 and margin[1] == 1
+    return (librosa.util.softmask(harmonic, percussive * margin[0], power=2.0, split_zeros=split_zeros),
+            librosa.util.softmask(percussive, harmonic * margin[1], power=2.0, split_zeros=split_zeros))
+
+
+@register_hpss_backend("librosa")
+def _librosa_hpss(magnitude, margin):
+    return librosa.decompose.hpss(magnitude, kernel_size=KERNEL_SIZE, margin=margin, mask=True)
+
+
+@register_hpss_backend("downsampled")
+def _downsampled_hpss(magnitude, margin, pool=FREQUENCY_POOL):
+    n_bins, n_frames = magnitude.shape
+    groups = -(-n_bins // pool)
+    padded = magnitude
+    if groups * pool != n_bins:
+        padded = np.pad(magnitude, ((0, groups * pool - n_bins), (0, 0)), mode="edge")
+    pooled = padded.reshape(groups, pool, n_frames).mean(axis=1)
+
+    # Harmonic: median across time (unchanged). Percussive: median across the pooled bins,
+    # with the kernel shortened so it spans roughly the same frequency range.
+    perc_kernel = max(3, (KERNEL_SIZE // pool) | 1)
+    harmonic = ndimage.median_filter(pooled, size=(1, KERNEL_SIZE), mode="reflect")
+    percussive = ndimage.median_filter(pooled, size=(perc_kernel, 1), mode="reflect")
+
+    return tuple(np.repeat(mask, pool, axis=0)[:n_bins] for mask in _softmasks(harmonic, percussive, margin))
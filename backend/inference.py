@@ -0,0 +1,323 @@
+"""
+Micro-batched key/tempo model inference.
+
+Callers hand their feature windows to a BatchingPredictor. Its worker
+thread groups concurrent requests until INFERENCE_MAX_BATCH requests are
+waiting or the oldest has waited INFERENCE_MAX_WAIT_MS, runs one forward
+pass on the stacked batch, and returns each caller its own result.
+
+Analysis runs in many processes (job workers, batch_analyze workers), and a
+predictor only batches requests from its own process. So the server and the
+batch CLI call start_server(): the model is then loaded once, in one shared
+inference process, and get_predictor() in every process started afterwards
+returns a proxy that sends requests to it. Requests from all workers meet in
+that process's single BatchingPredictor. Without a server, get_predictor()
+loads the model in the calling process.
+
+Supported model files:
+- .keras / .h5: tf.keras model from backend.model_training (dict output)
+- .pth / .pt: TorchScript module returning key logits, or (key logits, tempo)
+- .npz: dense ReLU network as arrays W0, b0, W1, b1, ... (last layer = 12 key
+  logits, plus an optional 13th tempo output), evaluated with NumPy
+
+A missing or empty model file means no model. Analysis then keeps the
+chroma.mean(axis=1).argmax() key heuristic.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+import config
+from backend.lazy_imports import lazy_import
+from backend.telemetry import log, stage
+
+INFERENCE_SERVER_ENV = "HARMONY_INFERENCE_SERVER"  # host:port of the shared inference process, for workers
+
+tf = lazy_import("tensorflow")
+torch = lazy_import("torch")
+
+# Registry of loaders: file extension -> function(path) returning forward(batch) -> (key probs, tempos or None)
+MODEL_LOADERS = {}
+
+
+def register_loader(*extensions):
+    """Decorator registering a model loader for the given file extensions."""
+    def decorator(func):
+        for extension in extensions:
+            MODEL_LOADERS[extension] = func
+        return func
+    return decorator
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+@register_loader(".keras", ".h5")
+def _load_keras(path):
+    model = tf.keras.models.load_model(path)
+
+    def forward(batch):
+        outputs = model(batch, training=False)
+        return np.asarray(outputs["key"]), np.asarray(outputs["tempo"])[:, 0]
+    return forward
+
+
+@register_loader(".pth", ".pt")
+def _load_torch(path):
+    torch.set_num_threads(max(1, os.cpu_count() or 1))
+    model = torch.jit.load(path, map_location="cpu").eval()
+
+    def forward(batch):
+        with torch.inference_mode():
+            outputs = model(torch.from_numpy(batch))
+        logits, tempo = outputs if isinstance(outputs, (tuple, list)) else (outputs, None)
+        tempo = None if tempo is None else tempo.reshape(-1).numpy()
+        return _softmax(logits.numpy().astype(np.float32)), tempo
+    return forward
+
+
+@register_loader(".npz")
+def _load_numpy(path):
+    with np.load(path) as data:
+        layers = [(data[f"W{i}"].astype(np.float32), data[f"b{i}"].astype(np.float32))
+                  for i in range(len(data.files) // 2)]
+
+    def forward(batch):
+        x = batch.reshape(len(batch), -1)
+        for i, (weights, bias) in enumerate(layers):
+            x = x @ weights + bias
+            if i < len(layers) - 1:
+                np.maximum(x, 0.0, out=x)
+        return _softmax(x[:, :12].copy()), (x[:, 12] if x.shape[1] > 12 else None)
+    return forward
+
+
+def load_model(path):
+    """forward(batch) for the model file at `path`, or None when there is no usable model."""
+    if not path:
+        return None
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        log(f"ℹ️ No model at {path}; using the chroma key heuristic.")
+        return None
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in MODEL_LOADERS:
+        raise ValueError(f"Unsupported model format: {extension}. Use one of {', '.join(MODEL_LOADERS)}.")
+    started = time.perf_counter()
+    forward = MODEL_LOADERS[extension](path)
+    log(f"🧠 Loaded model {path} in {time.perf_counter() - started:.2f}s")
+    return forward
+
+
+class BatchingPredictor:
+    """Groups concurrent predict() calls into micro-batches for one forward function."""
+
+    def __init__(self, forward, max_batch=config.INFERENCE_MAX_BATCH, max_wait_ms=config.INFERENCE_MAX_WAIT_MS):
+        self.forward = forward
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="inference")
+        self._thread.start()
+
+    def submit(self, windows):
+        """Queue one request's windows (n, frames, features); returns a Future of (key, tempo)."""
+        future = Future()
+        self._queue.put((np.asarray(windows, dtype=np.float32), future))
+        return future
+
+    def predict(self, windows, timeout=None):
+        """Blocking (key, tempo) for one request's windows; tempo is None if the model has no tempo head."""
+        return self.submit(windows).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            sizes = [len(windows) for windows, _ in batch]
+            try:
+                with stage("inference"):
+                    key_probs, tempos = self.forward(np.concatenate([windows for windows, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            start = 0
+            for size, (_, future) in zip(sizes, batch):
+                # A request's windows vote: average key probabilities, median tempo
+                key = int(key_probs[start:start + size].mean(axis=0).argmax())
+                tempo = None if tempos is None else float(np.median(tempos[start:start + size]))
+                future.set_result((key, tempo))
+                start += size
+
+    def stats(self):
+        """Forward passes and requests served so far."""
+        return {"batches": self.batches, "requests": self.requests}
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def feature_windows(graph, window=config.TRAINING_WINDOW_FRAMES):
+    """Model input windows (chroma + onset, as in backend.training_data) from a FeatureGraph."""
+    from backend.training_data import windows_from_features
+
+    return windows_from_features(graph.get("full_chroma"), graph.get("onset_envelope"), window)
+
+
+def model_signature(path=None):
+    """Identifies the configured model for cache keys: path, size and mtime, or None."""
+    path = path if path is not None else config.INFERENCE_MODEL_PATH
+    if not path:
+        return None
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.basename(path), stat.st_size, stat.st_mtime_ns] if stat.st_size else None
+
+
+_predictor = None
+_predictor_loaded = False
+_predictor_lock = threading.Lock()
+_server = None
+
+
+def _load_predictor(path=None, **batching):
+    try:
+        forward = load_model(path or config.INFERENCE_MODEL_PATH)
+    except Exception as e:
+        log(f"❌ Could not load model: {e}. Using the chroma key heuristic.")
+        forward = None
+    return BatchingPredictor(forward, **batching) if forward is not None else None
+
+
+def _connect(address):
+    """Proxy for the shared process's predictor, or None if that process has no model."""
+    host, port = address.rsplit(":", 1)
+    manager = InferenceManager(address=(host, int(port)))
+    manager.connect()
+    proxy = manager.predictor()
+    return proxy if proxy.stats() is not None else None
+
+
+def get_predictor():
+    """
+    This process's predictor, created on first use; None without a model.
+    A proxy to the shared inference process when one was started (see start_server).
+    """
+    global _predictor, _predictor_loaded
+    with _predictor_lock:
+        if not _predictor_loaded:
+            _predictor_loaded = True
+            address = os.environ.get(INFERENCE_SERVER_ENV)
+            if address:
+                try:
+                    _predictor = _connect(address)
+                    return _predictor
+                except Exception as e:
+                    log(f"⚠️ Inference server at {address} unreachable ({e}); loading the model locally.")
+            _predictor = _load_predictor()
+        return _predictor
+
+
+class SharedPredictor:
+    """The inference process's BatchingPredictor, as served to other processes."""
+
+    def __init__(self, settings):
+        self.predictor = _load_predictor(**settings)
+
+    def predict(self, windows, timeout=None):
+        if self.predictor is None:
+            raise RuntimeError("The inference server has no model.")
+        return self.predictor.predict(windows, timeout)
+
+    def stats(self):
+        """Batching counters, or None when there is no model."""
+        return None if self.predictor is None else self.predictor.stats()
+
+
+_shared = None
+_server_settings = {}
+
+
+def _configure_server(settings):
+    """Runs first in the inference process: model path and batching limits from the parent."""
+    _server_settings.update(settings)
+
+
+def _shared_predictor():
+    global _shared
+    if _shared is None:  # Every client gets the same instance, so their requests batch together
+        _shared = SharedPredictor(_server_settings)
+    return _shared
+
+
+class InferenceManager(BaseManager):
+    """Runs the shared inference process and connects to it."""
+
+
+InferenceManager.register("predictor", callable=_shared_predictor, exposed=("predict", "stats"))
+
+
+def start_server(path=None, max_batch=None, max_wait_ms=None):
+    """
+    Start the shared inference process and point processes started later (job and
+    batch workers) at it through the INFERENCE_SERVER_ENV environment variable.
+    Does nothing without a model, or if a server is already known.
+    :param path: Model file (default config.INFERENCE_MODEL_PATH); batching limits default to config too.
+    :return: The InferenceManager, or None.
+    """
+    global _server
+    settings = {"path": path or config.INFERENCE_MODEL_PATH,
+                "max_batch": max_batch or config.INFERENCE_MAX_BATCH,
+                "max_wait_ms": config.INFERENCE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms}
+    with _predictor_lock:
+        if _server is not None or os.environ.get(INFERENCE_SERVER_ENV) or model_signature(settings["path"]) is None:
+            return _server
+        started = time.perf_counter()
+        # Spawned: the caller may already run threads that a forked child must not inherit
+        manager = InferenceManager(address=("127.0.0.1", 0), ctx=multiprocessing.get_context("spawn"))
+        manager.start(_configure_server, (settings,))  # Shut down automatically when this process exits
+        host, port = manager.address
+        os.environ[INFERENCE_SERVER_ENV] = f"{host}:{port}"
+        _server = manager
+    log(f"🧠 Inference server listening on {host}:{port} ({time.perf_counter() - started:.2f}s)")
+    return manager
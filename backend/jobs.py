@@ -0,0 +1,233 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_current = threading.local()  # The job running on this thread, for emit()
+
+
+def emit(event, data=None):
+    """
+    Publish a progress event from inside a running thread job (e.g. a provisional
+    tempo); a no-op anywhere else, so tasks also work when called directly.
+    Every call is also a cancellation point (see check_cancelled).
+    """
+    check_cancelled()
+    job = getattr(_current, "job", None)
+    if job is not None:
+        job.emit(event, data)
+
+
+def check_cancelled():
+    """Raise JobCancelled if the thread job running on this thread has been cancelled."""
+    job = getattr(_current, "job", None)
+    if job is not None and job.cancel_requested.is_set():
+        raise JobCancelled(f"Job {job.id} cancelled.")
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a cancelled thread job at its next emit()/check_cancelled().
+    A BaseException, like asyncio.CancelledError, so a task's own
+    `except Exception` handlers do not swallow it.
+    """
+
+
+class Job:
+    """A unit of background work and its outcome."""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        self.kind = None
+        self.cancel_requested = threading.Event()  # Checked by the task itself; see check_cancelled()
+        self.done_event = threading.Event()
+        # Progress events as (id, event, data); ids start at 1 so 0 means "from the start"
+        self.events = []
+        self.closed = False  # Set once the final done/failed/cancelled event is published
+        self._events_changed = threading.Condition(threading.RLock())
+
+    def emit(self, event, data=None):
+        with self._events_changed:
+            if self.closed:
+                return
+            self.events.append((len(self.events) + 1, event, data))
+            self._events_changed.notify_all()
+
+    def close_events(self, event, data=None):
+        """Publish the final event; later emit() calls are ignored."""
+        with self._events_changed:
+            self.emit(event, data)
+            self.closed = True
+
+    def events_since(self, last_id=0, timeout=0):
+        """
+        Events after `last_id`, waiting up to `timeout` seconds for one if there are none yet.
+        :return: (events, closed); `closed` means no further events will follow.
+        """
+        with self._events_changed:
+            if len(self.events) <= last_id and not self.closed and timeout:
+                self._events_changed.wait(timeout)
+            return self.events[last_id:], self.closed
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """
+    Bounded background job runner.
+
+    I/O-bound work (recording, playback) runs on a thread pool and CPU-bound
+    work (librosa analysis) on a process pool. At most `max_pending` jobs may be
+    queued or running at once; further submissions raise QueueFull.
+
+    Worker processes are spawned rather than forked: the server already runs
+    threads (inference batcher, upload sweeper) and holds a SQLite connection
+    (feature_cache) that a forked child must not inherit.
+    """
+
+    def __init__(self, thread_workers=4, process_workers=None, max_pending=16, result_ttl=600):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._threads = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="job")
+        self._process_workers = process_workers or os.cpu_count() or 1
+        self._processes = None  # Created on first CPU-bound job
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, kind):
+        if kind == "process":
+            with self._lock:
+                if self._processes is None:
+                    self._processes = ProcessPoolExecutor(max_workers=self._process_workers,
+                                                          mp_context=multiprocessing.get_context("spawn"))
+            return self._processes
+        return self._threads
+
+    def pending(self):
+        """
+        Number of jobs queued or running. A cancelled job still counts until its
+        worker is actually free, so cancelling cannot be used to bypass the limit.
+        """
+        with self._lock:
+            return self._unfinished()
+
+    def _unfinished(self):
+        return sum(1 for job in self._jobs.values() if job.finished is None)
+
+    def submit(self, name, func, *args, kind="thread", **kwargs):
+        """Queue `func(*args, **kwargs)` and return its Job immediately."""
+        self._prune()
+        job = Job(name)
+        job.kind = kind
+        executor = self._executor(kind)
+        with self._lock:
+            if self._unfinished() >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} pending).")
+            self._jobs[job.id] = job
+            # Submitted under the lock so cancel() always sees the future
+            if kind == "process":
+                # Process pool futures only report "running" once picked up; mark it on submit
+                job.status = RUNNING
+                job.future = executor.submit(func, *args, **kwargs)
+            else:
+                job.future = executor.submit(self._run, job, func, args, kwargs)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        with self._lock:
+            if job.status == CANCELLED:
+                return None
+            job.status = RUNNING
+        _current.job = job
+        try:
+            return func(*args, **kwargs)
+        except JobCancelled:
+            return None
+        finally:
+            _current.job = None
+
+    def _finish(self, job, future):
+        if job.status != CANCELLED:
+            try:
+                job.result = future.result()
+                job.status = DONE
+            except CancelledError:
+                job.status = CANCELLED
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+        job.finished = time.time()
+        job.close_events(job.status, {"result": job.result} if job.status == DONE else {"error": job.error})
+        job.done_event.set()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes or `timeout` seconds pass; returns the Job."""
+        job = self.get(job_id)
+        if job:
+            job.done_event.wait(timeout)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs never start. A running thread job is asked to
+        stop and ends at its next emit()/check_cancelled(); it still counts as
+        pending until then. A process job that the pool has already dispatched to a
+        worker cannot be interrupted and is not cancelled.
+        :return: False if the job is unknown, finished, or running in a worker process.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished is not None or job.status == CANCELLED:
+                return False
+            if job.kind == "process" and not job.future.cancel():
+                return False
+            job.status = CANCELLED
+            job.cancel_requested.set()
+            job.future.cancel()
+        return True
+
+    def _prune(self):
+        """Forget finished jobs older than `result_ttl` seconds."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
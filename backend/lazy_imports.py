@@ -0,0 +1,46 @@
+import importlib
+import threading
+
+import config
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    The proxy is deliberately not registered in sys.modules, so tools that
+    walk every loaded module (inspect, lazy_loader, numba) cannot trigger the
+    import by accident.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Import a module on first attribute access instead of at import time.
+
+    Heavy dependencies (librosa + numba, sounddevice, pygame, tensorflow) then
+    cost nothing for code paths that never touch them. With
+    config.LAZY_IMPORTS off this is a plain import.
+    """
+    if not config.LAZY_IMPORTS:
+        return importlib.import_module(name)
+    return LazyModule(name)
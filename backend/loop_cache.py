@@ -0,0 +1,115 @@
+"""
+Pre-rendered audio loops of generated music, cached on disk.
+
+A loop (piano progression and beat mixed by backend.mixer.render_parts) is
+rendered once per (tempo, key, pattern, SoundFont, renderer) and stored as
+config.LOOP_FORMAT under config.LOOP_CACHE_DIR, named by a hash of those
+inputs. api.py serves the files with HTTP Range support, so any number of
+browser clients can play a result without further server-side synthesis.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import soundfile as sf
+
+import config
+from backend import beat_generation, midi_cache, mixer, piano_generation
+from backend.telemetry import log, stage
+
+LOOP_VERSION = 2  # Bump when rendering changes so stale loops are not served
+FORMATS = {"wav": "WAV", "flac": "FLAC"}
+
+_soundfont_hashes = {}
+_render_locks = {}
+_locks_lock = threading.Lock()
+
+
+def cache_dir():
+    """Directory of rendered loops (config.LOOP_CACHE_DIR, relative to the repo root)."""
+    path = config.LOOP_CACHE_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    return path
+
+
+def soundfont_hash(path=config.SOUNDFONT_PATH):
+    """Content hash of the SoundFont, memoized per (path, size, mtime); "none" if it is missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "none"
+    marker = (path, stat.st_size, stat.st_mtime_ns)
+    if marker not in _soundfont_hashes:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _soundfont_hashes[marker] = digest.hexdigest()
+    return _soundfont_hashes[marker]
+
+
+def loop_name(tempo, key_index, mode="major", progression="I-IV-V-I", voicing="root", fmt=None):
+    """File name of the loop for these parameters (also its cache key)."""
+    fmt = fmt or config.LOOP_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown loop format: {fmt}. Choose from {', '.join(FORMATS)}.")
+    params = {
+        "version": LOOP_VERSION, "tempo": int(tempo), "key": key_index, "mode": mode,
+        "progression": progression, "voicing": voicing, "piano_backend": config.PIANO_BACKEND,
+        "renderer": config.PLAYBACK_RENDERER, "soundfont": soundfont_hash(),
+        "sample_rate": config.AUDIO_SAMPLE_RATE,
+    }
+    digest = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=12).hexdigest()
+    return f"loop-{digest}.{fmt}"
+
+
+def cached_loop(tempo, key, mode="major", progression="I-IV-V-I", voicing="root", fmt=None):
+    """Name of an already rendered loop, or None."""
+    name = loop_name(tempo, piano_generation.validate_key_index(key), mode, progression, voicing, fmt)
+    return name if os.path.exists(os.path.join(cache_dir(), name)) else None
+
+
+def render_loop(tempo, key, mode="major", progression="I-IV-V-I", voicing="root", fmt=None):
+    """
+    Render the piano progression and beat into one loop file, unless it is cached.
+    :return: The loop's file name inside cache_dir().
+    """
+    key_index = piano_generation.validate_key_index(key)
+    name = loop_name(tempo, key_index, mode, progression, voicing, fmt)
+    path = os.path.join(cache_dir(), name)
+
+    with _locks_lock:
+        lock = _render_locks.setdefault(name, threading.Lock())
+    try:
+        with lock:  # Concurrent requests for the same loop render it once
+            if os.path.exists(path):
+                log(f"⚡ Using cached loop {name}")
+                return name
+
+            piano = piano_generation.build_piano_progression(key_index, mode, progression, voicing)
+            beat = midi_cache.from_bytes(beat_generation.beat_midi_bytes(int(tempo)))
+            with stage("loop_render"):
+                audio = mixer.render_parts([piano, beat])
+
+            directory = cache_dir()
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            os.close(fd)
+            try:
+                sf.write(tmp_path, audio, config.AUDIO_SAMPLE_RATE, format=FORMATS[name.rsplit(".", 1)[1]])
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)  # e.g. disk full: don't leave a partial file behind
+                except OSError:
+                    pass
+                raise
+            log(f"✅ Rendered loop {name} ({len(audio) / config.AUDIO_SAMPLE_RATE:.2f}s)")
+        return name
+    finally:
+        with _locks_lock:
+            if _render_locks.get(name) is lock:
+                del _render_locks[name]
@@ -0,0 +1,45 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import mido
+
+import config
+
+
+def to_bytes(mid):
+    """Serialize a mido.MidiFile to Standard MIDI File bytes."""
+    buffer = io.BytesIO()
+    mid.save(file=buffer)
+    return buffer.getvalue()
+
+
+def from_bytes(data):
+    """Parse Standard MIDI File bytes into a mido.MidiFile."""
+    return mido.MidiFile(file=io.BytesIO(data))
+
+
+def output_dir():
+    """Directory for generated MIDI files (config.MIDI_OUTPUT_DIR, relative to the repo root)."""
+    path = config.MIDI_OUTPUT_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    return path
+
+
+def save_midi(data, prefix):
+    """
+    Write MIDI bytes to a content-addressed file and return its path.
+    Identical content always maps to the same file, which is written only once
+    (atomically), so concurrent requests never clobber each other's output.
+    """
+    directory = output_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{prefix}-{hashlib.sha1(data).hexdigest()[:16]}.mid")
+    if not os.path.exists(path):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path
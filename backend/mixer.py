@@ -0,0 +1,498 @@
+"""
+Mixing playback engine: every part is rendered into one audio stream.
+
+Beat and piano used to play through separate synths (or processes) started
+a second apart, so they drifted and each loop restarted with a gap. Here
+all parts share one sample clock. A playback's parts start on the same
+sample, and each loop restarts exactly one MIDI length (rounded to samples,
+without accumulating rounding error) after the previous pass.
+
+Rendering is pulled by the output: a sounddevice.OutputStream callback, or
+a background thread for the "file" and "null" outputs used on headless
+machines. Samples come from pyfluidsynth's offline renderer when available,
+otherwise from a small built-in synth.
+"""
+import math
+import os
+import threading
+import time
+from fractions import Fraction
+
+import numpy as np
+import soundfile as sf
+
+import config
+from backend.lazy_imports import lazy_import
+from backend.synth import get_synth, midi_events
+from backend.telemetry import log
+
+sd = lazy_import("sounddevice")
+
+CHANNELS = 2
+
+
+class FluidSynthRenderer:
+    """Renders through pyfluidsynth without an audio driver (get_samples)."""
+
+    def __init__(self, sample_rate, soundfont=config.SOUNDFONT_PATH):
+        import fluidsynth  # Optional dependency
+
+        self.synth = fluidsynth.Synth(samplerate=float(sample_rate))
+        self.sfid = self.synth.sfload(soundfont)
+        for channel in range(16):
+            if channel != 9:  # Channel 10 keeps the GM percussion bank
+                self.synth.program_select(channel, self.sfid, 0, 0)
+
+    def send(self, msg):
+        if msg.type == "note_on" and msg.velocity > 0:
+            self.synth.noteon(msg.channel, msg.note, msg.velocity)
+        elif msg.type in ("note_on", "note_off"):
+            self.synth.noteoff(msg.channel, msg.note)
+        elif msg.type == "program_change":
+            self.synth.program_change(msg.channel, msg.program)
+        elif msg.type == "control_change":
+            self.synth.cc(msg.channel, msg.control, msg.value)
+
+    def note_off(self, channel, note):
+        self.synth.noteoff(channel, note)
+
+    def render(self, out):
+        samples = self.synth.get_samples(len(out))  # Interleaved stereo int16
+        out += samples.reshape(-1, CHANNELS) * (1.0 / 32768)
+
+    @property
+    def active(self):
+        return False  # Release tails are covered by the engine's fixed tail
+
+    def close(self):
+        self.synth.delete()
+
+
+class SimpleRenderer:
+    """Minimal additive synth (decaying sines) so playback works without a SoundFont."""
+
+    RELEASE = 0.08  # Seconds of fade-out after note_off
+    DECAY = 1.5  # Seconds for a held note to fall by 1/e
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.voices = {}  # (channel, note) -> [frequency, amplitude, age in samples, release left or None]
+
+    def send(self, msg):
+        if msg.type == "note_on" and msg.velocity > 0:
+            frequency = 440.0 * 2 ** ((msg.note - 69) / 12)
+            self.voices[(msg.channel, msg.note)] = [frequency, 0.2 * msg.velocity / 127, 0, None]
+        elif msg.type in ("note_on", "note_off"):
+            self.note_off(msg.channel, msg.note)
+
+    def note_off(self, channel, note):
+        voice = self.voices.get((channel, note))
+        if voice is not None and voice[3] is None:
+            voice[3] = int(self.RELEASE * self.sample_rate)
+
+    def render(self, out):
+        n = len(out)
+        t = np.arange(n)
+        for key, voice in list(self.voices.items()):
+            frequency, amplitude, age, release = voice
+            envelope = amplitude * np.exp(-(age + t) / (self.DECAY * self.sample_rate))
+            if release is not None:
+                envelope *= np.clip((release - t) / (self.RELEASE * self.sample_rate), 0.0, 1.0)
+                voice[3] = release - n
+                if voice[3] <= 0:
+                    del self.voices[key]
+            out += (envelope * np.sin(2 * np.pi * frequency * (age + t) / self.sample_rate))[:, None]
+            voice[2] = age + n
+
+    @property
+    def active(self):
+        return bool(self.voices)
+
+    def close(self):
+        self.voices.clear()
+
+
+def make_renderer(sample_rate, name=config.PLAYBACK_RENDERER):
+    """Renderer by name: "fluidsynth", "simple", or "auto" (fluidsynth if installed)."""
+    if name in ("auto", "fluidsynth"):
+        try:
+            return FluidSynthRenderer(sample_rate)
+        except ImportError:
+            if name == "fluidsynth":
+                raise
+    return SimpleRenderer(sample_rate)
+
+
+class Track:
+    """One MIDI part scheduled on the engine's sample clock."""
+
+    def __init__(self, midi_file, sample_rate, start, loop=False):
+        events, length = midi_events(midi_file)
+        self.offsets = [int(round(offset * sample_rate)) for offset, _ in events]
+        self.messages = [msg for _, msg in events]
+        self.length = length * sample_rate  # Samples, kept fractional so loops don't drift
+        self.start = start
+        self.loop = loop and self.length > 0
+        self.passes = 0
+        self.index = 0
+        self.sounding = set()
+        self.finished = not events  # Nothing to play, even when looping
+
+    def pass_start(self):
+        return self.start + int(round(self.passes * self.length))
+
+    def next_due(self):
+        """Sample at which the next event is due, or None when the track is over."""
+        if self.finished:
+            return None
+        if self.index == len(self.messages):
+            if not self.loop:
+                self.finished = True
+                return None
+            self.passes += 1
+            self.index = 0
+        return self.pass_start() + self.offsets[self.index]
+
+    def pop(self):
+        msg = self.messages[self.index]
+        self.index += 1
+        if msg.type == "note_on" and msg.velocity > 0:
+            self.sounding.add((msg.channel, msg.note))
+        elif msg.type in ("note_on", "note_off"):
+            self.sounding.discard((msg.channel, msg.note))
+        return msg
+
+
+class Playback:
+    """Handle for parts started together; mirrors synth.Player (stop/wait/playing)."""
+
+    def __init__(self, engine, tracks):
+        self.engine = engine
+        self.tracks = tracks
+        self.done = threading.Event()
+
+    def stop(self):
+        self.engine.stop(self)
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    @property
+    def playing(self):
+        return not self.done.is_set()
+
+
+class MixerEngine:
+    """Renders all active playbacks into one stereo stream on a shared sample clock."""
+
+    def __init__(self, sample_rate=config.AUDIO_SAMPLE_RATE, output=config.PLAYBACK_OUTPUT,
+                 block_size=config.PLAYBACK_BLOCK_SIZE, renderer=config.PLAYBACK_RENDERER, path=None):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.renderer = make_renderer(sample_rate, renderer)
+        self.clock = 0  # Samples rendered so far
+        self._tail_end = 0  # Keep rendering until here after the last playback ends (release tails)
+        self.playbacks = []
+        self._lock = threading.Lock()
+        self._buffer = np.zeros((block_size, CHANNELS), dtype=np.float32)
+        self.output = make_output(output, self, path) if output else None  # None: render() is driven by the caller
+
+    def play(self, midi_files, loop=False, at=None):
+        """
+        Start every MIDI file (path or mido.MidiFile) on the same sample; returns a Playback.
+        :param at: Start sample on the engine clock (default: one block from now).
+        """
+        with self._lock:
+            start = self.clock + self.block_size if at is None else at  # One block's lead reaches every part
+            playback = Playback(self, [Track(f, self.sample_rate, start, loop) for f in midi_files])
+            self.playbacks.append(playback)
+        if self.output is not None:
+            try:
+                self.output.start()
+            except Exception:
+                self.stop(playback)  # Never played; don't leave it scheduled
+                raise
+        log(f"🎚️ Mixing {len(midi_files)} part(s){' in a loop' if loop else ''} at sample {start}")
+        return playback
+
+    def stop(self, playback):
+        with self._lock:
+            self._finish(playback)
+
+    def stop_all(self):
+        with self._lock:
+            for playback in list(self.playbacks):
+                self._finish(playback)
+
+    def _finish(self, playback):
+        for track in playback.tracks:
+            for channel, note in track.sounding:
+                self.renderer.note_off(channel, note)
+            track.sounding.clear()
+            track.finished = True
+        if playback in self.playbacks:
+            self.playbacks.remove(playback)
+        self._tail_end = self.clock + self.sample_rate // 2
+        playback.done.set()
+
+    @property
+    def active(self):
+        return bool(self.playbacks) or self.renderer.active or self.clock < self._tail_end
+
+    def render(self, frames):
+        """Render the next `frames` samples (shape (frames, 2), float32) and advance the clock."""
+        if len(self._buffer) < frames:
+            self._buffer = np.zeros((frames, CHANNELS), dtype=np.float32)
+        out = self._buffer[:frames]
+        out.fill(0.0)
+        with self._lock:
+            end = self.clock + frames
+            position = self.clock
+            while True:
+                # Earliest due event across every track in this block
+                due, track = min(((t.next_due(), t) for p in self.playbacks for t in p.tracks
+                                  if t.next_due() is not None), key=lambda item: item[0], default=(None, None))
+                if due is None or due >= end:
+                    break
+                due = max(due, position)
+                if due > position:
+                    self.renderer.render(out[position - self.clock:due - self.clock])
+                    position = due
+                self.renderer.send(track.pop())
+            if position < end:
+                self.renderer.render(out[position - self.clock:])
+            for playback in [p for p in self.playbacks if all(t.next_due() is None for t in p.tracks)]:
+                self._finish(playback)
+            self.clock = end
+        np.clip(out, -1.0, 1.0, out=out)
+        return out
+
+    def close(self):
+        self.stop_all()
+        if self.output is not None:
+            self.output.stop()
+        self.renderer.close()
+
+
+def loop_periods(lengths, sample_rate=config.AUDIO_SAMPLE_RATE, max_length=config.LOOP_MAX_SECONDS):
+    """
+    Loop length in which every part completes a whole number of passes, and each part's period.
+    The loop is the least common multiple of the part lengths (as fractions of a
+    sample). If that exceeds `max_length` seconds, the loop is the longest part and
+    each shorter part is stretched slightly to fit a whole number of passes into it.
+    :return: (loop length, [period per part]), in seconds.
+    """
+    fractions = [Fraction(length).limit_denominator(sample_rate) for length in lengths]
+    common = Fraction(0)
+    for length in fractions:
+        if length > 0:
+            common = length if not common else Fraction(math.lcm(common.numerator, length.numerator),
+                                                        math.gcd(common.denominator, length.denominator))
+    if common <= max_length:
+        return float(common), [float(length) for length in fractions]
+    longest = max(fractions)
+    return float(longest), [float(longest / max(1, round(longest / length))) if length > 0 else 0.0
+                            for length in fractions]
+
+
+def render_parts(midi_files, sample_rate=config.AUDIO_SAMPLE_RATE, renderer=config.PLAYBACK_RENDERER,
+                 tail=0.5):
+    """
+    Render parts offline into one seamless loop (see loop_periods for its length).
+    Every part loops a whole number of times inside it, and the release tail past
+    the end is wrapped onto the start so the result can be played back-to-back
+    without a click or a cut-off pass.
+    :return: float32 array shaped (samples, 2).
+    """
+    engine = MixerEngine(sample_rate=sample_rate, output=None, renderer=renderer)
+    try:
+        length, periods = loop_periods([midi_events(f)[1] for f in midi_files], sample_rate)
+        total = int(round(length * sample_rate))
+        tail_samples = int(tail * sample_rate)
+        playback = engine.play(midi_files, loop=True, at=0)
+        for track, period in zip(playback.tracks, periods):
+            track.length = period * sample_rate
+        audio = np.empty((total + tail_samples, CHANNELS), dtype=np.float32)
+        position = 0
+        while position < total:
+            frames = min(engine.block_size, total - position)
+            audio[position:position + frames] = engine.render(frames)
+            position += frames
+        engine.stop_all()  # Release held notes; their tails wrap onto the start
+        while position < len(audio):
+            frames = min(engine.block_size, len(audio) - position)
+            audio[position:position + frames] = engine.render(frames)
+            position += frames
+        loop = audio[:total]
+        loop[:tail_samples] += audio[total:total + tail_samples][:total]
+        np.clip(loop, -1.0, 1.0, out=loop)
+        return loop
+    finally:
+        engine.close()
+
+
+class SoundDeviceOutput:
+    """Plays the engine through a sounddevice.OutputStream callback."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.stream = None
+
+    def _callback(self, outdata, frames, time_info, status):
+        outdata[:] = self.engine.render(frames)
+
+    def start(self):
+        if self.stream is None:
+            self.stream = sd.OutputStream(samplerate=self.engine.sample_rate, channels=CHANNELS, dtype="float32",
+                                          blocksize=self.engine.block_size, callback=self._callback)
+            self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class ThreadOutput:
+    """
+    Pulls blocks on a background thread while anything is playing, writing them
+    to a WAV file (`path`, relative to the repo root) or discarding them (path
+    None). The file is created on first use and later playbacks are appended to
+    it until stop(). Paced in real time unless `realtime` is False, which
+    renders as fast as possible.
+    """
+
+    def __init__(self, engine, path=None, realtime=True):
+        self.engine = engine
+        self.path = path
+        self.realtime = realtime
+        self.sink = None
+        self._thread = None
+        self._running = False  # Set by start(), cleared by _run() under the lock once nothing plays
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return  # The running thread re-checks engine.active under the lock before exiting
+            if self.path and self.sink is None:
+                path = self.path
+                if not os.path.isabs(path):
+                    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.sink = sf.SoundFile(path, "w", samplerate=self.engine.sample_rate, channels=CHANNELS)
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True, name="mixer-output")
+            self._thread.start()
+
+    def _run(self):
+        try:
+            started = time.monotonic()
+            rendered = 0
+            while True:
+                with self._lock:
+                    if not self.engine.active:
+                        self._running = False
+                        break
+                block = self.engine.render(self.engine.block_size)
+                if self.sink is not None:
+                    self.sink.write(block)
+                rendered += len(block)
+                if self.realtime:
+                    delay = started + rendered / self.engine.sample_rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            with self._lock:
+                self._running = False
+                if self.sink is not None:
+                    self.sink.flush()  # Keep the WAV header valid between playbacks
+
+    def stop(self):
+        thread = self._thread
+        if thread is not None:
+            thread.join(1)
+        with self._lock:
+            if self.sink is not None and not self._running:
+                self.sink.close()
+                self.sink = None
+
+    def wait(self, timeout=None):
+        """Block until the output has drained (file/null outputs only)."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+def make_output(name, engine, path=None):
+    """Output device by name: "sounddevice", "file" (WAV at `path`) or "null"."""
+    if name == "sounddevice":
+        return SoundDeviceOutput(engine)
+    if name == "file":
+        return ThreadOutput(engine, path or config.PLAYBACK_FILE)
+    if name == "null":
+        return ThreadOutput(engine)
+    raise ValueError(f"Unknown playback output: {name}")
+
+
+class PlayerGroup:
+    """Several synth.Player objects behind the Playback interface (legacy "synth" engine)."""
+
+    def __init__(self, players):
+        self.players = players
+
+    def stop(self):
+        for player in self.players:
+            player.stop()
+
+    def wait(self, timeout=None):
+        for player in self.players:
+            player.wait(timeout)
+
+    @property
+    def playing(self):
+        return any(player.playing for player in self.players)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide MixerEngine, created on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MixerEngine()
+        return _engine
+
+
+def play_parts(midi_files, loop=False):
+    """
+    Start MIDI parts together on the engine chosen by config.PLAYBACK_ENGINE.
+    :return: A handle with stop(), wait() and `playing`.
+    """
+    if config.PLAYBACK_ENGINE == "mixer":
+        return get_engine().play(midi_files, loop=loop)
+
+    # Legacy realtime synth: schedule every part on the same monotonic start time
+    synth = get_synth()
+    at = time.monotonic() + 0.05
+    return PlayerGroup([synth.play(f, loop=loop, at=at) for f in midi_files])
+
+
+def stop_all():
+    """Stop every playback on whichever engine has been used."""
+    if _engine is not None:
+        _engine.stop_all()
+    get_synth().stop_all()
+
+
+def close():
+    """Shut down the process-wide engine, if one was created."""
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.close()
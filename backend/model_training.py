@@ -1,10 +1,70 @@
-import tensorflow as tf
-
-def train_model():
-    model = tf.keras.Sequential([
-        tf.keras.layers.Dense(64, activation='relu', input_shape=(10,)),
-        tf.keras.layers.Dense(32, activation='relu'),
-        tf.keras.layers.Dense(2, activation='softmax')
-    ])
-    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
-    return model
\ No newline at end of file
+"""
+Key/tempo model trained on the sharded features from backend.training_data.
+
+Usage:
+    python -m backend.training_data                # extract or refresh feature shards
+    python -m backend.model_training [--epochs 20] [--output models/key_tempo.keras]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config
+import backend.training_data as training_data
+from backend.lazy_imports import lazy_import
+from backend.telemetry import log
+
+tf = lazy_import("tensorflow")
+
+
+def train_model(input_shape=(config.TRAINING_WINDOW_FRAMES, training_data.N_FEATURES)):
+    """Compiled model mapping a (frames, 13) feature window to key logits and tempo."""
+    inputs = tf.keras.Input(shape=input_shape)
+    x = tf.keras.layers.Conv1D(64, 9, activation='relu', padding='same')(inputs)
+    x = tf.keras.layers.MaxPooling1D(4)(x)
+    x = tf.keras.layers.Conv1D(64, 9, activation='relu', padding='same')(x)
+    x = tf.keras.layers.GlobalAveragePooling1D()(x)
+    x = tf.keras.layers.Dense(64, activation='relu')(x)
+    model = tf.keras.Model(inputs, {
+        "key": tf.keras.layers.Dense(12, activation='softmax', name="key")(x),
+        "tempo": tf.keras.layers.Dense(1, name="tempo")(x),
+    })
+    model.compile(optimizer='adam',
+                  loss={"key": 'sparse_categorical_crossentropy', "tempo": 'huber'},
+                  loss_weights={"key": 1.0, "tempo": 0.01},
+                  metrics={"key": ['accuracy'], "tempo": ['mae']})
+    return model
+
+
+def fit_model(feature_dir=config.TRAINING_FEATURE_DIR, epochs=20, batch_size=config.TRAINING_BATCH_SIZE,
+              output_path=None):
+    """Train on the feature shards and save the model (default config.MODEL_PATH)."""
+    dataset, examples = training_data.make_dataset(feature_dir, batch_size)
+    if not examples:
+        raise ValueError("No training examples; run `python -m backend.training_data` first.")
+    _, manifest = training_data.load_manifest(feature_dir)
+
+    log(f"🧠 Training on {examples} windows for {epochs} epochs...")
+    model = train_model((manifest["window"], manifest["features"]))
+    model.fit(dataset, epochs=epochs)
+
+    output_path = output_path or config.MODEL_PATH
+    model.save(output_path)
+    log(f"✅ Model saved to {output_path}")
+    return model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the key/tempo model on extracted feature shards.")
+    parser.add_argument("--features", default=config.TRAINING_FEATURE_DIR, help="Directory with manifest.json")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=config.TRAINING_BATCH_SIZE)
+    parser.add_argument("--output", default=None, help="Where to save the model (default: config.MODEL_PATH)")
+    args = parser.parse_args(argv)
+    fit_model(args.features, args.epochs, args.batch_size, args.output)
+
+
+if __name__ == "__main__":
+    main()
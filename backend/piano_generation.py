@@ -1,103 +1,132 @@
-import music21
+import functools
+
 import numpy as np
-import subprocess
-import time
+
+import config
+from backend import chord_engine, midi_cache
+from backend.playback_manager import DEFAULT_SESSION, get_manager
+from backend.telemetry import log, stage
 
 # Paths to Fluidsynth and SoundFont
-SOUNDFONT_PATH = "C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/FluidR3_GM.sf2"
-FLUIDSYNTH_PATH = "C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/fluidsynth.exe"
+SOUNDFONT_PATH = config.SOUNDFONT_PATH
+FLUIDSYNTH_PATH = config.FLUIDSYNTH_PATH
 
 # MIDI Key Mapping
 KEYS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
-# Global variable for Fluidsynth process
-fluidsynth_process = None
-
-
-def generate_piano_progression(key_index):
-    """Generate a chord progression in MIDI and return the file path."""
-    print("🎹 Generating Piano Progression...")
 
+def validate_key_index(key_index):
+    """Coerce a key to an index into KEYS, defaulting to C major (0)."""
     # Ensure key_index is an integer
     try:
         key_index = int(key_index)
     except ValueError:
-        print(f"⚠️ Invalid key_index: {key_index}, defaulting to C major (0)")
+        log(f"⚠️ Invalid key_index: {key_index}, defaulting to C major (0)")
         key_index = 0  # Default to C major
 
     # Validate key index
     if key_index < 0 or key_index >= len(KEYS):
-        print("⚠️ Invalid key index detected. Defaulting to C major.")
+        log("⚠️ Invalid key index detected. Defaulting to C major.")
         key_index = 0  # Default to C major
 
+    return key_index
+
+
+def _music21_progression_bytes(key_index):
+    """Original music21 implementation (I-IV-V-I in major), kept as an optional backend."""
+    import music21  # Slow, heavy import; only paid when this backend is selected
+
     base_key = KEYS[key_index]
+    root_note = music21.pitch.Pitch(base_key)
+
+    # Create a harmonic chord progression
+    progression = [
+        [root_note, root_note.transpose(4), root_note.transpose(7)],
+        [root_note.transpose(5), root_note.transpose(9), root_note.transpose(12)],
+        [root_note.transpose(7), root_note.transpose(11), root_note.transpose(14)],
+        [root_note, root_note.transpose(4), root_note.transpose(7)]
+    ]
+
+    # Convert to music21 format
+    stream = music21.stream.Stream()
+    for chord_notes in progression:
+        chord = music21.chord.Chord(chord_notes, quarterLength=2)
+        stream.append(chord)
+
+    return music21.midi.translate.streamToMidiFile(stream).writestr()
+
+
+@functools.lru_cache(maxsize=config.MIDI_CACHE_SIZE)
+def piano_progression_bytes(key_index, mode="major", progression="I-IV-V-I", voicing="root",
+                            backend=config.PIANO_BACKEND):
+    """MIDI bytes of a progression in KEYS[key_index], memoized per (key, pattern) params."""
+    with stage("piano_generation"):
+        return _progression_bytes(key_index, mode, progression, voicing, backend)
+
+
+def _progression_bytes(key_index, mode, progression, voicing, backend):
+    if backend == "music21":
+        if (mode, progression, voicing) != ("major", "I-IV-V-I", "root"):
+            raise ValueError("The music21 backend only supports a root-position I-IV-V-I in major.")
+        data = _music21_progression_bytes(key_index)
+    else:
+        chords = chord_engine.progression_chords(key_index, mode, progression, voicing)
+        data = midi_cache.to_bytes(chord_engine.progression_midi(chords))
 
-    try:
-        root_note = music21.pitch.Pitch(base_key)
+    log("✅ Chord progression generated.")
+    return data
 
-        # Create a harmonic chord progression
-        progression = [
-            [root_note, root_note.transpose(4), root_note.transpose(7)],
-            [root_note.transpose(5), root_note.transpose(9), root_note.transpose(12)],
-            [root_note.transpose(7), root_note.transpose(11), root_note.transpose(14)],
-            [root_note, root_note.transpose(4), root_note.transpose(7)]
-        ]
 
-        print("✅ Chord progression generated.")
+def build_piano_progression(key_index, mode="major", progression="I-IV-V-I", voicing="root"):
+    """Build the chord progression for a key as an in-memory mido.MidiFile."""
+    data = piano_progression_bytes(validate_key_index(key_index), mode, progression, voicing)
+    return midi_cache.from_bytes(data)
 
-        # Convert to music21 format
-        stream = music21.stream.Stream()
-        for chord_notes in progression:
-            chord = music21.chord.Chord(chord_notes, quarterLength=2)
-            stream.append(chord)
 
+def generate_piano_progression(key_index, mode="major", progression="I-IV-V-I", voicing="root"):
+    """Generate a chord progression in MIDI and return the file path."""
+    log("🎹 Generating Piano Progression...")
+
+    key_index = validate_key_index(key_index)
+
+    try:
         # Save as MIDI
-        midi_filename = "piano_progression.mid"
-        stream.write('midi', fp=midi_filename)
-        print(f"✅ MIDI file saved: {midi_filename}")
+        data = piano_progression_bytes(key_index, mode, progression, voicing)
+        midi_filename = midi_cache.save_midi(data, "piano_progression")
+        log(f"✅ MIDI file saved: {midi_filename}")
 
         return midi_filename  # Return MIDI file path
 
     except Exception as e:
-        print(f"❌ Error in generating piano progression: {e}")
+        log(f"❌ Error in generating piano progression: {e}")
         return None
 
 
-def play_midi(midi_file):
-    """Play a MIDI file using Fluidsynth."""
-    global fluidsynth_process
+def play_midi(midi_file, loop=False, session=DEFAULT_SESSION):
+    """Plays a MIDI file as this session's piano part on the shared playback engine."""
     try:
-        fluidsynth_process = subprocess.Popen([
-            FLUIDSYNTH_PATH,
-            "-m", "winmidi",
-            "-o", "midi.winmidi.device=HarmonyBot_MIDI",
-            SOUNDFONT_PATH,
-            midi_file
-        ])
-        print(f"🎶 Playing {midi_file} with Fluidsynth...")
+        player = get_manager().start(f"{session}/piano", [midi_file], loop=loop)
+        log(f"🎶 Playing {midi_file}...")
+        return player
 
     except Exception as e:
-        print(f"❌ Error playing {midi_file}: {e}")
+        log(f"❌ Error playing {midi_file}: {e}")
 
 
-def play_midi_loop(midi_file):
-    """Plays a MIDI file in a loop using Fluidsynth."""
-    global fluidsynth_process
+def play_midi_loop(midi_file, session=DEFAULT_SESSION):
+    """Plays a MIDI file in a gapless loop until interrupted."""
     try:
-        while True:
-            play_midi(midi_file)
-            time.sleep(10)  # Adjust to match progression duration
+        player = play_midi(midi_file, loop=True, session=session)
+        if player:
+            player.wait()
 
     except KeyboardInterrupt:
-        stop_midi()
+        stop_midi(session)
 
 
-def stop_midi():
-    """Stops any playing MIDI by terminating Fluidsynth process."""
-    global fluidsynth_process
-    if fluidsynth_process:
-        fluidsynth_process.terminate()
-        fluidsynth_process = None
-        print("⏹️ Stopped MIDI playback")
+def stop_midi(session=DEFAULT_SESSION):
+    """Stops this session's piano playback."""
+    if get_manager().stop(f"{session}/piano"):
+        log("⏹️ Stopped MIDI playback")
     else:
-        print("⚠️ No active MIDI playback to stop.")
+        log("⚠️ No active MIDI playback to stop.")
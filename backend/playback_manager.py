@@ -0,0 +1,102 @@
+"""
+Session-scoped playback.
+
+Each client (an API session, the CLI, the desktop UI) owns at most one
+playback at a time, keyed by a session id, so one user stopping their music
+no longer stops everyone else's. The number of sessions playing at once is
+capped by config.PLAYBACK_MAX_SESSIONS. Starting and stopping never block:
+playbacks are handles on the shared engine (backend.mixer.play_parts), and
+stopping one only flags it; the engine releases its notes on the next block.
+"""
+import atexit
+import threading
+
+import config
+from backend import mixer
+from backend.synth import get_synth
+from backend.telemetry import log
+
+DEFAULT_SESSION = "local"
+
+
+class PlaybackLimitReached(Exception):
+    """Raised when config.PLAYBACK_MAX_SESSIONS sessions are already playing."""
+
+
+class PlaybackManager:
+    """Tracks one playback handle per session and enforces the concurrency cap."""
+
+    def __init__(self, max_sessions=config.PLAYBACK_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        self._sessions = {sid: handle for sid, handle in self._sessions.items() if handle.playing}
+
+    def start(self, session_id, midi_files, loop=False):
+        """
+        Start MIDI parts for a session, replacing whatever that session was playing.
+        :return: The playback handle (stop(), wait(), `playing`).
+        :raises PlaybackLimitReached: if the cap is reached by other sessions.
+        """
+        with self._lock:
+            self._prune()
+            previous = self._sessions.pop(session_id, None)
+            if previous is None and self.max_sessions and len(self._sessions) >= self.max_sessions:
+                raise PlaybackLimitReached(f"Too many concurrent playbacks ({self.max_sessions}); try again later.")
+            if previous is not None:
+                previous.stop()
+            handle = mixer.play_parts(midi_files, loop=loop)
+            self._sessions[session_id] = handle
+        log(f"▶️ Session {session_id}: playing {len(midi_files)} part(s)")
+        return handle
+
+    def get(self, session_id):
+        """The session's playback handle if it is still playing, else None."""
+        with self._lock:
+            handle = self._sessions.get(session_id)
+            return handle if handle is not None and handle.playing else None
+
+    def stop(self, session_id):
+        """Stop one session's playback; returns False if it was not playing."""
+        with self._lock:
+            handle = self._sessions.pop(session_id, None)
+        if handle is None or not handle.playing:
+            return False
+        handle.stop()
+        log(f"⏹️ Session {session_id}: stopped")
+        return True
+
+    def stop_all(self):
+        """Stop every session's playback."""
+        with self._lock:
+            handles, self._sessions = list(self._sessions.values()), {}
+        for handle in handles:
+            handle.stop()
+
+    def active(self):
+        """Number of sessions currently playing."""
+        with self._lock:
+            self._prune()
+            return len(self._sessions)
+
+    def close(self):
+        """Stop everything and shut down the engines, reaping any synth process."""
+        self.stop_all()
+        mixer.close()
+        get_synth().close()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """Process-wide PlaybackManager, created on first use and closed at exit."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PlaybackManager()
+            atexit.register(_manager.close)
+        return _manager
@@ -0,0 +1,89 @@
+"""
+Fused audio preprocessing shared by audio_analysis and utils.
+
+One pipeline turns int16/int32/float64 and multi-channel input into
+peak-normalized float32 in a few in-place passes: a mixdown/cast into the
+output buffer, NaN/Inf cleanup (float input only), one max and one min
+reduction, and a single in-place scale. The output buffer can come from a
+per-thread BufferPool, so steady-state requests of similar length allocate
+nothing large. A pooled result is only valid until the same thread
+preprocesses again; copy it if it has to outlive the request.
+"""
+import threading
+
+import numpy as np
+
+import config
+
+_local = threading.local()
+
+
+class BufferPool:
+    """Grow-only scratch arrays, reused across calls on one worker thread."""
+
+    def __init__(self, max_samples=config.PREPROCESS_POOL_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.float32):
+        """A `shape` view of the named buffer, grown as needed; fresh array above max_samples."""
+        size = int(np.prod(shape))
+        if self.max_samples and size > self.max_samples:
+            return np.empty(shape, dtype=dtype)  # Outliers are not kept around
+        buffer = self._buffers.get((name, np.dtype(dtype)))
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[(name, np.dtype(dtype))] = buffer
+        return buffer[:size].reshape(shape)
+
+    def nbytes(self):
+        return sum(b.nbytes for b in self._buffers.values())
+
+
+def get_pool():
+    """The calling thread's buffer pool (job workers each get their own)."""
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = BufferPool()
+    return pool
+
+
+def normalize(y, mono=True, out=None):
+    """
+    Convert to float32 (mixing down to mono if asked), clean NaN/Inf and scale to peak 1.
+    The input is never modified.
+    :param y: Samples, 1-D or shaped (samples, channels), any real dtype.
+    :param mono: Average the channels of 2-D input.
+    :param out: Optional float32 output array of the result's shape.
+    :return: (normalized float32 array, peak of the converted signal before scaling).
+    """
+    y = np.asarray(y)
+    shape = y.shape[:1] if mono and y.ndim > 1 else y.shape
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+
+    if mono and y.ndim > 1:
+        np.mean(y, axis=1, dtype=np.float32, out=out)
+    else:
+        np.copyto(out, y, casting="unsafe")
+
+    if y.dtype.kind == "f":
+        np.nan_to_num(out, copy=False, nan=0.0, posinf=1.0, neginf=-1.0)
+
+    if not out.size:
+        return out, 0.0
+    peak = max(float(out.max()), -float(out.min()))
+    if peak > 0:
+        out *= np.float32(1.0 / peak)
+    return out, peak
+
+
+def preprocess(y, pool=None):
+    """
+    Mono, float32, peak-normalized signal in a pooled buffer.
+    :param pool: BufferPool to draw the output from (default: this thread's pool).
+    """
+    y = np.asarray(y)
+    pool = pool or get_pool()
+    out = pool.get("preprocess", y.shape[:1] if y.ndim > 1 else y.shape)
+    return normalize(y, out=out)[0]
@@ -0,0 +1,163 @@
+"""
+Opt-in sampling profiler with flamegraph output.
+
+Enable with the HARMONY_PROFILE=1 environment variable (CLI, batch and
+offline scripts) or per request with the `X-Harmony-Profile: 1` header.
+While profiling, a background thread samples the profiled thread's stack
+every config.PROFILE_INTERVAL seconds and writes the result to
+config.PROFILE_DIR as a speedscope JSON file or collapsed stacks (one
+"frame;frame;frame count" line per stack, readable by flamegraph.pl and
+speedscope). When disabled, decorated functions are returned unwrapped, so
+there is no overhead at all.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import config
+from backend.telemetry import log
+
+ENV_VAR = "HARMONY_PROFILE"
+HEADER = "X-Harmony-Profile"
+
+ENABLED = os.environ.get(ENV_VAR, "").lower() in ("1", "true", "yes")
+
+_active = threading.local()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's call stack at a fixed interval from a helper thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profiler")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def collapsed(self):
+        """Collapsed-stack text, root first."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name):
+        """Speedscope "sampled" profile document."""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            ids = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    frames.append({"name": label})
+                ids.append(index[label])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "seconds",
+                "startValue": 0, "endValue": sum(weights),
+                "samples": samples, "weights": weights,
+            }],
+            "name": name,
+        }
+
+
+def _write(profiler, name):
+    directory = config.PROFILE_DIR
+    if not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), directory)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}")
+    if config.PROFILE_FORMAT == "collapsed":
+        path = stem + ".folded"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.collapsed())
+    else:
+        path = stem + ".speedscope.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profiler.speedscope(name), f)
+    return path
+
+
+@contextmanager
+def profiled(name, enabled=True):
+    """
+    Profile the enclosed block on the current thread and write a profile file.
+    Nested profiled blocks on the same thread are folded into the outer one.
+    """
+    if not enabled or getattr(_active, "profiling", False):
+        yield
+        return
+
+    profiler = SamplingProfiler(threading.get_ident(), config.PROFILE_INTERVAL)
+    _active.profiling = True
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        _active.profiling = False
+        path = _write(profiler, name)
+        log(f"🔬 Profile for {name} ({profiler.duration:.2f}s, {sum(profiler.stacks.values())} samples): {path}")
+
+
+def profile_function(name=None):
+    """
+    Decorator profiling every call when HARMONY_PROFILE is set at import time.
+    Otherwise the function is returned untouched.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiled(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wrap_call(name, func):
+    """Return `func` wrapped so that its whole call is profiled (for job queues)."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiled(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def requested(headers):
+    """True if profiling is enabled globally or requested by this request's headers."""
+    return ENABLED or headers.get(HEADER, "").lower() in ("1", "true", "yes")
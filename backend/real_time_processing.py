@@ -1,13 +1,225 @@
-import sounddevice as sd
+import queue
+import time
+
 import numpy as np
 
+import config
+import backend.audio_analysis as audio_analysis
+from backend.lazy_imports import lazy_import
+from backend.telemetry import log, observe_stage, stage
+
+sd = lazy_import("sounddevice")
+librosa = lazy_import("librosa")
+
+
 def record_audio(duration=10, sample_rate=44100):
     try:
-        print(f"🎙️ Recording for {duration} seconds...")
-        audio = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype=np.float32)
-        sd.wait()  # Wait until recording is finished
-        print("✅ Recording complete.")
+        log(f"🎙️ Recording for {duration} seconds...")
+        with stage("recording"):
+            audio = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype=np.float32)
+            sd.wait()  # Wait until recording is finished
+        log("✅ Recording complete.")
         return audio.flatten()  # Return as a 1D NumPy array
     except Exception as e:
-        print(f"❌ Error recording audio: {e}")
+        log(f"❌ Error recording audio: {e}")
         return None
+
+
+class RingBuffer:
+    """Fixed-size circular sample buffer that hands out overlapping STFT frames."""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=np.float32)
+        self.written = 0  # Total samples ever written
+        self.read_pos = 0  # Absolute index of the next frame start
+
+    def write(self, block):
+        block = np.asarray(block, dtype=np.float32).ravel()
+        if len(block) >= self.capacity:
+            # Only the last `capacity` samples survive, but every sample advances the position
+            self.written += len(block)
+            self.data[:] = np.roll(block[-self.capacity:], self.written % self.capacity)
+            return
+        start = self.written % self.capacity
+        end = start + len(block)
+        if end <= self.capacity:
+            self.data[start:end] = block
+        else:
+            split = self.capacity - start
+            self.data[start:] = block[:split]
+            self.data[:end - self.capacity] = block[split:]
+        self.written += len(block)
+
+    def read(self, start, length):
+        """Copy `length` samples starting at absolute sample index `start`."""
+        idx = (np.arange(start, start + length) % self.capacity)
+        return self.data[idx]
+
+    def frames(self, n_fft, hop_length):
+        """Yield every complete frame that has not been consumed yet."""
+        # Frames that fell out of the buffer are skipped rather than read stale
+        oldest = self.written - self.capacity
+        if self.read_pos < oldest:
+            self.read_pos = oldest + (-(oldest - self.read_pos) % hop_length)
+        while self.read_pos + n_fft <= self.written:
+            yield self.read(self.read_pos, n_fft)
+            self.read_pos += hop_length
+
+
+class StreamingAnalyzer:
+    """
+    Incremental tempo & key estimator fed one audio block at a time.
+
+    Every block updates an onset-strength envelope (mel spectral flux, as in
+    librosa.onset.onset_strength) and running chroma energy, then re-estimates
+    tempo from the recent envelope and key from the accumulated chroma.
+    """
+
+    def __init__(self, sample_rate=44100, n_fft=2048, hop_length=512,
+                 window_seconds=12, stable_blocks=8, tempo_tolerance=2.0):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.stable_blocks = stable_blocks
+        self.tempo_tolerance = tempo_tolerance
+
+        self.ring = RingBuffer(n_fft + int(window_seconds * sample_rate))
+        self.window = librosa.filters.get_window("hann", n_fft, fftbins=True).astype(np.float32)
+        self.mel_basis = librosa.filters.mel(sr=sample_rate, n_fft=n_fft)
+        self.chroma_basis = librosa.filters.chroma(sr=sample_rate, n_fft=n_fft)
+
+        max_frames = int(window_seconds * sample_rate / hop_length)
+        self.onset_env = np.zeros(max_frames, dtype=np.float32)
+        self.onset_count = 0
+        self.chroma_sum = np.zeros(self.chroma_basis.shape[0], dtype=np.float64)
+        self._prev_mel_db = None
+
+        self.samples_seen = 0
+        self.energy = 0.0
+        self.tempo = 0
+        self.key = None
+        self._stable_count = 0
+
+    def process_block(self, block):
+        """Feed one block of mono samples and refresh the tempo/key estimate."""
+        block = np.nan_to_num(np.asarray(block, dtype=np.float32).ravel())
+        self.ring.write(block)
+        self.samples_seen += len(block)
+        self.energy += float(np.dot(block, block))
+
+        for frame in self.ring.frames(self.n_fft, self.hop_length):
+            power = np.abs(np.fft.rfft(frame * self.window)) ** 2
+            self._push_onset(power)
+            self.chroma_sum += self.chroma_basis @ power
+
+        previous = (self.tempo, self.key)
+        self._estimate()
+        self._update_stability(previous)
+        return self.tempo, self.key
+
+    def _push_onset(self, power):
+        mel_db = librosa.power_to_db(self.mel_basis @ power)
+        if self._prev_mel_db is not None:
+            flux = np.maximum(0.0, mel_db - self._prev_mel_db).mean()
+            if self.onset_count == len(self.onset_env):
+                self.onset_env[:-1] = self.onset_env[1:]
+                self.onset_env[-1] = flux
+            else:
+                self.onset_env[self.onset_count] = flux
+                self.onset_count += 1
+        self._prev_mel_db = mel_db
+
+    def _estimate(self):
+        if self.energy < 1e-4:
+            return  # Same silence threshold as audio_analysis.analyze_audio
+        onset_env = self.onset_env[:self.onset_count]
+        # Wait for ~1 second of envelope before the first provisional tempo
+        if self.onset_count >= self.sample_rate // self.hop_length and np.any(onset_env):
+            tempo = librosa.feature.tempo(onset_envelope=onset_env, sr=self.sample_rate,
+                                          hop_length=self.hop_length)[0]
+            self.tempo = float(tempo)
+        if np.any(self.chroma_sum):
+            self.key = int(self.chroma_sum.argmax())
+
+    def _update_stability(self, previous):
+        prev_tempo, prev_key = previous
+        if (self.tempo and self.key is not None and self.key == prev_key
+                and abs(self.tempo - prev_tempo) <= self.tempo_tolerance):
+            self._stable_count += 1
+        else:
+            self._stable_count = 0
+
+    @property
+    def elapsed(self):
+        return self.samples_seen / self.sample_rate
+
+    @property
+    def is_stable(self):
+        return self._stable_count >= self.stable_blocks
+
+
+def stream_and_analyze(max_duration=config.STREAM_MAX_DURATION, sample_rate=config.AUDIO_SAMPLE_RATE,
+                       block_duration=config.STREAM_BLOCK_DURATION, stable_blocks=config.STREAM_STABLE_BLOCKS,
+                       tempo_tolerance=config.STREAM_TEMPO_TOLERANCE, on_update=None, profile=None, on_level=None):
+    """
+    Record from the microphone and analyze it block by block.
+
+    `on_update(tempo, key, elapsed)` is called after every block with the
+    provisional estimate, and `on_level(rms, peak, elapsed)` with the block's
+    input level (for a level meter). Recording stops as soon as the estimate
+    has been stable for `stable_blocks` blocks, or after `max_duration` seconds.
+    `profile` takes FFT and hop sizes from an analysis quality profile, scaled
+    to the microphone's sample rate.
+    :return: (tempo, key) of the final estimate, or (None, None) on failure.
+    """
+    settings = audio_analysis.get_profile(profile)
+    scale = sample_rate / settings["sample_rate"] if settings["sample_rate"] else 1
+    blocks = queue.Queue()
+    analyzer = StreamingAnalyzer(sample_rate=sample_rate, n_fft=int(settings["n_fft"] * scale),
+                                 hop_length=int(settings["hop_length"] * scale),
+                                 stable_blocks=stable_blocks, tempo_tolerance=tempo_tolerance)
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            log(f"⚠️ Input stream status: {status}")
+        blocks.put(indata[:, 0].copy())
+
+    # Capture (waiting for input blocks) and analysis interleave, so each is summed and reported once
+    capture = analysis = 0.0
+    try:
+        log(f"🎙️ Streaming analysis (up to {max_duration} seconds)...")
+        started = time.perf_counter()
+        with sd.InputStream(samplerate=sample_rate, channels=1, dtype=np.float32,
+                            blocksize=int(block_duration * sample_rate), callback=callback):
+            while analyzer.elapsed < max_duration:
+                waited = time.perf_counter()
+                try:
+                    block = blocks.get(timeout=max(1.0, 4 * block_duration))
+                except queue.Empty:
+                    raise RuntimeError("No audio received from input stream.")
+                finally:
+                    capture += time.perf_counter() - waited
+
+                if on_level:
+                    on_level(float(np.sqrt(np.mean(np.square(block)))), float(np.abs(block).max()),
+                             analyzer.elapsed + len(block) / sample_rate)
+                analyzed = time.perf_counter()
+                tempo, key = analyzer.process_block(block)
+                analysis += time.perf_counter() - analyzed
+                if on_update:
+                    on_update(tempo, key, analyzer.elapsed)
+
+                if analyzer.is_stable:
+                    log(f"✅ Estimate stable after {analyzer.elapsed:.2f}s of audio.")
+                    break
+
+        log(f"✅ Streaming analysis complete in {time.perf_counter() - started:.2f}s "
+            f"(waiting for audio {capture:.2f}s, analysis {analysis:.2f}s).")
+        return analyzer.tempo, analyzer.key
+    except Exception as e:
+        log(f"❌ Error during streaming analysis: {e}")
+        return None, None
+    finally:
+        observe_stage("recording", capture)
+        observe_stage("stream_analysis", analysis)
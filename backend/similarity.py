@@ -0,0 +1,451 @@
+"""
+Similarity index over analyzed tracks: "find tracks that fit with this recording".
+
+Usage:
+    python -m backend.similarity add <audio files or directories...> [--workers N]
+    python -m backend.similarity add --metadata datasets/metadata.json
+    python -m backend.similarity remove <track id>...
+    python -m backend.similarity query <audio file> [-k 10]
+    python -m backend.similarity stats | compact
+
+Each track is stored as one float32 row: its L2-normalized 12-bin mean
+chroma, tempo, and onset mean and standard deviation. Rows live in a
+memory-mapped .npy file under config.SIMILARITY_INDEX_DIR and grow by
+doubling. Removing a track only clears its row, and freed rows are reused
+by later adds; `compact` rewrites the file densely. A query scores every
+row at once: chroma cosine plus tempo compatibility (same, half or double
+tempo within a tolerance) plus onset similarity (mean and spread).
+
+Track ids go to an append-only log next to the vectors: one JSON line per
+row that gains or loses a track, so an update writes only what changed.
+index.json is small: the log's name and committed length, the vector
+capacity, and a generation counter that every write increments. Other
+processes compare the generation to notice changes and replay only the new
+log entries. The log is rewritten when it grows well past the number of
+rows, and by `compact`.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config
+from backend.telemetry import log
+
+VECTOR_DIM = 15
+CHROMA = slice(0, 12)
+TEMPO, ONSET_MEAN, ONSET_STD = 12, 13, 14
+LOG_COMPACT_MIN = 4096  # Log entries before the id log may be rewritten (once it is 2x the rows)
+
+
+def _repo_path(path):
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    return path
+
+
+def track_vector(tempo, chroma, onset_mean=0.0, onset_std=0.0):
+    """Index row for a track's features (chroma is L2-normalized)."""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    chroma = np.asarray(chroma, dtype=np.float32)
+    norm = np.linalg.norm(chroma)
+    vector[CHROMA] = chroma / norm if norm > 0 else chroma
+    vector[TEMPO] = tempo
+    vector[ONSET_MEAN] = onset_mean
+    vector[ONSET_STD] = onset_std
+    return vector
+
+
+def key_chroma(key, mode="major"):
+    """Triad chroma template for a key index, for queries that only know tempo and key."""
+    chroma = np.zeros(12, dtype=np.float32)
+    third = 3 if mode == "minor" else 4
+    for interval, weight in ((0, 1.0), (third, 0.8), (7, 0.9)):
+        chroma[(int(key) + interval) % 12] = weight
+    return chroma
+
+
+class SimilarityIndex:
+    """Memory-mapped float32 track vectors with vectorized top-k search."""
+
+    def __init__(self, directory=config.SIMILARITY_INDEX_DIR):
+        self.directory = _repo_path(directory)
+        self.vectors_path = os.path.join(self.directory, "vectors.npy")
+        self.meta_path = os.path.join(self.directory, "index.json")
+        self._lock = threading.RLock()
+        self.generation = None  # Generation of the loaded index; None when there is none on disk
+        self.vectors = None
+        self.ids = []
+        self.rows = {}
+        self.free = []
+        self._log_name = None  # Id log this index has replayed, and how far
+        self._log_offset = 0
+        self._log_entries = 0
+        self._stale_log = None  # Previous log, deleted once index.json no longer names it
+        self.load()
+
+    # ---- storage ----
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _reset(self):
+        self.vectors, self.ids, self.rows, self.free = None, [], {}, []
+        self._log_name, self._log_offset, self._log_entries = None, 0, 0
+
+    def _replay(self, name, start, end):
+        """Apply id log entries between byte offsets `start` and `end` of log `name`."""
+        with open(os.path.join(self.directory, name), "rb") as f:
+            f.seek(start)
+            lines = f.read(end - start).splitlines()
+        for row, track_id in json.loads(b"[" + b",".join(lines) + b"]"):  # One parse for the whole range
+            if row == len(self.ids):
+                self.ids.append(track_id)
+            else:
+                previous = self.ids[row]
+                if previous is not None:
+                    self.rows.pop(previous, None)
+                elif track_id is not None:
+                    self.free.remove(row)  # A freed row taken by a later add
+                self.ids[row] = track_id
+            if track_id is None:
+                self.free.append(row)
+            else:
+                self.rows[track_id] = row
+        self._log_name, self._log_offset = name, end
+        self._log_entries += len(lines)
+
+    def load(self):
+        """
+        (Re)load the index from disk; an absent index is empty. If the id log or
+        vectors.npy is missing or shorter than index.json says (e.g. deleted by
+        hand), the index is treated as empty and rebuilt by later adds.
+        """
+        with self._lock:
+            self._reset()
+            meta = self._read_meta()
+            self.generation = None if meta is None else meta["generation"]
+            if meta is None or not meta.get("log"):
+                return
+            try:
+                self._replay(meta["log"], 0, meta["log_size"])
+                self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            except (OSError, ValueError) as e:
+                log(f"⚠️ Similarity index unreadable ({e}); starting an empty index.")
+                self._reset()
+                self._stale_log = meta["log"]
+                return
+            if len(self.vectors) < len(self.ids):
+                log(f"⚠️ Similarity index lists {len(self.ids)} rows but vectors.npy has "
+                    f"{len(self.vectors)}; starting an empty index.")
+                vectors = self.vectors
+                self._reset()
+                self.vectors = vectors
+                self._stale_log = meta["log"]
+
+    def refresh(self):
+        """Catch up with changes another process (e.g. the CLI) made since the index was loaded."""
+        meta = self._read_meta()
+        if (None if meta is None else meta["generation"]) == self.generation:
+            return
+        if meta is None or meta.get("log") != self._log_name or meta["log_size"] < self._log_offset:
+            self.load()  # New, rewritten or removed index
+            return
+        try:
+            self._replay(self._log_name, self._log_offset, meta["log_size"])
+            if self.vectors is None or meta["capacity"] != len(self.vectors):
+                self.vectors = np.load(self.vectors_path, mmap_mode="r+")  # Resized by the other process
+        except (OSError, ValueError):
+            self.load()
+            return
+        self.generation = meta["generation"]
+
+    def _append_log(self, entries):
+        """Append (row, id) entries to the id log (id None for a freed row)."""
+        if not entries:
+            return
+        if self._log_name is None:
+            self._rewrite_log()
+            return
+        path = os.path.join(self.directory, self._log_name)
+        with open(path, "ab") as f:
+            f.seek(self._log_offset)
+            f.truncate()  # Drop anything a crashed writer left past the committed length
+            f.write(b"".join(json.dumps([row, track_id]).encode() + b"\n" for row, track_id in entries))
+            self._log_offset = f.tell()
+        self._log_entries += len(entries)
+        if self._log_entries > max(LOG_COMPACT_MIN, 2 * len(self.ids)):
+            self._rewrite_log()
+
+    def _rewrite_log(self):
+        """Write a fresh id log with one entry per row; the old log is deleted after the switch."""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"ids-{(self.generation or 0) + 1}.jsonl"
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(b"".join(json.dumps([row, track_id]).encode() + b"\n" for row, track_id in enumerate(self.ids)))
+            size = f.tell()
+        self._stale_log = self._log_name or self._stale_log
+        self._log_name, self._log_offset, self._log_entries = name, size, len(self.ids)
+
+    def _save_meta(self):
+        """Commit the current log length and capacity under a new generation."""
+        os.makedirs(self.directory, exist_ok=True)
+        generation = (self.generation or 0) + 1
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "dim": VECTOR_DIM, "log": self._log_name,
+                       "log_size": self._log_offset, "rows": len(self.ids),
+                       "capacity": 0 if self.vectors is None else len(self.vectors)}, f)
+        os.replace(tmp_path, self.meta_path)
+        self.generation = generation
+        stale, self._stale_log = self._stale_log, None
+        if stale and stale != self._log_name:
+            try:
+                os.remove(os.path.join(self.directory, stale))
+            except OSError:
+                pass  # e.g. still open by a reader on Windows; rewritten logs are never read again
+
+    def _resize(self, capacity):
+        """Copy the rows into a new memory-mapped file with room for `capacity` tracks."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.vectors_path + ".tmp.npy"
+        vectors = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, VECTOR_DIM))
+        used = min(len(self.ids), capacity)
+        if self.vectors is not None and used:
+            vectors[:used] = self.vectors[:used]
+        vectors.flush()
+        del vectors
+        self.vectors = None
+        os.replace(tmp_path, self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+    # ---- updates ----
+
+    def add(self, items):
+        """
+        Add or replace tracks.
+        :param items: iterable of (track id, vector) pairs.
+        :return: number of tracks written.
+        """
+        items = list(items)
+        with self._lock:
+            self.refresh()
+            new = sum(1 for track_id, _ in items if track_id not in self.rows)
+            needed = len(self.ids) + max(0, new - len(self.free))
+            capacity = 0 if self.vectors is None else len(self.vectors)
+            if needed > capacity:
+                self._resize(max(needed, 2 * capacity, 1024))
+
+            rows = np.empty(len(items), dtype=np.int64)
+            entries = []
+            for i, (track_id, _) in enumerate(items):
+                row = self.rows.get(track_id)
+                if row is None:
+                    if self.free:
+                        row = self.free.pop()
+                        self.ids[row] = track_id
+                    else:
+                        row = len(self.ids)
+                        self.ids.append(track_id)
+                    self.rows[track_id] = row
+                    entries.append((row, track_id))
+                rows[i] = row
+            if items:
+                self.vectors[rows] = np.stack([vector for _, vector in items])
+            self.vectors.flush()
+            self._append_log(entries)
+            self._save_meta()
+        return len(items)
+
+    def remove(self, track_ids):
+        """Remove tracks by id; returns how many were present."""
+        entries = []
+        with self._lock:
+            self.refresh()
+            for track_id in track_ids:
+                row = self.rows.pop(track_id, None)
+                if row is None:
+                    continue
+                self.vectors[row] = 0.0
+                self.ids[row] = None
+                self.free.append(row)
+                entries.append((row, None))
+            if entries:
+                self.vectors.flush()
+                self._append_log(entries)
+                self._save_meta()
+        return len(entries)
+
+    def compact(self):
+        """Rewrite the index without holes left by removals."""
+        with self._lock:
+            self.refresh()
+            live = [row for row, track_id in enumerate(self.ids) if track_id is not None]
+            rows = np.array(self.vectors[live]) if live else np.zeros((0, VECTOR_DIM), np.float32)
+            self.ids = [self.ids[row] for row in live]
+            self.rows = {track_id: row for row, track_id in enumerate(self.ids)}
+            self.free = []
+            self._resize(max(len(self.ids), 1024))
+            self.vectors[:len(rows)] = rows
+            self.vectors.flush()
+            self._rewrite_log()
+            self._save_meta()
+
+    def __len__(self):
+        return len(self.rows)
+
+    # ---- search ----
+
+    def query(self, vector, k=10, tempo_tolerance=config.SIMILARITY_TEMPO_TOLERANCE,
+              weights=config.SIMILARITY_WEIGHTS, exclude=()):
+        """
+        Top-k tracks that fit with `vector`.
+        :param tempo_tolerance: Relative tempo difference at which compatibility falls to 1/e.
+        :param weights: (chroma, tempo, onset) score weights; the onset term compares mean and spread.
+        :return: list of {"id", "score", "tempo"} dicts, best first.
+        """
+        with self._lock:
+            self.refresh()
+            count = len(self.ids)
+            if not self.rows:
+                return []
+            rows = self.vectors[:count]
+            w_chroma, w_tempo, w_onset = weights
+
+            # One contiguous mat-vec: chroma cosine (rows and query are unit vectors)
+            chroma_query = np.zeros(VECTOR_DIM, dtype=np.float32)
+            chroma_query[CHROMA] = w_chroma * vector[CHROMA]
+            scores = rows @ chroma_query
+
+            tempos = rows[:, TEMPO]
+            if vector[TEMPO] > 0:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    distance = np.log2(tempos / vector[TEMPO])
+                # Octaves from the nearest of half, same and double tempo
+                distance -= np.clip(np.rint(distance), -1, 1)
+                distance /= np.float32(np.log2(1 + tempo_tolerance))
+                np.square(distance, out=distance)
+                np.negative(distance, out=distance)
+                np.exp(distance, out=distance)
+                distance *= w_tempo
+                scores += distance
+
+            if vector[ONSET_MEAN] > 0:
+                relative = (rows[:, ONSET_MEAN] - vector[ONSET_MEAN]) / vector[ONSET_MEAN]
+                np.square(relative, out=relative)
+                if vector[ONSET_STD] > 0:
+                    spread = (rows[:, ONSET_STD] - vector[ONSET_STD]) / vector[ONSET_STD]
+                    relative += np.square(spread, out=spread)
+                np.negative(relative, out=relative)
+                np.exp(relative, out=relative)
+                scores += w_onset * relative
+
+            scores[tempos <= 0] = -np.inf  # Free rows (and tempo-less tracks)
+            for track_id in exclude:
+                if track_id in self.rows:
+                    scores[self.rows[track_id]] = -np.inf
+
+            k = min(k, len(self.rows))
+            top = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+            top = top[np.argsort(-scores[top])][:k]
+            return [{"id": self.ids[row], "score": round(float(scores[row]), 4),
+                     "tempo": round(float(tempos[row]), 2)}
+                    for row in top if np.isfinite(scores[row])]
+
+
+def describe(path, profile=None):
+    """Worker entry point: (path, index vector or None) for one audio file."""
+    import backend.audio_analysis as audio_analysis
+
+    description = audio_analysis.describe_file(path, profile)
+    if description is None:
+        return path, None
+    return path, track_vector(description["tempo"], description["chroma"],
+                              description["onset_mean"], description["onset_std"])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide SimilarityIndex, opened on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex()
+        return _index
+
+
+def _collect_paths(sources, metadata):
+    from backend.batch_analyze import find_audio_files
+    from backend.training_data import load_metadata
+
+    paths = [track["path"] for track in load_metadata(metadata)] if metadata else []
+    for source in sources:
+        paths += find_audio_files(source) if os.path.isdir(source) else [os.path.abspath(source)]
+    return paths
+
+
+def main(argv=None):
+    from backend.audio_analysis import ANALYSIS_PROFILES
+
+    parser = argparse.ArgumentParser(description="Manage and query the track similarity index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="Analyze audio files and add them (id = absolute path)")
+    add.add_argument("sources", nargs="*", help="Audio files or directories")
+    add.add_argument("--metadata", help="Also add every track listed in a metadata JSON")
+    add.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    add.add_argument("--profile", choices=sorted(ANALYSIS_PROFILES), default=None)
+    remove = sub.add_parser("remove", help="Remove tracks by id")
+    remove.add_argument("ids", nargs="+")
+    query = sub.add_parser("query", help="Find tracks that fit with an audio file")
+    query.add_argument("path")
+    query.add_argument("-k", type=int, default=10)
+    sub.add_parser("stats", help="Show index size")
+    sub.add_parser("compact", help="Rewrite the index without removed rows")
+    args = parser.parse_args(argv)
+
+    index = SimilarityIndex()
+    if args.command == "add":
+        paths = _collect_paths(args.sources, args.metadata)
+        log(f"📂 Describing {len(paths)} files...")
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count() or 1) as pool:
+            results = list(pool.map(describe, paths, [args.profile] * len(paths), chunksize=4))
+        items = [(path, vector) for path, vector in results if vector is not None]
+        index.add(items)
+        log(f"✅ Indexed {len(items)}/{len(paths)} files in {time.perf_counter() - started:.1f}s "
+            f"({len(index)} tracks total)")
+    elif args.command == "remove":
+        log(f"🗑️ Removed {index.remove(args.ids)} tracks ({len(index)} left)")
+    elif args.command == "query":
+        _, vector = describe(os.path.abspath(args.path))
+        if vector is None:
+            sys.exit("❌ Could not analyze the query audio.")
+        started = time.perf_counter()
+        matches = index.query(vector, args.k, exclude=[os.path.abspath(args.path)])
+        log(f"🔎 {len(matches)} matches from {len(index)} tracks in {1000 * (time.perf_counter() - started):.1f} ms")
+        for match in matches:
+            print(f"{match['score']:.3f}  {match['tempo']:7.2f} BPM  {match['id']}")
+    elif args.command == "stats":
+        capacity = 0 if index.vectors is None else len(index.vectors)
+        print(f"{len(index)} tracks, {len(index.free)} free rows, capacity {capacity}, dir {index.directory}")
+    elif args.command == "compact":
+        index.compact()
+        log(f"✅ Compacted to {len(index)} tracks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import subprocess
+import threading
+import time
+
+import mido
+
+import config
+from backend.telemetry import log, stage
+
+
+class PyFluidSynthBackend:
+    """In-process synthesis through pyfluidsynth."""
+
+    def __init__(self, soundfont, driver=None):
+        import fluidsynth  # Optional dependency
+
+        self.synth = fluidsynth.Synth()
+        self.synth.start(driver=driver) if driver else self.synth.start()
+        self.sfid = self.synth.sfload(soundfont)
+        for channel in range(16):
+            if channel != 9:  # Channel 10 keeps the GM percussion bank
+                self.synth.program_select(channel, self.sfid, 0, 0)
+
+    def note_on(self, channel, note, velocity):
+        self.synth.noteon(channel, note, velocity)
+
+    def note_off(self, channel, note):
+        self.synth.noteoff(channel, note)
+
+    def program_change(self, channel, program):
+        self.synth.program_change(channel, program)
+
+    def control_change(self, channel, control, value):
+        self.synth.cc(channel, control, value)
+
+    def close(self):
+        self.synth.delete()
+
+
+class ShellBackend:
+    """One long-lived fluidsynth process driven through its command shell on stdin."""
+
+    def __init__(self, soundfont, fluidsynth_path, driver=None):
+        args = [fluidsynth_path]
+        if driver:
+            args += ["-a", driver]
+        args.append(soundfont)
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self._lock = threading.Lock()
+
+    def _command(self, line):
+        with self._lock:
+            if self.process.poll() is None:
+                self.process.stdin.write(line + "\n")
+                self.process.stdin.flush()
+
+    def note_on(self, channel, note, velocity):
+        self._command(f"noteon {channel} {note} {velocity}")
+
+    def note_off(self, channel, note):
+        self._command(f"noteoff {channel} {note}")
+
+    def program_change(self, channel, program):
+        self._command(f"prog {channel} {program}")
+
+    def control_change(self, channel, control, value):
+        self._command(f"cc {channel} {control} {value}")
+
+    def close(self):
+        try:
+            self._command("quit")
+            self.process.wait(timeout=2)
+        except Exception:
+            self.process.kill()
+            self.process.wait()  # Reap it so no zombie is left behind
+
+
+def midi_events(midi_file):
+    """Flatten a MIDI file into (seconds from start, message) pairs plus its total length."""
+    mid = midi_file if isinstance(midi_file, mido.MidiFile) else mido.MidiFile(midi_file)
+    events = []
+    now = 0.0
+    for msg in mid:  # Iterating a MidiFile yields delta times in seconds
+        now += msg.time
+        if not msg.is_meta:
+            events.append((now, msg))
+    return events, max(now, mid.length)
+
+
+class Player:
+    """Schedules one MIDI file's events onto the shared synth, optionally looping."""
+
+    def __init__(self, synth, midi_file, loop=False):
+        self.synth = synth
+        self.events, self.length = midi_events(midi_file)
+        self.loop = loop
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self, at=None):
+        self._start_at = at if at is not None else time.monotonic()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        loop_start = self._start_at
+        sounding = set()
+        try:
+            while not self._stop.is_set():
+                for offset, msg in self.events:
+                    # Sleep until the event's absolute due time so loops never accumulate drift
+                    delay = loop_start + offset - time.monotonic()
+                    if delay > 0 and self._stop.wait(delay):
+                        return
+                    self.synth.send(msg)
+                    if msg.type == "note_on" and msg.velocity > 0:
+                        sounding.add((msg.channel, msg.note))
+                    elif msg.type in ("note_on", "note_off"):
+                        sounding.discard((msg.channel, msg.note))
+                if not self.loop or self.length <= 0:
+                    break
+                loop_start += self.length  # Next pass starts exactly one loop length later
+        finally:
+            self.synth.release(sounding)
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def playing(self):
+        return self._thread.is_alive()
+
+
+class SynthService:
+    """
+    Long-lived synthesizer that loads the SoundFont once and plays MIDI event
+    streams in-process, instead of spawning fluidsynth for every playback.
+    """
+
+    def __init__(self, soundfont=config.SOUNDFONT_PATH, fluidsynth_path=config.FLUIDSYNTH_PATH,
+                 backend=config.SYNTH_BACKEND, driver=config.SYNTH_AUDIO_DRIVER):
+        self.soundfont = soundfont
+        self.fluidsynth_path = fluidsynth_path
+        self.backend_name = backend
+        self.driver = driver
+        self.backend = None
+        self.players = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the synth and load the SoundFont (no-op if already running)."""
+        with self._lock:
+            if self.backend is not None:
+                return self
+            started = time.perf_counter()
+            with stage("synth_start"):
+                if self.backend_name in ("auto", "pyfluidsynth"):
+                    try:
+                        self.backend = PyFluidSynthBackend(self.soundfont, self.driver)
+                    except ImportError:
+                        if self.backend_name == "pyfluidsynth":
+                            raise
+                if self.backend is None:
+                    self.backend = ShellBackend(self.soundfont, self.fluidsynth_path, self.driver)
+            log(f"🎛️ Synth ready ({type(self.backend).__name__}) in {time.perf_counter() - started:.2f}s")
+            return self
+
+    def send(self, msg):
+        """Forward one mido channel message to the synth (dropped once it is closed)."""
+        backend = self.backend
+        if backend is None:
+            return
+        if msg.type == "note_on" and msg.velocity > 0:
+            backend.note_on(msg.channel, msg.note, msg.velocity)
+        elif msg.type in ("note_on", "note_off"):
+            backend.note_off(msg.channel, msg.note)
+        elif msg.type == "program_change":
+            backend.program_change(msg.channel, msg.program)
+        elif msg.type == "control_change":
+            backend.control_change(msg.channel, msg.control, msg.value)
+
+    def release(self, notes):
+        """
+        Send note-off for every (channel, note) pair, e.g. whatever a stopped player left sounding.
+        Runs under the service lock so close() cannot tear the backend down mid-way.
+        """
+        with self._lock:
+            if self.backend is None:  # Already closed: nothing left sounding
+                return
+            for channel, note in notes:
+                self.backend.note_off(channel, note)
+
+    def play(self, midi_file, loop=False, at=None):
+        """Start playing a MIDI file (path or mido.MidiFile); returns its Player."""
+        self.start()
+        player = Player(self, midi_file, loop=loop)
+        with self._lock:
+            self.players = [p for p in self.players if p.playing]
+            self.players.append(player)
+        return player.start(at)
+
+    def stop_all(self):
+        """Stop every player without tearing down the synth."""
+        with self._lock:
+            players, self.players = self.players, []
+        for player in players:
+            player.stop()
+        for player in players:
+            player.wait(1)
+
+    def close(self):
+        self.stop_all()
+        with self._lock:
+            if self.backend is not None:
+                self.backend.close()
+                self.backend = None
+
+
+_synth = None
+_synth_lock = threading.Lock()
+
+
+def get_synth():
+    """Process-wide SynthService, created on first use."""
+    global _synth
+    with _synth_lock:
+        if _synth is None:
+            _synth = SynthService()
+        return _synth
@@ -0,0 +1,151 @@
+"""
+Metrics and logging for the analysis and generation pipeline.
+
+Stages are timed with `stage(name)`, which feeds a latency histogram, an
+in-flight gauge and an error counter. `render_prometheus()` produces the
+Prometheus text exposition served on /metrics. `log()` replaces bare
+print() calls and emits JSON lines when config.LOG_FORMAT is "json".
+"""
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+REGISTRY = []
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    """Monotonically increasing value per label set."""
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down per label set."""
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            entry = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        for key, entry in self.values.items():
+            for bound, count in zip(self.buckets, entry):
+                samples.append((f"{self.name}_bucket", key + (("le", str(bound)),), count))
+            samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), entry[-1]))
+            samples.append((f"{self.name}_sum", key, entry[-2]))
+            samples.append((f"{self.name}_count", key, entry[-1]))
+        return samples
+
+
+STAGE_DURATION = Histogram("harmony_stage_duration_seconds", "Latency of each pipeline stage.")
+STAGE_IN_FLIGHT = Gauge("harmony_stage_in_flight", "Pipeline stages currently executing.")
+STAGE_ERRORS = Counter("harmony_stage_errors_total", "Exceptions raised inside a pipeline stage.")
+SILENT_INPUTS = Counter("harmony_silent_input_rejections_total", "Inputs rejected as silent or too quiet.")
+CACHE_LOOKUPS = Counter("harmony_feature_cache_lookups_total", "Feature cache lookups by result.")
+JOB_QUEUE_DEPTH = Gauge("harmony_job_queue_depth", "Background jobs queued or running.")
+PLAYBACK_SESSIONS = Gauge("harmony_playback_sessions", "Sessions currently playing music.")
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage; errors are counted and re-raised."""
+    STAGE_IN_FLIGHT.inc(stage=name)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_IN_FLIGHT.dec(stage=name)
+        observe_stage(name, time.perf_counter() - started)
+
+
+def observe_stage(name, duration):
+    """Record `duration` seconds for a stage timed by the caller (e.g. summed over interleaved steps)."""
+    STAGE_DURATION.observe(duration, stage=name)
+    if config.LOG_FORMAT == "json":
+        log("stage complete", event="stage", stage=name, duration_ms=round(duration * 1000, 3))
+
+
+def render_prometheus():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric in REGISTRY:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_str(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_LEVELS = {"❌": "error", "⚠️": "warning"}
+
+
+def log(message, level=None, **fields):
+    """
+    Print a log line. In JSON mode, emits one object per line with a
+    timestamp, level (inferred from the leading emoji if not given) and any
+    extra `fields`, so slow requests can be filtered by stage and duration.
+    """
+    if config.LOG_FORMAT != "json":
+        print(message)
+        return
+    if level is None:
+        level = next((lvl for emoji, lvl in _LEVELS.items() if message.startswith(emoji)), "info")
+    record = {"ts": round(time.time(), 6), "level": level, "msg": message, **fields}
+    sys.stdout.write(json.dumps(record, default=str) + "\n")
+    sys.stdout.flush()
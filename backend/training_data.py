@@ -0,0 +1,291 @@
+"""
+Sharded, memory-mapped training features for backend.model_training.
+
+Usage:
+    python -m backend.training_data [--metadata datasets/metadata.json] [--output datasets/features]
+
+datasets/metadata.json lists the training audio, either as a JSON list or as
+{"tracks": [...]}, one entry per file: {"path": "...", "tempo": 120, "key": 7}.
+Paths are relative to the metadata file; `key` is a pitch-class index or a
+name from piano_generation.KEYS.
+
+Features are extracted once into config.TRAINING_SHARDS shards. Each shard is
+a directory of .npy files (features, keys, tempos), and manifest.json records
+every shard's sources. Every example is a window of TRAINING_WINDOW_FRAMES
+frames of 12 chroma bins plus the onset envelope. A file always lands in the
+same shard (by path hash), so a re-run only rebuilds shards whose files were
+added, removed or modified. make_dataset() streams the memory-mapped shards
+into tf.data with parallel interleave, shuffle and prefetch.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config
+from backend.lazy_imports import lazy_import
+from backend.telemetry import log
+
+tf = lazy_import("tensorflow")
+librosa = lazy_import("librosa")
+
+MANIFEST = "manifest.json"
+FEATURE_VERSION = 1  # Bump when extraction changes so every shard is rebuilt
+N_FEATURES = 13  # 12 chroma bins + onset strength
+
+
+def _repo_path(path):
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    return path
+
+
+def load_metadata(metadata_path=config.TRAINING_METADATA):
+    """Training entries as dicts with absolute `path`, float `tempo` and int `key`."""
+    from backend.piano_generation import KEYS
+
+    metadata_path = _repo_path(metadata_path)
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if not text.strip():
+        log(f"⚠️ {metadata_path} is empty; no training data.")
+        return []
+    data = json.loads(text)
+    entries = data.get("tracks", []) if isinstance(data, dict) else data
+
+    base = os.path.dirname(metadata_path)
+    tracks = []
+    for entry in entries:
+        key = entry["key"]
+        tracks.append({
+            "path": os.path.normpath(os.path.join(base, entry["path"])),
+            "tempo": float(entry["tempo"]),
+            "key": KEYS.index(key) if isinstance(key, str) and not key.isdigit() else int(key),
+        })
+    return tracks
+
+
+def feature_params(profile=None):
+    """Everything besides the audio that determines the extracted features."""
+    import backend.audio_analysis as audio_analysis
+
+    params = {"version": FEATURE_VERSION, "profile": profile or config.ANALYSIS_PROFILE,
+              "window": config.TRAINING_WINDOW_FRAMES, "hpss_backend": config.HPSS_BACKEND,
+              **audio_analysis.get_profile(profile)}
+    return json.loads(json.dumps(params))  # Same form as when read back from the manifest
+
+
+def shard_of(path, n_shards=config.TRAINING_SHARDS):
+    """Stable shard index for a source path."""
+    return int.from_bytes(hashlib.blake2b(path.encode(), digest_size=8).digest(), "big") % n_shards
+
+
+def source_stamp(path):
+    """(size, mtime) of a source file, used to detect changes."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def extract_windows(path, profile=None, window=config.TRAINING_WINDOW_FRAMES):
+    """
+    Chroma + onset windows of one file.
+    :return: float32 array shaped (n_windows, window, 13); windows overlap by half.
+    """
+    import backend.audio_analysis as audio_analysis
+    from backend.feature_graph import FeatureGraph
+
+    settings = dict(audio_analysis.get_profile(profile))
+    target_sr = settings.pop("sample_rate")
+
+    y, sr = sf.read(path, dtype="float32")
+    y = audio_analysis.preprocess_audio(y)
+    if target_sr and target_sr != sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+        sr = target_sr
+    else:
+        y = y.copy()  # Don't hold on to the pooled preprocessing buffer
+
+    graph = FeatureGraph(y, sr, hpss_backend=config.HPSS_BACKEND, **settings)
+    return windows_from_features(graph.get("full_chroma"), graph.get("onset_envelope"), window)
+
+
+def windows_from_features(chroma, onset, window=config.TRAINING_WINDOW_FRAMES):
+    """Stack chroma (12, frames) and the peak-normalized onset envelope into half-overlapping windows."""
+    frames = min(chroma.shape[1], len(onset))
+    features = np.vstack([chroma[:, :frames], onset[None, :frames] / (onset.max() or 1.0)]).T
+
+    if frames < window:
+        features = np.pad(features, ((0, window - frames), (0, 0)))
+        frames = window
+    starts = range(0, frames - window + 1, max(1, window // 2))
+    return np.stack([features[s:s + window] for s in starts]).astype(np.float32)
+
+
+def build_shard(shard_dir, tracks, profile=None):
+    """
+    Extract every track of a shard and write features/keys/tempos .npy files.
+    :return: (number of windows written, paths of tracks whose extraction failed)
+    """
+    windows = []
+    keys, tempos = [], []
+    failed = []
+    for track in tracks:
+        try:
+            w = extract_windows(track["path"], profile)
+        except Exception as e:
+            log(f"❌ Skipping {track['path']}: {e}")
+            failed.append(track["path"])
+            continue
+        windows.append(w)
+        keys += [track["key"]] * len(w)
+        tempos += [track["tempo"]] * len(w)
+
+    tmp_dir = shard_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    count = sum(len(w) for w in windows)
+    features = np.lib.format.open_memmap(os.path.join(tmp_dir, "features.npy"), mode="w+", dtype=np.float32,
+                                         shape=(count, config.TRAINING_WINDOW_FRAMES, N_FEATURES))
+    position = 0
+    for w in windows:
+        features[position:position + len(w)] = w
+        position += len(w)
+    features.flush()
+    del features
+    np.save(os.path.join(tmp_dir, "keys.npy"), np.asarray(keys, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, "tempos.npy"), np.asarray(tempos, dtype=np.float32))
+
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.replace(tmp_dir, shard_dir)
+    return count, failed
+
+
+def build_features(metadata_path=config.TRAINING_METADATA, output_dir=config.TRAINING_FEATURE_DIR,
+                   profile=None, workers=None):
+    """
+    Extract features into shards, rebuilding only shards whose sources or parameters changed.
+    :return: The manifest dict (also written to <output_dir>/manifest.json).
+    """
+    output_dir = _repo_path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+
+    params = feature_params(profile)
+    if previous.get("params") != params:
+        previous = {}  # Extraction settings changed: nothing can be reused
+
+    shards = {}
+    for track in load_metadata(metadata_path):
+        try:
+            track["stamp"] = source_stamp(track["path"])
+        except OSError as e:
+            log(f"⚠️ Skipping missing source {track['path']}: {e.strerror}")
+            continue
+        shards.setdefault(shard_of(track["path"]), []).append(track)
+
+    old_shards = previous.get("shards", {})
+    stale = {index: tracks for index, tracks in shards.items()
+             if old_shards.get(str(index), {}).get("sources") != sorted(tracks, key=lambda t: t["path"])}
+    for index in set(map(int, old_shards)) - set(shards):
+        shutil.rmtree(os.path.join(output_dir, f"shard-{index:04d}"), ignore_errors=True)
+
+    log(f"📦 {len(shards)} shards, {len(stale)} to rebuild...")
+    started = time.perf_counter()
+    counts = {}
+    skipped = {}  # Shard index -> paths of tracks that failed to extract
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = {index: pool.submit(build_shard, os.path.join(output_dir, f"shard-{index:04d}"), tracks, profile)
+                   for index, tracks in stale.items()}
+        for index, future in futures.items():
+            try:
+                counts[index], skipped[index] = future.result()
+            except Exception as e:
+                log(f"❌ Shard {index} failed: {e}")
+
+    failed = set(stale) - set(counts)
+    manifest = {"params": params, "window": config.TRAINING_WINDOW_FRAMES, "features": N_FEATURES, "shards": {}}
+    for index, tracks in sorted(shards.items()):
+        if index in failed:
+            continue  # Left out of the manifest, so the next run rebuilds it
+        count = counts[index] if index in counts else old_shards[str(index)]["count"]
+        # Failed tracks are left out of the sources, so the shard looks stale and is retried next run
+        sources = [track for track in tracks if track["path"] not in skipped.get(index, ())]
+        manifest["shards"][str(index)] = {"dir": f"shard-{index:04d}", "count": count,
+                                          "sources": sorted(sources, key=lambda t: t["path"])}
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    total = sum(s["count"] for s in manifest["shards"].values())
+    failed_tracks = sum(len(paths) for paths in skipped.values())
+    log(f"✅ {total} training windows in {len(manifest['shards'])} shards ({time.perf_counter() - started:.1f}s)"
+        + (f"; {len(failed)} shards failed" if failed else "")
+        + (f"; {failed_tracks} tracks failed and will be retried" if failed_tracks else ""))
+    return manifest
+
+
+def load_manifest(output_dir=config.TRAINING_FEATURE_DIR):
+    output_dir = _repo_path(output_dir)
+    with open(os.path.join(output_dir, MANIFEST), "r", encoding="utf-8") as f:
+        return output_dir, json.load(f)
+
+
+def iter_shard(shard_dir):
+    """Yield (features, {"key", "tempo"}) examples from one memory-mapped shard."""
+    if isinstance(shard_dir, bytes):
+        shard_dir = shard_dir.decode()
+    features = np.load(os.path.join(shard_dir, "features.npy"), mmap_mode="r")
+    keys = np.load(os.path.join(shard_dir, "keys.npy"), mmap_mode="r")
+    tempos = np.load(os.path.join(shard_dir, "tempos.npy"), mmap_mode="r")
+    for i in range(len(features)):
+        yield np.asarray(features[i]), {"key": keys[i], "tempo": tempos[i]}
+
+
+def make_dataset(output_dir=config.TRAINING_FEATURE_DIR, batch_size=config.TRAINING_BATCH_SIZE,
+                 shuffle_buffer=config.TRAINING_SHUFFLE_BUFFER, cycle_length=4):
+    """
+    tf.data pipeline over the shards: parallel interleave across shards, shuffle, batch, prefetch.
+    :return: (dataset, number of examples)
+    """
+    output_dir, manifest = load_manifest(output_dir)
+    shard_dirs = [os.path.join(output_dir, s["dir"]) for s in manifest["shards"].values() if s["count"]]
+    window, n_features = manifest["window"], manifest["features"]
+    signature = (tf.TensorSpec((window, n_features), tf.float32),
+                 {"key": tf.TensorSpec((), tf.int64), "tempo": tf.TensorSpec((), tf.float32)})
+
+    dataset = tf.data.Dataset.from_tensor_slices(shard_dirs).shuffle(len(shard_dirs) or 1)
+    dataset = dataset.interleave(
+        lambda shard: tf.data.Dataset.from_generator(iter_shard, args=(shard,), output_signature=signature),
+        cycle_length=cycle_length, num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+    dataset = dataset.shuffle(shuffle_buffer).batch(batch_size).prefetch(tf.data.AUTOTUNE)
+    return dataset, sum(s["count"] for s in manifest["shards"].values())
+
+
+def main(argv=None):
+    from backend.audio_analysis import ANALYSIS_PROFILES
+
+    parser = argparse.ArgumentParser(description="Extract sharded training features from datasets/metadata.json.")
+    parser.add_argument("--metadata", default=config.TRAINING_METADATA, help="Metadata JSON listing the audio")
+    parser.add_argument("--output", default=config.TRAINING_FEATURE_DIR, help="Directory for shards + manifest")
+    parser.add_argument("--profile", choices=sorted(ANALYSIS_PROFILES), default=None,
+                        help="Analysis profile for feature extraction (default: config.ANALYSIS_PROFILE)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    build_features(args.metadata, args.output, args.profile, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Uploaded audio files: streamed to disk, validated, analyzed, and expired.
+
+Upload bodies are copied to config.UPLOAD_DIR in UPLOAD_CHUNK_SIZE pieces,
+so the whole body is never held in memory. Multipart file parts go through
+UploadRequest, which makes Werkzeug's form parser write them straight
+into the upload directory. Copying stops with UploadTooLarge once
+UPLOAD_MAX_BYTES is exceeded. probe() reads only the header to check format
+and duration. Analysis then decodes the file with audio_analysis, which
+processes recordings longer than BLOCKWISE_MIN_DURATION in blocks.
+
+Uploaded files are named with UPLOAD_PREFIX. An analyzed upload is deleted
+when its job finishes. The start_sweeper() thread runs cleanup() every
+UPLOAD_CLEANUP_INTERVAL seconds and deletes uploads older than UPLOAD_TTL,
+for example those left by a crashed worker. Other files in the directory,
+such as uploads/sample_audio.wav, are never touched.
+"""
+import os
+import tempfile
+import threading
+import time
+
+import soundfile as sf
+from flask import Request
+
+import config
+from backend.telemetry import log
+
+UPLOAD_PREFIX = "upload-"
+# Suffixes for raw (non-multipart) bodies, which carry no file name
+MIME_SUFFIXES = {
+    "audio/wav": ".wav", "audio/x-wav": ".wav", "audio/wave": ".wav", "audio/flac": ".flac",
+    "audio/x-flac": ".flac", "audio/ogg": ".ogg", "audio/mpeg": ".mp3", "audio/aiff": ".aiff",
+}
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds config.UPLOAD_MAX_BYTES."""
+
+
+class UploadRejected(ValueError):
+    """Raised for uploads that are not decodable audio or are too long."""
+
+
+def upload_dir():
+    """Directory for uploaded audio (config.UPLOAD_DIR, relative to the repo root)."""
+    path = config.UPLOAD_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def new_upload_file(suffix=""):
+    """Open a new, uniquely named binary file in the upload directory."""
+    return tempfile.NamedTemporaryFile("w+b", prefix=UPLOAD_PREFIX, suffix=suffix, dir=upload_dir(), delete=False)
+
+
+def suffix_for(filename=None, mimetype=None):
+    """File suffix from the client's file name, else from the MIME type."""
+    suffix = os.path.splitext(filename or "")[1].lower()
+    if suffix.isascii() and suffix[1:].isalnum():
+        return suffix
+    return MIME_SUFFIXES.get((mimetype or "").lower(), "")
+
+
+def save_stream(stream, suffix="", max_bytes=None):
+    """
+    Copy a readable stream to a new upload file chunk by chunk.
+    :param max_bytes: Size limit (default config.UPLOAD_MAX_BYTES); the partial file is removed if exceeded.
+    :return: Path of the saved file.
+    """
+    max_bytes = max_bytes or config.UPLOAD_MAX_BYTES
+    written = 0
+    with new_upload_file(suffix) as f:
+        try:
+            for chunk in iter(lambda: stream.read(config.UPLOAD_CHUNK_SIZE), b""):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes // (1 << 20)} MB.")
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            discard(f.name)
+            raise
+    return f.name
+
+
+def probe(path, max_duration=None):
+    """
+    Check that a saved upload is decodable audio within the duration limit, reading only its header.
+    :return: {"duration", "samplerate", "channels", "format"}
+    """
+    max_duration = max_duration or config.UPLOAD_MAX_DURATION
+    try:
+        info = sf.info(path)
+    except Exception:
+        raise UploadRejected("Unsupported or corrupt audio file.")
+    if not info.frames or not info.samplerate:
+        raise UploadRejected("Audio file contains no samples.")
+    if info.duration > max_duration:
+        raise UploadRejected(f"Audio is {info.duration:.0f}s long; the limit is {max_duration:.0f}s.")
+    return {"duration": round(info.duration, 2), "samplerate": info.samplerate,
+            "channels": info.channels, "format": info.format}
+
+
+def discard(path):
+    """Delete an upload, ignoring files that are already gone."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def cleanup(ttl=None):
+    """
+    Delete uploads older than `ttl` seconds (default config.UPLOAD_TTL).
+    :return: Number of files removed.
+    """
+    ttl = config.UPLOAD_TTL if ttl is None else ttl
+    cutoff = time.time() - ttl
+    removed = 0
+    directory = upload_dir()
+    for name in os.listdir(directory):
+        if not name.startswith(UPLOAD_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue  # Removed concurrently
+    if removed:
+        log(f"🧹 Removed {removed} expired uploads.")
+    return removed
+
+
+def start_sweeper(interval=None):
+    """
+    Start the daemon thread that runs cleanup() every `interval` seconds
+    (default config.UPLOAD_CLEANUP_INTERVAL), including while the server is idle.
+    Safe to call more than once; only one sweeper runs per process.
+    """
+    global _sweeper
+    interval = interval or config.UPLOAD_CLEANUP_INTERVAL
+    with _sweeper_lock:
+        if _sweeper is not None:
+            return _sweeper
+
+        def run():
+            while True:
+                try:
+                    cleanup()
+                except Exception as e:
+                    log(f"❌ Upload cleanup failed: {e}")
+                time.sleep(interval)
+
+        _sweeper = threading.Thread(target=run, daemon=True, name="upload-sweeper")
+        _sweeper.start()
+        return _sweeper
+
+
+def analyze_upload(path, profile=None, keep=False):
+    """
+    Job entry point: tempo & key of an uploaded file, which is deleted afterwards unless `keep`.
+    Runs in a worker process, so it imports the analysis stack itself.
+    """
+    import backend.audio_analysis as audio_analysis
+
+    try:
+        tempo, key = audio_analysis.extract_audio_features(path, profile=profile)
+    finally:
+        if not keep:
+            discard(path)
+    if not tempo or key is None:
+        raise ValueError("No valid music detected.")
+    return {"tempo": tempo, "key": str(key)}
+
+
+class UploadRequest(Request):
+    """
+    Flask request whose multipart file parts are written straight to the upload directory.
+    `upload_paths` lists every file it created, including parts cut off by a size limit.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_paths = []
+
+    def make_form_data_parser(self):
+        parser = super().make_form_data_parser()
+        parser.silent = False  # Surface a body cut off by max_content_length instead of an empty form
+        return parser
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        f = new_upload_file(suffix_for(filename, content_type))
+        self.upload_paths.append(f.name)
+        return f
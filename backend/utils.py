@@ -1,35 +1,51 @@
 import os
-import pygame
-import subprocess
-import time
+import shutil
 import numpy as np
+import soundfile as sf
 
-# Initialize pygame mixer only if not already initialized
-if not pygame.mixer.get_init():
-    pygame.mixer.init()
+import config
+import backend.preprocessing as preprocessing
+from backend.lazy_imports import lazy_import
+from backend.playback_manager import DEFAULT_SESSION, get_manager
+from backend.telemetry import log
+
+pygame = lazy_import("pygame")
 
 # Paths for Fluidsynth and SoundFont
-SOUNDFONT_PATH = os.path.abspath("C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/FluidR3_GM.sf2")
-FLUIDSYNTH_PATH = os.path.abspath("C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/fluidsynth.exe")
+SOUNDFONT_PATH = os.path.abspath(config.SOUNDFONT_PATH)
+FLUIDSYNTH_PATH = os.path.abspath(config.FLUIDSYNTH_PATH)
+
 
-# Global variables for MIDI playback control
-stop_flag = False
-midi_processes = []  # Stores active MIDI processes
+def init_mixer():
+    """Initialize pygame mixer only if not already initialized."""
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
 
 
-def save_audio(filepath, audio_data=None):
+def save_audio(filepath, audio_data=None, sample_rate=config.AUDIO_SAMPLE_RATE):
     """
     Save recorded audio data to a file.
     :param filepath: Path to save the audio file.
-    :param audio_data: Binary audio data (optional).
+    :param audio_data: Encoded bytes, a readable binary stream (copied in chunks),
+        or a NumPy array of samples (written in the format implied by the extension, WAV by default).
+    :param sample_rate: Sample rate for NumPy input.
     :return: The saved file path.
     """
     try:
+        if isinstance(audio_data, np.ndarray):
+            if audio_data.size == 0:
+                raise ValueError("Audio array is empty.")
+            fmt = None if sf.check_format(os.path.splitext(filepath)[1][1:] or "-") else "WAV"
+            sf.write(filepath, audio_data, sample_rate, format=fmt)
+            return filepath
         with open(filepath, "wb") as f:
-            f.write(audio_data if audio_data else b"")  # Save actual or empty data
+            if hasattr(audio_data, "read"):
+                shutil.copyfileobj(audio_data, f, config.UPLOAD_CHUNK_SIZE)
+            else:
+                f.write(audio_data or b"")  # Save actual or empty data
         return filepath
     except Exception as e:
-        print(f"❌ Error saving audio file: {e}")
+        log(f"❌ Error saving audio file: {e}")
         return None
 
 
@@ -39,24 +55,25 @@ def play_audio(file_path):
     :param file_path: Path to the audio file.
     """
     if not os.path.exists(file_path):
-        print(f"❌ Error: {file_path} not found")
+        log(f"❌ Error: {file_path} not found")
         return
 
     try:
+        init_mixer()
         pygame.mixer.music.load(file_path)
         pygame.mixer.music.play()
-        print(f"▶️ Playing: {file_path}")
+        log(f"▶️ Playing: {file_path}")
     except pygame.error as e:
-        print(f"❌ Audio playback error: {e}")
+        log(f"❌ Audio playback error: {e}")
 
 
 def stop_audio():
     """Stop any currently playing audio."""
-    if pygame.mixer.music.get_busy():
+    if pygame.mixer.get_init() and pygame.mixer.music.get_busy():
         pygame.mixer.music.stop()
-        print("⏹️ Audio playback stopped.")
+        log("⏹️ Audio playback stopped.")
     else:
-        print("⚠️ No audio is currently playing.")
+        log("⚠️ No audio is currently playing.")
 
 
 def normalize_audio(audio):
@@ -66,54 +83,40 @@ def normalize_audio(audio):
     :return: Normalized NumPy array.
     """
     if audio is None or len(audio) == 0:
-        print("⚠️ Cannot normalize empty audio.")
+        log("⚠️ Cannot normalize empty audio.")
         return None
 
-    max_val = np.max(np.abs(audio))
-    if max_val == 0:
-        print("⚠️ Audio is silent! Normalization skipped.")
+    normalized, peak = preprocessing.normalize(audio, mono=False)
+    if peak == 0:
+        log("⚠️ Audio is silent! Normalization skipped.")
         return audio  # Return original to avoid division by zero
 
-    return audio / max_val  # Normalize to [-1, 1]
+    return normalized  # float32, scaled to [-1, 1]
 
 
-def play_midi_loop(midi_file):
+def play_midi_loop(*midi_files, session=DEFAULT_SESSION):
     """
-    Plays a MIDI file in a loop using Fluidsynth until stopped.
-    :param midi_file: Path to the MIDI file.
+    Plays MIDI files together in a gapless, sample-aligned loop until the session is stopped.
+    :param midi_files: Paths to the MIDI files (e.g. beat and piano).
+    :param session: Playback session id; starting replaces that session's previous playback.
     """
-    global stop_flag, midi_processes
-
-    while not stop_flag:
-        try:
-            process = subprocess.Popen([FLUIDSYNTH_PATH, "-ni", SOUNDFONT_PATH, midi_file])
-            midi_processes.append(process)  # Track process
-            process.wait()  # Wait for playback completion before looping
-        except Exception as e:
-            print(f"❌ Error playing MIDI: {e}")
-            break
+    try:
+        player = get_manager().start(session, midi_files, loop=True)
+        player.wait()  # Block like the old per-pass loop did, until stop_midi()
+    except Exception as e:
+        log(f"❌ Error playing MIDI: {e}")
 
-    print(f"🔁 Looping {midi_file} stopped.")
+    log(f"🔁 Looping {', '.join(map(str, midi_files))} stopped.")
 
 
-def stop_midi():
+def stop_midi(session=None):
     """
-    Stops MIDI playback by setting stop flag and terminating Fluidsynth processes.
+    Stops one session's playback, or every session's when `session` is None.
+    Returns immediately; the synth stays loaded for the next playback.
     """
-    global stop_flag, midi_processes
-    stop_flag = True  # Prevent new loops
-
-    print("⏹️ Stopping MIDI playback...")
-
-    # Terminate all active Fluidsynth processes
-    for process in midi_processes:
-        try:
-            if process.poll() is None:  # If still running
-                process.terminate()  # Graceful termination
-                time.sleep(1)  # Allow time to close
-                process.kill()  # Force kill if necessary
-        except Exception as e:
-            print(f"⚠️ Error stopping MIDI process: {e}")
-
-    midi_processes.clear()  # Clear process list
-    print("✅ MIDI playback stopped.")
+    log("⏹️ Stopping MIDI playback...")
+    if session is None:
+        get_manager().stop_all()
+    else:
+        get_manager().stop(session)
+    log("✅ MIDI playback stopped.")
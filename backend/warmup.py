@@ -0,0 +1,60 @@
+import importlib
+import time
+
+import numpy as np
+
+import config
+from backend.telemetry import log
+
+
+def synthetic_signal(duration=4.0, sample_rate=config.AUDIO_SAMPLE_RATE, bpm=120):
+    """A click track over an A-minor triad: enough structure to exercise every analysis stage."""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    y = sum(0.2 * np.sin(2 * np.pi * f * t) for f in (220.0, 261.63, 329.63))
+    click_len = int(0.01 * sample_rate)
+    for start in np.arange(0, duration, 60.0 / bpm):
+        i = int(start * sample_rate)
+        y[i:i + click_len] += np.hanning(2 * click_len)[click_len:][:len(y[i:i + click_len])]
+    return y.astype(np.float32)
+
+
+def warmup(sample_rate=config.AUDIO_SAMPLE_RATE):
+    """
+    Load heavy dependencies and JIT-compile librosa's numba kernels on a
+    synthetic signal, so the first real request is no slower than later ones.
+    :return: dict of timings in seconds (import, first call, second call).
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    import backend.audio_analysis as audio_analysis
+    import backend.real_time_processing as real_time_processing
+    for name in ("librosa", "librosa.beat", "librosa.onset", "librosa.feature", "librosa.decompose"):
+        importlib.import_module(name)
+    try:
+        importlib.import_module("sounddevice")
+    except (ImportError, OSError) as e:
+        log(f"⚠️ sounddevice unavailable, microphone input disabled: {e}")
+    timings["import"] = time.perf_counter() - started
+
+    y = synthetic_signal(sample_rate=sample_rate)
+
+    started = time.perf_counter()
+    audio_analysis.analyze_array(y, sample_rate, use_cache=False)
+    analyzer = real_time_processing.StreamingAnalyzer(sample_rate=sample_rate)
+    block = int(config.STREAM_BLOCK_DURATION * sample_rate)
+    for i in range(0, len(y), block):
+        analyzer.process_block(y[i:i + block])
+    timings["first_call"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    audio_analysis.analyze_array(y, sample_rate, use_cache=False)
+    timings["second_call"] = time.perf_counter() - started
+
+    log(f"🔥 Warm-up done: imports {timings['import']:.2f}s, first analysis {timings['first_call']:.2f}s, "
+          f"warm analysis {timings['second_call']:.2f}s")
+    return timings
+
+
+if __name__ == "__main__":
+    warmup()
@@ -0,0 +1,114 @@
+"""
+Tempo agreement and speed of the HPSS backends against the librosa reference.
+
+Usage:
+    python -m benchmarks.hpss_backends                      # synthetic set + uploads/sample_audio.wav
+    python -m benchmarks.hpss_backends --labels labels.jsonl
+    python -m benchmarks.hpss_backends --profile accurate --tolerance 0.02
+
+Every input is analyzed once per backend in backend.hpss.HPSS_BACKENDS.
+A backend agrees on an input when its tempo is within --tolerance
+(relative) of the "librosa" backend's tempo. The exit status is 1 if any
+backend's agreement rate is below --min-agreement, so this can gate
+changes to the backends.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config
+import backend.audio_analysis as audio_analysis
+import backend.warmup as warmup
+from backend.hpss import HPSS_BACKENDS, hpss_masks
+from benchmarks.profiles import file_set, synthetic_set
+from benchmarks.run import SAMPLE_PATH
+
+REFERENCE = "librosa"
+
+
+def reference_audio(labels_path=None):
+    """(name, y, sr) for every input to compare on."""
+    items = [(name, y, sr) for name, y, sr, _, _ in (file_set(labels_path) if labels_path else synthetic_set())]
+    if not labels_path and os.path.exists(SAMPLE_PATH):
+        y, sr = sf.read(SAMPLE_PATH, dtype="float32")
+        items.append(("sample_audio", y, sr))
+    return items
+
+
+def tempo_for(backend, y, sr, profile):
+    previous, config.HPSS_BACKEND = config.HPSS_BACKEND, backend
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")  # Silence per-call logging
+    try:
+        return audio_analysis.analyze_array(y, sr, use_cache=False, profile=profile)[0]
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        config.HPSS_BACKEND = previous
+
+
+def disagreements(backend, items, reference, tolerance=0.02, profile=None):
+    """
+    Inputs on which `backend`'s tempo is not within `tolerance` (relative) of the reference tempo.
+    :param items: (name, y, sr) tuples; `reference` holds the reference backend's tempo for each.
+    """
+    failures = []
+    for (name, y, sr), expected in zip(items, reference):
+        tempo = tempo_for(backend, y, sr, profile)
+        if abs(tempo - expected) > tolerance * max(expected, 1e-9):
+            failures.append(f"{name}: {tempo:.1f} vs {expected:.1f}")
+    return failures
+
+
+def mask_time(backend, magnitude, repeat=3):
+    """Best-of-`repeat` seconds for one hpss_masks call."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hpss_masks(magnitude, backend=backend)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare HPSS backends with the librosa reference.")
+    parser.add_argument("--labels", help="JSONL file of {path, tempo, key} labels (default: synthetic set)")
+    parser.add_argument("--profile", default=None, help="Analysis profile (default: config.ANALYSIS_PROFILE)")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Relative tempo tolerance")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Lowest passing agreement rate")
+    args = parser.parse_args(argv)
+
+    warmup.warmup()
+    items = reference_audio(args.labels)
+    reference = [tempo_for(REFERENCE, y, sr, args.profile) for _, y, sr in items]
+
+    settings = audio_analysis.get_profile(args.profile)
+    longest = max(items, key=lambda item: len(item[1]))
+    y = audio_analysis.preprocess_audio(longest[1]).copy()
+    magnitude = np.abs(audio_analysis.librosa.stft(y, n_fft=settings["n_fft"], hop_length=settings["hop_length"]))
+    reference_time = mask_time(REFERENCE, magnitude)
+
+    failed = False
+    for backend in HPSS_BACKENDS:
+        if backend == REFERENCE:
+            continue
+        failures = disagreements(backend, items, reference, args.tolerance, args.profile)
+        agreement = 1 - len(failures) / len(items)
+        seconds = mask_time(backend, magnitude)
+        status = "✅" if agreement >= args.min_agreement else "❌"
+        failed |= agreement < args.min_agreement
+        print(f"{status} {backend:<12} tempo agreement {agreement:.0%} on {len(items)} inputs, "
+              f"masks {1000 * seconds:.1f} ms vs {1000 * reference_time:.1f} ms "
+              f"({reference_time / seconds:.1f}x) on {longest[0]}")
+        for line in failures:
+            print(f"   ↳ {line}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Load generator for the micro-batched inference service.
+
+Usage:
+    python -m benchmarks.inference_load                       # random .npz model, default grid
+    python -m benchmarks.inference_load --model models/trained_model.pth
+    python -m benchmarks.inference_load --clients 32 --batches 1,8,32 --waits 0,2,10
+
+For every (max batch, max wait) pair, --clients threads send requests
+back-to-back for --duration seconds. Each request carries --windows feature
+windows. The report lists throughput, latency percentiles and the mean
+number of requests per forward pass. Without --model, a random dense network
+of realistic size is used, so batching overhead and gains can be measured
+without a trained model.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config
+import backend.inference as inference
+from backend.training_data import N_FEATURES
+
+
+def random_model(path, hidden=(256, 64), seed=0):
+    """Write a random dense .npz model (key logits + tempo) and return its path."""
+    rng = np.random.default_rng(seed)
+    sizes = [config.TRAINING_WINDOW_FRAMES * N_FEATURES, *hidden, 13]
+    arrays = {}
+    for i, (n_in, n_out) in enumerate(zip(sizes, sizes[1:])):
+        arrays[f"W{i}"] = (rng.standard_normal((n_in, n_out)) / np.sqrt(n_in)).astype(np.float32)
+        arrays[f"b{i}"] = np.zeros(n_out, dtype=np.float32)
+    np.savez(path, **arrays)
+    return path
+
+
+def run_load(forward, max_batch, max_wait_ms, clients, duration, windows):
+    """Drive one predictor configuration; returns a result dict."""
+    predictor = inference.BatchingPredictor(forward, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    request = np.random.default_rng(1).random((windows, config.TRAINING_WINDOW_FRAMES, N_FEATURES),
+                                              dtype=np.float32)
+    latencies = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + duration
+
+    def client(samples):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            predictor.predict(request)
+            samples.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client, args=(samples,)) for samples in latencies]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    predictor.close()
+
+    all_latencies = np.array([l for samples in latencies for l in samples]) * 1000
+    return {
+        "max_batch": max_batch,
+        "max_wait_ms": max_wait_ms,
+        "requests_per_s": round(len(all_latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(all_latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(all_latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(all_latencies, 99)), 2),
+        "mean_batch": round(predictor.requests / max(predictor.batches, 1), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure inference throughput and latency per batch setting.")
+    parser.add_argument("--model", help="Model file (default: a random .npz network)")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per configuration")
+    parser.add_argument("--windows", type=int, default=4, help="Feature windows per request")
+    parser.add_argument("--batches", default="1,4,16", help="Comma-separated max batch sizes")
+    parser.add_argument("--waits", default="0,2,5", help="Comma-separated max waits in ms")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        forward = inference.load_model(args.model or random_model(os.path.join(tmp, "random.npz")))
+    if forward is None:
+        sys.exit("❌ No usable model to load.")
+
+    print(f"🚦 {args.clients} clients, {args.windows} windows/request, {args.duration:.0f}s per setting")
+    print(f"{'batch':>5} {'wait':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/pass':>9}")
+    for max_batch in map(int, args.batches.split(",")):
+        for max_wait in map(float, args.waits.split(",")):
+            r = run_load(forward, max_batch, max_wait, args.clients, args.duration, args.windows)
+            print(f"{r['max_batch']:>5} {r['max_wait_ms']:>6g} {r['requests_per_s']:>9.1f} {r['p50_ms']:>8.2f} "
+                  f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['mean_batch']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
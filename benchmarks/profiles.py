@@ -0,0 +1,173 @@
+"""
+Speed/accuracy tradeoff of the analysis quality profiles.
+
+Usage:
+    python -m benchmarks.profiles                      # rendered labelled set
+    python -m benchmarks.profiles --set synthetic      # click tracks over a triad
+    python -m benchmarks.profiles --labels labels.jsonl
+    python -m benchmarks.profiles --save               # update profile_results.json
+
+The rendered set is a bass line under a I-vi-IV-V or i-VI-iv-v chord
+progression (the tonic is in three of the four chords), written as MIDI at
+known tempos and keys, rendered with the mixer's built-in synth and mixed
+with clicks on the beat and noise. The synthetic set is click
+tracks over a held triad; every profile gets all of those right, so it only
+measures speed. A labels file uses real recordings, one JSON object per line:
+{"path": "...", "tempo": 120, "key": 7}. A tempo counts as correct when it
+is within --tolerance of the label or of half/double the label.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import mido
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import backend.audio_analysis as audio_analysis
+import backend.mixer as mixer
+import backend.warmup as warmup
+from benchmarks.run import SAMPLE_RATE, click_track
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile_results.json")
+
+
+def labelled_signal(bpm, key, duration=12.0, sample_rate=SAMPLE_RATE):
+    """Click track at `bpm` over a triad rooted on pitch class `key` (root doubled)."""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    root = 220.0 * 2 ** (((key - 9) % 12) / 12)
+    tones = [root, root * 2, root * 2 ** (4 / 12), root * 2 ** (7 / 12)]
+    y = sum(np.sin(2 * np.pi * f * t) for f in tones) / len(tones)
+    return (0.5 * y + click_track(duration, sample_rate, bpm)).astype(np.float32)
+
+
+def synthetic_set():
+    for bpm in (80, 100, 120, 140):
+        for key in (0, 2, 5, 7, 9, 11):
+            yield f"synthetic_{bpm}bpm_key{key}", labelled_signal(bpm, key), SAMPLE_RATE, bpm, key
+
+
+PROGRESSIONS = {
+    False: [(0, 4, 7), (9, 12, 16), (5, 9, 12), (7, 11, 14)],  # I-vi-IV-V
+    True: [(0, 3, 7), (8, 12, 15), (5, 8, 12), (7, 10, 14)],  # i-VI-iv-v
+}
+
+
+def song_midi(bpm, key, minor=False, bars=8, ticks_per_beat=480):
+    """A `bars`-long 4/4 part in pitch class `key`: one held chord per bar over a bass note on every beat."""
+    events = []
+
+    def note(start, length, channel, pitch, velocity):
+        events.append((start, mido.Message("note_on", channel=channel, note=pitch, velocity=velocity)))
+        events.append((start + length, mido.Message("note_off", channel=channel, note=pitch)))
+
+    for bar in range(bars):
+        chord = PROGRESSIONS[minor][bar % 4]
+        bar_start = bar * 4 * ticks_per_beat
+        for interval in chord:
+            note(bar_start, 4 * ticks_per_beat - 10, 0, 60 + key + interval, 60)
+        for beat in range(4):
+            note(bar_start + beat * ticks_per_beat, ticks_per_beat * 5 // 6, 1, 36 + key + chord[0], 80)
+
+    mid = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+    track = mido.MidiTrack([mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(bpm))])
+    mid.tracks.append(track)
+    now = 0
+    for tick, msg in sorted(events, key=lambda e: (e[0], e[1].type == "note_on")):  # Offs before ons
+        track.append(msg.copy(time=tick - now))
+        now = tick
+    return mid
+
+
+def rendered_signal(bpm, key, minor=False, click=0.25, noise=0.08, seed=0, sample_rate=SAMPLE_RATE):
+    """
+    song_midi rendered with the mixer's SimpleRenderer, plus a click on every beat and white noise.
+    The clicks are added as noise bursts because SimpleRenderer would play drum notes as pitched sines.
+    """
+    y = mixer.render_parts([song_midi(bpm, key, minor)], sample_rate=sample_rate, renderer="simple").mean(axis=1)
+    y += click * click_track(len(y) / sample_rate, sample_rate, bpm)[:len(y)]
+    return y + noise * np.random.default_rng(seed).standard_normal(len(y)).astype(np.float32)
+
+
+def rendered_set():
+    seed = 0
+    for bpm in (72, 96, 110, 126, 150):
+        for key in (0, 4, 9):
+            for minor in (False, True):
+                name = f"rendered_{bpm}bpm_key{key}{'m' if minor else ''}"
+                yield name, rendered_signal(bpm, key, minor, seed=seed), SAMPLE_RATE, bpm, key
+                seed += 1
+
+
+LABELLED_SETS = {"rendered": rendered_set, "synthetic": synthetic_set}
+
+
+def file_set(labels_path):
+    with open(labels_path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            y, sr = sf.read(entry["path"], dtype="float32")
+            yield entry["path"], y, sr, entry["tempo"], entry["key"]
+
+
+def tempo_ok(estimate, label, tolerance):
+    return any(abs(estimate - label * factor) <= tolerance * label * factor for factor in (0.5, 1.0, 2.0))
+
+
+def evaluate(items, tolerance):
+    results = {}
+    for profile in audio_analysis.ANALYSIS_PROFILES:
+        wall = audio = 0.0
+        tempo_hits = key_hits = count = 0
+        for _, y, sr, bpm, key in items:
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")  # Silence per-call logging
+            try:
+                started = time.perf_counter()
+                tempo, estimated_key = audio_analysis.analyze_array(y, sr, use_cache=False, profile=profile)
+                wall += time.perf_counter() - started
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            audio += len(y) / sr
+            count += 1
+            tempo_hits += tempo_ok(tempo, bpm, tolerance)
+            key_hits += estimated_key == key
+        results[profile] = {
+            "files": count,
+            "audio_s_per_s": round(audio / wall, 1),
+            "mean_ms": round(1000 * wall / count, 1),
+            "tempo_accuracy": round(tempo_hits / count, 3),
+            "key_accuracy": round(key_hits / count, 3),
+        }
+        r = results[profile]
+        print(f"📊 {profile:<9} {r['mean_ms']:9.1f} ms/file {r['audio_s_per_s']:8.1f} audio-s/s "
+              f"tempo {r['tempo_accuracy']:.0%}  key {r['key_accuracy']:.0%}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare analysis profiles on a labelled set.")
+    parser.add_argument("--set", choices=sorted(LABELLED_SETS), default="rendered", help="Built-in labelled set")
+    parser.add_argument("--labels", help="JSONL file of {path, tempo, key} labels (overrides --set)")
+    parser.add_argument("--tolerance", type=float, default=0.04, help="Relative tempo tolerance")
+    parser.add_argument("--save", action="store_true", help="Write results to profile_results.json")
+    args = parser.parse_args(argv)
+
+    warmup.warmup()
+    items = list(file_set(args.labels) if args.labels else LABELLED_SETS[args.set]())
+    results = evaluate(items, args.tolerance)
+
+    if args.save:
+        with open(RESULTS_PATH, "w", encoding="utf-8") as f:
+            json.dump({"labelled_set": args.labels or args.set, "tolerance": args.tolerance,
+                       "profiles": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"✅ Results written to {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Benchmarks for the analysis and generation hot paths.
+
+Usage:
+    python -m benchmarks.run                    # compare against baselines.json
+    python -m benchmarks.run --update-baseline  # record new baselines
+    python -m benchmarks.run --durations 5,60   # skip the 10 minute signals
+
+Each case records wall time (best of --repeat runs), peak traced memory and
+audio-seconds processed per second. The run exits non-zero when any case is
+slower (or uses more memory) than its baseline by more than --threshold, or
+has no baseline at all.
+Baselines are machine-specific; refresh them when the benchmark host changes.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config
+import backend.audio_analysis as audio_analysis
+import backend.beat_generation as beat_generation
+import backend.piano_generation as piano_generation
+import backend.warmup as warmup
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines.json")
+SAMPLE_PATH = os.path.join(BENCH_DIR, "..", "uploads", "sample_audio.wav")
+SAMPLE_RATE = config.AUDIO_SAMPLE_RATE
+
+
+def click_track(duration, sample_rate=SAMPLE_RATE, bpm=120):
+    """Short decaying noise bursts on every beat."""
+    rng = np.random.default_rng(0)
+    y = np.zeros(int(duration * sample_rate), dtype=np.float32)
+    click = (rng.standard_normal(int(0.02 * sample_rate)) * np.exp(-np.linspace(0, 8, int(0.02 * sample_rate))))
+    for start in np.arange(0, duration, 60.0 / bpm):
+        i = int(start * sample_rate)
+        n = min(len(click), len(y) - i)
+        y[i:i + n] += click[:n].astype(np.float32)
+    return y
+
+
+def chord_tones(duration, sample_rate=SAMPLE_RATE, root=220.0):
+    """A sustained major triad on `root`."""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    y = sum(np.sin(2 * np.pi * root * ratio * t) for ratio in (1.0, 1.25, 1.5)) / 3
+    return y.astype(np.float32)
+
+
+def load_signals(durations):
+    """Benchmark inputs as {name: float32 mono array}."""
+    signals = {}
+    y, sr = sf.read(SAMPLE_PATH, dtype="float32")
+    if sr == SAMPLE_RATE:
+        signals["sample_audio"] = y if y.ndim == 1 else y.mean(axis=1)
+    for duration in durations:
+        signals[f"click_{duration}s"] = click_track(duration)
+        signals[f"chord_{duration}s"] = chord_tones(duration)
+    return signals
+
+
+def analysis_cases(signals):
+    """(name, audio seconds, callable) for every analysis function and input."""
+    cases = []
+    for name, y in signals.items():
+        seconds = len(y) / SAMPLE_RATE
+        prepared = audio_analysis.preprocess_audio(y).copy()  # Outlive the pooled buffer
+        cases.append((f"preprocess_audio[{name}]", seconds, lambda y=y: audio_analysis.preprocess_audio(y)))
+        cases.append((f"harmonic_percussive_separation[{name}]", seconds,
+                      lambda y=prepared: audio_analysis.harmonic_percussive_separation(y)))
+        cases.append((f"analyze_audio[{name}]", seconds,
+                      lambda y=prepared: audio_analysis.analyze_audio(y, SAMPLE_RATE)))
+    return cases
+
+
+def generation_cases():
+    """Uncached MIDI generation, i.e. what a new (tempo, key) costs."""
+    def beat():
+        beat_generation.beat_midi_bytes.cache_clear()
+        beat_generation.beat_midi_bytes(120)
+
+    def piano():
+        piano_generation.piano_progression_bytes.cache_clear()
+        piano_generation.piano_progression_bytes(2)
+
+    return [("generate_beat", 0.0, beat), ("generate_piano_progression", 0.0, piano)]
+
+
+def measure(func, repeat):
+    """Best wall time over `repeat` runs, then one traced run for peak memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(durations, repeat, quiet=True):
+    results = {}
+    warmup.warmup()  # Keep imports and numba JIT out of the timed runs
+    cases = analysis_cases(load_signals(durations)) + generation_cases()
+    for name, seconds, func in cases:
+        stdout = sys.stdout
+        if quiet:
+            sys.stdout = open(os.devnull, "w")  # Backend functions print per call
+        try:
+            wall, peak = measure(func, repeat)
+        finally:
+            if quiet:
+                sys.stdout.close()
+                sys.stdout = stdout
+        results[name] = {
+            "wall_s": round(wall, 5),
+            "peak_mb": round(peak / 2 ** 20, 2),
+            "audio_s_per_s": round(seconds / wall, 1) if seconds else None,
+        }
+        rate = f"{results[name]['audio_s_per_s']:>9} audio-s/s" if seconds else ""
+        print(f"⏱️ {name:<55} {wall * 1000:10.2f} ms {results[name]['peak_mb']:9.2f} MB {rate}")
+    return results
+
+
+def compare(results, baselines, threshold, min_delta):
+    """
+    Names of cases slower or hungrier than baseline by more than `threshold`, or with no baseline.
+    Differences below `min_delta` (seconds or MB) are treated as noise.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baselines.get(name)
+        if not base:
+            print(f"❌ {name}: no baseline (record one with --update-baseline)")
+            regressions.append(name)
+            continue
+        for metric in ("wall_s", "peak_mb"):
+            if (base[metric] and result[metric] > base[metric] * (1 + threshold)
+                    and result[metric] - base[metric] > min_delta):
+                change = result[metric] / base[metric] - 1
+                print(f"❌ {name}: {metric} {base[metric]} -> {result[metric]} (+{change:.0%})")
+                regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark analysis and generation hot paths.")
+    parser.add_argument("--durations", default="5,60,600", help="Synthetic signal lengths in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (best is kept)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, e.g. 0.25 = 25%%")
+    parser.add_argument("--min-delta", type=float, default=0.005,
+                        help="Ignore absolute differences below this (seconds or MB)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write results to baselines.json")
+    parser.add_argument("--output", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    durations = [int(d) for d in args.durations.split(",") if d]
+    results = run(durations, args.repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"✅ Baselines written to {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baselines, args.threshold, args.min_delta)
+    if regressions:
+        print(f"❌ {len(set(regressions))} benchmark(s) regressed beyond {args.threshold:.0%} or lack a baseline.")
+        return 1
+    print("✅ No regressions beyond threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
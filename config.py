@@ -1 +1,100 @@
-AUDIO_SAMPLE_RATE = 44100
\ No newline at end of file
+AUDIO_SAMPLE_RATE = 44100
+
+# Streaming analysis (live microphone input)
+STREAM_BLOCK_DURATION = 0.25  # Seconds of audio per InputStream callback
+STREAM_MAX_DURATION = 10  # Upper bound on recording length in seconds
+STREAM_STABLE_BLOCKS = 8  # Stop early once tempo/key held steady this many blocks
+STREAM_TEMPO_TOLERANCE = 2.0  # BPM drift still counted as "stable"
+STREAM_ANALYSIS = True  # Use streaming analysis for /record-analyze instead of a fixed-length take
+
+# Feature cache for audio_analysis (in-process LRU + on-disk SQLite store)
+FEATURE_CACHE_ENTRIES = 256  # Max results kept in memory per process
+FEATURE_CACHE_PATH = "cache/features.sqlite"  # Relative to the repo root; None disables the disk store
+
+# Background job queue for api.py
+JOB_THREAD_WORKERS = 4  # Threads for I/O-bound jobs (recording, playback)
+JOB_PROCESS_WORKERS = None  # Processes for CPU-bound analysis; None uses the CPU count
+JOB_MAX_PENDING = 16  # Queued + running jobs before new submissions get HTTP 429
+JOB_RESULT_TTL = 600  # Seconds a finished job's result stays available
+JOB_MAX_WAIT = 30  # Longest a GET /jobs/<id>?wait=... request may block
+JOB_EVENTS_HEARTBEAT = 15  # Seconds between keep-alive comments on GET /jobs/<id>/events
+JOB_EVENTS_RETRY_MS = 1000  # Reconnect delay suggested to EventSource clients after a dropped stream
+
+# Synthesizer
+SOUNDFONT_PATH = "C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/FluidR3_GM.sf2"
+FLUIDSYNTH_PATH = "C:/Users/PC/Downloads/fluidsynth-2.4.3-win10-x64/bin/fluidsynth.exe"
+SYNTH_BACKEND = "auto"  # "pyfluidsynth", "shell" (fluidsynth command shell) or "auto"
+SYNTH_AUDIO_DRIVER = None  # fluidsynth audio driver, e.g. "dsound", "pulseaudio"; None for default
+
+# Playback
+PLAYBACK_ENGINE = "mixer"  # "mixer" (all parts mixed into one sample-aligned stream) or "synth" (realtime SynthService)
+PLAYBACK_OUTPUT = "sounddevice"  # Mixer output: "sounddevice", "file" (WAV at PLAYBACK_FILE) or "null" (headless)
+PLAYBACK_FILE = "generated/playback.wav"
+PLAYBACK_RENDERER = "auto"  # "fluidsynth" (pyfluidsynth offline rendering), "simple" (built-in) or "auto"
+PLAYBACK_BLOCK_SIZE = 512  # Samples rendered per output callback
+PLAYBACK_MAX_SESSIONS = 4  # Sessions (clients) allowed to play at once; further starts are refused
+SERVER_PLAYBACK = True  # Play generated music on the server's sound device (browsers can play LOOP files instead)
+
+# Pre-rendered loops served over HTTP
+LOOP_CACHE_DIR = "generated/loops"  # Relative to the repo root
+LOOP_FORMAT = "flac"  # "flac" or "wav"
+LOOP_MAX_SECONDS = 60  # Longest loop rendered so every part completes whole passes; beyond it parts are stretched to fit
+
+# Generated MIDI
+MIDI_OUTPUT_DIR = "generated"  # Content-addressed .mid files, relative to the repo root
+MIDI_CACHE_SIZE = 128  # (tempo, key, pattern) results memoized per process
+PIANO_BACKEND = "native"  # "native" (backend.chord_engine) or "music21" (optional dependency)
+
+# Startup
+LAZY_IMPORTS = True  # Load librosa, sounddevice, pygame and tensorflow on first use
+WARMUP_ON_START = True  # Run backend.warmup.warmup() before api.py starts serving
+
+# Observability
+LOG_FORMAT = "text"  # "text" for human-readable lines, "json" for one structured object per line
+
+# Profiling (opt-in via HARMONY_PROFILE=1 or the X-Harmony-Profile request header)
+PROFILE_DIR = "profiles"  # Relative to the repo root
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_FORMAT = "speedscope"  # "speedscope" (JSON) or "collapsed" (flamegraph.pl .folded)
+
+# Analysis quality profile used when a request does not pick one: "fast", "balanced", "standard" or "accurate"
+ANALYSIS_PROFILE = "standard"  # Same rate and STFT sizes as the analysis before profiles existed
+
+# Blockwise analysis for long recordings (bounded memory, per-segment tempo/key)
+BLOCKWISE_MIN_DURATION = 300  # Files longer than this many seconds are analyzed block by block
+BLOCKWISE_BLOCK_SECONDS = 10  # Audio read and transformed per block
+BLOCKWISE_SEGMENT_SECONDS = 30  # Window for per-segment tempo/key; windows overlap by half
+
+# Preprocessing
+PREPROCESS_POOL_MAX_SAMPLES = 44100 * 120  # Largest buffer (in samples) a worker's pool keeps for reuse
+
+# HPSS backend feeding percussive onset detection: "librosa" (exact) or "downsampled" (faster)
+HPSS_BACKEND = "librosa"
+
+# Training data (backend.training_data) and model (backend.model_training)
+TRAINING_METADATA = "datasets/metadata.json"  # Relative to the repo root
+TRAINING_FEATURE_DIR = "datasets/features"  # Sharded .npy features + manifest.json
+TRAINING_SHARDS = 16  # Files are hashed into this many shards; only changed shards are rebuilt
+TRAINING_WINDOW_FRAMES = 256  # STFT frames per training example
+TRAINING_BATCH_SIZE = 32
+TRAINING_SHUFFLE_BUFFER = 2048  # Examples held in the tf.data shuffle buffer
+MODEL_PATH = "models/key_tempo.keras"
+
+# Model inference (backend.inference); a missing or empty file keeps the chroma key heuristic
+INFERENCE_MODEL_PATH = "models/trained_model.pth"  # .pth/.pt (TorchScript), .keras/.h5 or .npz
+INFERENCE_MAX_BATCH = 16  # Requests grouped into one forward pass
+INFERENCE_MAX_WAIT_MS = 5  # Longest the first request of a batch waits for others
+INFERENCE_TIMEOUT = 10  # Seconds an analysis waits for a prediction before falling back to the heuristics
+
+# Track similarity index (backend.similarity)
+SIMILARITY_INDEX_DIR = "cache/similarity"  # vectors.npy (memory-mapped), ids-*.jsonl (id log) + index.json
+SIMILARITY_WEIGHTS = (1.0, 1.0, 0.25)  # Score weights: chroma cosine, tempo compatibility, onset density and spread
+SIMILARITY_TEMPO_TOLERANCE = 0.04  # Relative tempo difference at which compatibility drops to 1/e
+
+# Audio uploads (POST /analyze-upload, backend.uploads)
+UPLOAD_DIR = "uploads"  # Relative to the repo root; only files named upload-* are ever deleted
+UPLOAD_MAX_BYTES = 100 * 1024 * 1024  # Larger bodies get HTTP 413
+UPLOAD_MAX_DURATION = 900  # Seconds of audio accepted per upload
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes copied per read while streaming a body to disk
+UPLOAD_TTL = 3600  # Seconds before a leftover upload is deleted
+UPLOAD_CLEANUP_INTERVAL = 300  # Seconds between expiry sweeps of the background sweeper thread
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make `config` and `backend` importable when pytest runs from anywhere
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from backend.hpss import HPSS_BACKENDS, hpss_masks
+from benchmarks.hpss_backends import REFERENCE, disagreements, tempo_for
+from benchmarks.profiles import labelled_signal
+from benchmarks.run import SAMPLE_RATE
+
+ALTERNATIVES = [name for name in HPSS_BACKENDS if name != REFERENCE]
+
+
+@pytest.fixture(scope="module")
+def items():
+    """Short click-over-triad inputs at known tempos and keys."""
+    return [(f"{bpm}bpm_key{key}", labelled_signal(bpm, key, duration=6.0), SAMPLE_RATE)
+            for bpm, key in ((90, 0), (120, 7), (140, 9))]
+
+
+@pytest.fixture(scope="module")
+def reference(items):
+    return [tempo_for(REFERENCE, y, sr, None) for _, y, sr in items]
+
+
+@pytest.mark.parametrize("backend", ALTERNATIVES)
+def test_backend_tempo_agrees_with_reference(backend, items, reference):
+    assert all(tempo > 0 for tempo in reference)
+    assert disagreements(backend, items, reference, tolerance=0.02) == []
+
+
+@pytest.mark.parametrize("backend", list(HPSS_BACKENDS))
+def test_masks_match_spectrogram_shape(backend):
+    magnitude = np.abs(np.random.default_rng(0).standard_normal((1025, 40))).astype(np.float32)
+    harmonic, percussive = hpss_masks(magnitude, backend=backend)
+    assert harmonic.shape == percussive.shape == magnitude.shape
+    assert np.all((harmonic >= 0) & (harmonic <= 1)) and np.all((percussive >= 0) & (percussive <= 1))
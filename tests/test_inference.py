@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+import pytest
+
+import config
+import backend.inference as inference
+from backend.training_data import N_FEATURES
+from benchmarks.inference_load import random_model
+
+WINDOWS = (2, config.TRAINING_WINDOW_FRAMES, N_FEATURES)
+
+
+def test_concurrent_callers_share_forward_passes():
+    batch_sizes = []
+    release = threading.Event()
+
+    def forward(batch):
+        release.wait(5)  # Hold the first pass so the other callers queue up behind it
+        batch_sizes.append(len(batch))
+        return np.tile(np.eye(12, dtype=np.float32)[3], (len(batch), 1)), np.full(len(batch), 120.0)
+
+    predictor = inference.BatchingPredictor(forward, max_batch=16, max_wait_ms=50)
+    try:
+        futures = [predictor.submit(np.zeros(WINDOWS, np.float32)) for _ in range(9)]
+        release.set()
+        results = [future.result(5) for future in futures]
+    finally:
+        predictor.close()
+
+    assert results == [(3, 120.0)] * 9
+    assert sum(batch_sizes) == 9 * WINDOWS[0]
+    assert len(batch_sizes) < 9  # Some forward passes served several callers
+    assert predictor.stats() == {"batches": len(batch_sizes), "requests": 9}
+
+
+def predict_in_worker(seed):
+    """Job-worker side: one analysis' model request through get_predictor()."""
+    windows = np.random.default_rng(seed).random(WINDOWS, dtype=np.float32)
+    key, _ = inference.get_predictor().predict(windows, timeout=10)
+    return os.getpid(), key
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.delenv(inference.INFERENCE_SERVER_ENV, raising=False)
+    monkeypatch.setattr(inference, "_server", None)
+    manager = inference.start_server(random_model(str(tmp_path / "model.npz")), max_wait_ms=200)
+    yield manager
+    manager.shutdown()
+
+
+def test_requests_from_worker_processes_are_batched_in_the_server(server):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=4, mp_context=context) as pool:
+        wait([pool.submit(os.getpid) for _ in range(8)])  # Start every worker before timing matters
+        results = [future.result() for future in [pool.submit(predict_in_worker, seed) for seed in range(8)]]
+
+    assert len({pid for pid, _ in results}) > 1
+    stats = server.predictor().stats()
+    assert stats["requests"] == 8
+    assert stats["batches"] < 8  # Requests from different processes shared forward passes
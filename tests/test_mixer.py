@@ -0,0 +1,84 @@
+import mido
+import pytest
+import soundfile as sf
+
+from backend.mixer import MixerEngine, SimpleRenderer, ThreadOutput
+from backend.synth import midi_events
+
+SAMPLE_RATE = 22050  # One MIDI tick below is a fractional number of samples
+START = 1000
+
+
+class RecordingRenderer(SimpleRenderer):
+    """SimpleRenderer that records the engine sample at which each note starts."""
+
+    def __init__(self, sample_rate):
+        super().__init__(sample_rate)
+        self.position = 0
+        self.note_ons = []  # (sample, channel)
+
+    def send(self, msg):
+        if msg.type == "note_on" and msg.velocity > 0:
+            self.note_ons.append((self.position, msg.channel))
+        super().send(msg)
+
+    def render(self, out):
+        super().render(out)
+        self.position += len(out)
+
+
+def part(channel, note, notes, rest, bpm=120):
+    """`notes` eighth notes followed by `rest` beats of silence."""
+    mid = mido.MidiFile(ticks_per_beat=480)
+    track = mido.MidiTrack()
+    mid.tracks.append(track)
+    track.append(mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(bpm), time=0))
+    for _ in range(notes):
+        track.append(mido.Message("note_on", channel=channel, note=note, velocity=90, time=0))
+        track.append(mido.Message("note_off", channel=channel, note=note, time=240))
+    track.append(mido.MetaMessage("end_of_track", time=int(rest * 480)))
+    return mid
+
+
+def make_engine(path=None):
+    """Engine on a recording renderer, pulled by a ThreadOutput as fast as possible."""
+    engine = MixerEngine(sample_rate=SAMPLE_RATE, output=None, renderer="simple", block_size=256)
+    engine.renderer = RecordingRenderer(SAMPLE_RATE)
+    engine.output = ThreadOutput(engine, path, realtime=False)  # What the "file"/"null" outputs use
+    return engine
+
+
+@pytest.fixture(params=["null", "file"])
+def engine(request, tmp_path):
+    engine = make_engine(str(tmp_path / "playback.wav") if request.param == "file" else None)
+    yield engine
+    engine.close()
+
+
+def test_parts_start_together_and_loop_at_their_midi_length(engine):
+    beat, piano = part(9, 36, notes=4, rest=0.3), part(0, 60, notes=3, rest=1.1)
+    playback = engine.play([beat, piano], loop=True, at=START)
+    while engine.clock < START + 10 * SAMPLE_RATE:
+        playback.wait(0.01)
+    playback.stop()
+    engine.output.wait(5)
+
+    for channel, mid in ((9, beat), (0, piano)):
+        notes_per_pass = 4 if channel == 9 else 3
+        length = midi_events(mid)[1] * SAMPLE_RATE
+        starts = [sample for sample, ch in engine.renderer.note_ons if ch == channel][::notes_per_pass]
+        # Pass n starts exactly n MIDI lengths after the first, rounded once (no accumulated drift)
+        assert starts[0] == START
+        assert len(starts) >= 3
+        assert starts == [START + int(round(n * length)) for n in range(len(starts))]
+    assert engine.playbacks == []
+
+
+def test_file_output_writes_the_rendered_audio(tmp_path):
+    engine = make_engine(str(tmp_path / "playback.wav"))
+    engine.play([part(0, 60, notes=2, rest=0)], at=START).wait(5)
+    engine.close()
+    audio, rate = sf.read(engine.output.path)
+    assert rate == SAMPLE_RATE
+    assert len(audio) >= START + SAMPLE_RATE // 2
+    assert abs(audio[:START]).max() == 0.0 and abs(audio[START:START + 400]).max() > 0.01
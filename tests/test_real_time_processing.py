@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from backend.real_time_processing import RingBuffer
+
+
+@pytest.mark.parametrize("sizes", [[3, 5, 2, 7], [3, 25, 4], [10, 10, 1, 31, 2]])
+def test_ring_buffer_keeps_absolute_positions(sizes):
+    ring = RingBuffer(10)
+    signal = np.arange(sum(sizes), dtype=np.float32)
+    position = 0
+    for size in sizes:  # Includes blocks as long as or longer than the buffer
+        ring.write(signal[position:position + size])
+        position += size
+        assert ring.written == position
+        oldest = max(0, position - ring.capacity)
+        np.testing.assert_array_equal(ring.read(oldest, position - oldest), signal[oldest:position])
+
+
+def test_ring_buffer_frames_skip_samples_that_fell_out():
+    ring = RingBuffer(8)
+    ring.write(np.arange(20, dtype=np.float32))
+    frames = list(ring.frames(n_fft=4, hop_length=2))
+    assert [frame[0] for frame in frames] == [12, 14, 16]
+    np.testing.assert_array_equal(frames[-1], [16, 17, 18, 19])
@@ -1,8 +1,6 @@
 import sys
 import os
 import numpy as np
-import threading
-import soundfile as sf
 
 # Append backend directory to system path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -13,54 +11,82 @@ import backend.beat_generation as beat_generation
 import backend.piano_generation as piano_generation
 import backend.real_time_processing as real_time_processing
 import backend.utils as utils
+import config
+from backend.playback_manager import DEFAULT_SESSION, get_manager
+from backend.profiling import profile_function
+from backend.telemetry import log
 
 # Load paths from utils
 SOUNDFONT_PATH = utils.SOUNDFONT_PATH
 FLUIDSYNTH_PATH = utils.FLUIDSYNTH_PATH
 
-# Global control variable for MIDI playback
-stop_flag = False
-
-def record_audio_and_extract_features():
+def record_audio_and_extract_features(streaming=config.STREAM_ANALYSIS, on_update=None, profile=None, on_level=None):
     """
-    Records audio, normalizes it, and extracts tempo & key.
+    Records audio and extracts tempo & key in memory.
+    With `streaming`, analysis runs while recording and stops early once the
+    estimate is stable; `on_update(tempo, key, elapsed)` receives provisional results
+    and `on_level(rms, peak, elapsed)` the input level of each block.
+    `profile` picks an analysis quality profile (see audio_analysis.ANALYSIS_PROFILES).
     """
+    if streaming:
+        return stream_audio_and_extract_features(on_update, profile, on_level)
+
     try:
-        print("🎤 Recording Audio for 10 seconds...")
-        audio = real_time_processing.record_audio()
+        log("🎤 Recording Audio for 10 seconds...")
+        audio = real_time_processing.record_audio(sample_rate=config.AUDIO_SAMPLE_RATE)
         
         if audio is None or len(audio) == 0:
             raise ValueError("No audio data recorded! Check microphone input.")
 
-        print(f"🔊 Recorded Audio Shape: {audio.shape}")
-        
-        print("🔊 Normalizing audio...")
-        normalized_audio = utils.normalize_audio(audio)
-        
-        if normalized_audio is None or len(normalized_audio) == 0:
-            raise ValueError("Normalized audio is empty! Skipping feature extraction.")
+        log(f"🔊 Recorded Audio Shape: {audio.shape}")
+        if on_level:
+            on_level(float(np.sqrt(np.mean(np.square(audio)))), float(np.abs(audio).max()),
+                     len(audio) / config.AUDIO_SAMPLE_RATE)
 
-        audio_path = "temp_audio.wav"
-        sf.write(audio_path, normalized_audio, 44100)
-        print(f"✅ Audio saved at: {audio_path}")
-
-        print("🎵 Extracting features...")
-        tempo, key = audio_analysis.extract_audio_features(audio_path)
+        log("🎵 Extracting features...")
+        tempo, key = audio_analysis.analyze_array(audio, config.AUDIO_SAMPLE_RATE, profile=profile)
         
         # Ensure tempo is a Python int
         tempo = int(tempo[0]) if isinstance(tempo, np.ndarray) else int(tempo)
         
-        print(f"✅ Detected Tempo: {tempo} BPM")
-        print(f"✅ Detected Key: {key}")
+        log(f"✅ Detected Tempo: {tempo} BPM")
+        log(f"✅ Detected Key: {key}")
         
         return tempo, key
     except Exception as e:
-        print(f"❌ Error during audio processing: {e}")
+        log(f"❌ Error during audio processing: {e}")
+        return None, None
+
+def stream_audio_and_extract_features(on_update=None, profile=None, on_level=None):
+    """
+    Analyzes live microphone input block by block until tempo & key settle.
+    """
+    try:
+        log("🎤 Listening (streaming analysis)...")
+        tempo, key = real_time_processing.stream_and_analyze(on_update=on_update, profile=profile,
+                                                              on_level=on_level)
+
+        if not tempo or key is None:
+            log("⚠️ No stable tempo/key detected.")
+            return None, None
+
+        tempo = int(round(tempo))
+        log(f"✅ Detected Tempo: {tempo} BPM")
+        log(f"✅ Detected Key: {key}")
+
+        return tempo, key
+    except Exception as e:
+        log(f"❌ Error during streaming analysis: {e}")
         return None, None
 
-def generate_music_files(tempo, key):
+def generate_music_files(tempo, key, on_part=None):
+    """
+    Generates the beat and piano progression MIDI files.
+    `on_part(name, path)` is called as each part ("beat", "piano") is written.
+    :return: (beat file, piano file), or (None, None) on failure.
+    """
     try:
-        print(f"📌 Initial values -> Tempo: {tempo} ({type(tempo)}), Key: {key} ({type(key)})")
+        log(f"📌 Initial values -> Tempo: {tempo} ({type(tempo)}), Key: {key} ({type(key)})")
 
         if isinstance(tempo, str):
             tempo = int(tempo)
@@ -69,56 +95,59 @@ def generate_music_files(tempo, key):
 
         key = str(key)  
 
-        print(f"🎵 Generating music with Tempo: {tempo} ({type(tempo)}), Key: {key} ({type(key)})")
+        log(f"🎵 Generating music with Tempo: {tempo} ({type(tempo)}), Key: {key} ({type(key)})")
 
-        print("🥁 Generating Beat...")
+        log("🥁 Generating Beat...")
         beat_file = beat_generation.generate_beat(tempo)
+        if beat_file and on_part:
+            on_part("beat", beat_file)
         
-        print("🎹 Generating Piano Progression...")
+        log("🎹 Generating Piano Progression...")
         piano_file = piano_generation.generate_piano_progression(key) 
+        if piano_file and on_part:
+            on_part("piano", piano_file)
         
         if not beat_file or not piano_file:
             raise ValueError("Music generation failed.")
         
         return beat_file, piano_file
     except Exception as e:
-        print(f"❌ Error during music generation: {e}")
+        log(f"❌ Error during music generation: {e}")
         return None, None
 
+def start_music_loop(beat_file, piano_file, session=DEFAULT_SESSION):
+    """
+    Starts beat and piano progression looping together for a session and returns at once.
+    Both parts play on the same sample clock, so they never drift apart.
+    :return: The playback handle.
+    """
+    if not beat_file or not piano_file:
+        raise ValueError("Could not generate music files.")
+    return get_manager().start(session, [beat_file, piano_file], loop=True)
+
 def play_music_in_loop(beat_file, piano_file):
     """
     Plays both beat and piano progression in a loop concurrently.
     Stops playback when the user presses Enter.
     """
-    global stop_flag
-    if not beat_file or not piano_file:
-        print("❌ Error: Could not generate music files.")
+    try:
+        start_music_loop(beat_file, piano_file)
+    except Exception as e:
+        log(f"❌ Error: {e}")
         return
     
-    print("🎶 Playing Beat and Piano Progression in Loop... (Press Enter to Stop)")
-    stop_flag = False
-    
-    beat_thread = threading.Thread(target=utils.play_midi_loop, args=(beat_file,))
-    piano_thread = threading.Thread(target=utils.play_midi_loop, args=(piano_file,))
-    
-    beat_thread.start()
-    piano_thread.start()
-    
+    log("🎶 Playing Beat and Piano Progression in Loop... (Press Enter to Stop)")
     input("⏹️ Press Enter to stop playback...\n")
     stop_music()
-    
-    beat_thread.join()
-    piano_thread.join()
 
-def stop_music():
+def stop_music(session=DEFAULT_SESSION):
     """
-    Stops MIDI playback by setting the stop flag and terminating processes.
+    Stops a session's music without waiting for the synth.
     """
-    global stop_flag
-    stop_flag = True
-    utils.stop_midi()
-    print("✅ Music Stopped.")
+    utils.stop_midi(session)
+    log("✅ Music Stopped.")
 
+@profile_function("cli-main")
 def main():
     """
     Main execution function.
@@ -126,17 +155,17 @@ def main():
     try:
         tempo, key = record_audio_and_extract_features()
         if tempo is None or key is None:
-            print("⚠️ No valid music detected. Exiting.")
+            log("⚠️ No valid music detected. Exiting.")
             return
         
         beat_file, piano_file = generate_music_files(tempo, key)
         if not beat_file or not piano_file:
-            print("⚠️ Music generation failed. Exiting.")
+            log("⚠️ Music generation failed. Exiting.")
             return
         
         play_music_in_loop(beat_file, piano_file)
     except Exception as e:
-        print(f"❌ An error occurred: {e}")
+        log(f"❌ An error occurred: {e}")
 
 if __name__ == "__main__":
     main()
@@ -24,14 +24,11 @@ def home():
 @app.route("/record-analyze", methods=["POST"])
 def record_and_analyze():
     try:
-        audio = real_time_processing.record_audio()
-        normalized_audio = utils.normalize_audio(audio)
+        sample_rate = 44100
+        audio = real_time_processing.record_audio(sample_rate=sample_rate)
 
-        # Save temp audio file
-        audio_path = "temp_audio.wav"
-        utils.save_audio(audio_path, normalized_audio)
-
-        tempo, key = audio_analysis.extract_audio_features(audio_path)
+        # Analyze in memory; no temp file shared between requests
+        tempo, key = audio_analysis.analyze_array(audio, sample_rate)
         tempo = tempo[0] if isinstance(tempo, list) else tempo
 
         return jsonify({"success": True, "tempo": round(tempo, 2), "key": key})
@@ -7,9 +7,13 @@ document.addEventListener("DOMContentLoaded", () => {
     const songDetails = document.getElementById("song-details");
     const tempoText = document.getElementById("tempo");
     const keyText = document.getElementById("key");
+    const levelMeter = document.getElementById("level-meter");
+    const levelBar = document.getElementById("level-bar");
 
     let tempo = null;
     let key = null;
+    const loopAudio = new Audio();  // Plays the server's pre-rendered loop in the browser
+    loopAudio.loop = true;
 
     // Function to update status text
     function updateStatus(message, isError = false) {
@@ -24,6 +28,57 @@ document.addEventListener("DOMContentLoaded", () => {
         stopBtn.disabled = stop;
     }
 
+    // Wait for a queued job to finish; resolves to { success, ...result }
+    async function waitForJob(data) {
+        if (!data.success || !data.job_id) return data;
+
+        while (true) {
+            const response = await fetch(`/jobs/${data.job_id}?wait=25`);
+            const body = await response.json().catch(() => ({}));
+            if (!response.ok || !body.job) {
+                return { success: false, error: body.error || `Job lookup failed (HTTP ${response.status})` };
+            }
+            const { job } = body;
+
+            if (job.status === "done") return { success: true, ...job.result };
+            if (job.status === "failed" || job.status === "cancelled") {
+                return { success: false, error: job.error || "Job " + job.status };
+            }
+        }
+    }
+
+    // Follow a queued job's progress events; resolves like waitForJob.
+    // Falls back to polling when the browser has no EventSource.
+    function followJob(data, handlers = {}) {
+        if (!data.success || !data.events_url || !window.EventSource) return waitForJob(data);
+
+        return new Promise((resolve) => {
+            const source = new EventSource(data.events_url);
+            const finish = (result) => {
+                source.close();
+                resolve(result);
+            };
+
+            for (const [event, handler] of Object.entries(handlers)) {
+                source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+            }
+            source.addEventListener("done", (e) => finish({ success: true, ...JSON.parse(e.data).result }));
+            source.addEventListener("failed", (e) => finish({ success: false, error: JSON.parse(e.data).error }));
+            source.addEventListener("cancelled", () => finish({ success: false, error: "Job cancelled" }));
+            // A dropped stream is resumed by EventSource with Last-Event-ID on its own.
+            // It only stays closed on an error such as an unknown job: then poll instead.
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) finish(waitForJob(data));
+            };
+        });
+    }
+
+    function showDetails(newTempo, newKey) {
+        if (newTempo != null) tempoText.innerText = newTempo;
+        if (newKey != null) keyText.innerText = newKey;
+        songDetails.classList.remove("hidden");
+    }
+
     // Record & Analyze Audio
     recordBtn.addEventListener("click", async () => {
         updateStatus("🎤 Listening...");
@@ -31,15 +86,24 @@ document.addEventListener("DOMContentLoaded", () => {
 
         try {
             const response = await fetch("/record-analyze", { method: "POST" });
-            const data = await response.json();
+            levelMeter.classList.remove("hidden");
+            const data = await followJob(await response.json(), {
+                level: ({ rms }) => {
+                    levelBar.style.width = Math.min(100, Math.sqrt(rms) * 200) + "%";
+                },
+                provisional: (estimate) => {
+                    showDetails(Math.round(estimate.tempo) + " (listening…)", estimate.key);
+                },
+                tempo: (final) => showDetails(final.tempo, null),
+                key: (final) => showDetails(null, final.key),
+            });
+            levelMeter.classList.add("hidden");
+            levelBar.style.width = "0";
             
             if (data.success) {
                 tempo = data.tempo;
                 key = data.key;
-
-                tempoText.innerText = tempo;
-                keyText.innerText = key;
-                songDetails.classList.remove("hidden");
+                showDetails(tempo, key);
 
                 updateStatus("✅ Audio analyzed!");
                 setButtonsState({ generate: false });
@@ -48,6 +112,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 setButtonsState({ record: false });
             }
         } catch (error) {
+            levelMeter.classList.add("hidden");
             updateStatus("❌ Failed to connect to backend!", true);
             setButtonsState({ record: false });
         }
@@ -67,9 +132,16 @@ document.addEventListener("DOMContentLoaded", () => {
                 body: JSON.stringify({ tempo, key })
             });
 
-            const data = await response.json();
+            const data = await followJob(await response.json(), {
+                beat: () => updateStatus("🥁 Beat ready, writing piano part..."),
+                piano: () => updateStatus("🎹 Piano ready, preparing playback..."),
+            });
             
             if (data.success) {
+                if (data.loop_url && !data.server_playback) {
+                    loopAudio.src = data.loop_url;
+                    await loopAudio.play();
+                }
                 updateStatus("🎵 Playing Generated Music...");
                 setButtonsState({ stop: false });
             } else {
@@ -88,6 +160,7 @@ document.addEventListener("DOMContentLoaded", () => {
         setButtonsState({ stop: true });
 
         try {
+            loopAudio.pause();
             await fetch("/stop-music", { method: "POST" });
             updateStatus("⏹️ Music Stopped!");
         } catch (error) {